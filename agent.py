@@ -1,7 +1,10 @@
+import asyncio
+import functools
 import logging
 import os
 import sys
-from typing import Optional
+import time
+from typing import AsyncIterable, Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -9,40 +12,67 @@ from livekit.agents import (
     JobContext,
     JobProcess,
     MetricsCollectedEvent,
+    ModelSettings,
     RoomInputOptions,
+    UserInputTranscribedEvent,
     WorkerOptions,
     cli,
     metrics,
 )
+# Only plugins used by the session are imported; STT/LLM/TTS are selected by
+# model string, so the provider plugins aren't needed at import time
 from livekit.plugins import noise_cancellation, silero
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from livekit.plugins import deepgram, groq, cartesia, silero
 from livekit.agents import ChatContext, ChatMessage
 
 logger = logging.getLogger("agent-worker")
 logging.basicConfig(level=logging.INFO)
 
 load_dotenv(".env")
-from vector_db_init import MarkdownToVectorDB
+from greeting import (
+    GREETING,
+    get_tts_cache,
+    parse_job_metadata,
+    presynthesize,
+    say_cached,
+    track_first_audio,
+    warm_tts_cache,
+)
+from retrieval_sidecar import get_retriever
+from context_manager import ContextManager
+from speculative_rag import SpeculativeRetriever
+from latency_metrics import TurnLatencyTracker, start_metrics_server
+from tracing import configure_tracing, span
 
-def my_rag_lookup(query,limit=5):
-        # Initialize converter
-    converter = MarkdownToVectorDB(
+# Loading the embedding model is expensive, so the retriever is shared by all turns.
+# It talks to the retrieval sidecar when one is running on this host.
+_retriever = None
 
-        knowledge_base_dir="knowledge_base",
-        collection_name="markdown_knowledge_base"
-    )
-    results = converter.search_similar(query, limit=limit)
+
+def get_converter():
+    """Get or initialize the retriever used for RAG lookups"""
+    global _retriever
+    if _retriever is None:
+        _retriever = get_retriever(
+            knowledge_base_dir="knowledge_base",
+            collection_name="markdown_knowledge_base"
+        )
+    return _retriever
+
+
+def my_rag_lookup(query,limit=5,retriever=None):
+    results = (retriever or get_converter()).search_similar(query, limit=limit)
     list_all_answer=""
-    for i, result in enumerate(results, 5):
-        list_all_answer+="Title: {result['title']}\n"+"text : {result['text']}\n"
+    for result in results:
+        list_all_answer+=f"Title: {result['title']}\n"+f"text : {result['text']}\n"
     return list_all_answer
 
 
 class VoiceAssistant(Agent):
     """Voice AI Assistant Agent"""
     
-    def __init__(self, instructions: Optional[str] = None) -> None:
+    def __init__(self, instructions: Optional[str] = None, tts_model: Optional[str] = None,
+                 retriever=None) -> None:
         default_instructions = """You are an intelligent voice assistant embedded on a website, helping visitors get the information they need quickly and efficiently.
 
 CORE IDENTITY:
@@ -82,14 +112,48 @@ TONE: Professional yet friendly, helpful, and efficient. You're here to make the
         super().__init__(
             instructions=instructions or default_instructions,
         )
+        # Keeps only the latest RAG injection and bounds the prompt size
+        self.context_manager = ContextManager(
+            rag_window=int(os.getenv("RAG_CONTEXT_WINDOW", "1")),
+            max_prompt_tokens=int(os.getenv("MAX_PROMPT_TOKENS", "6000")),
+        )
+        # Starts retrieval on interim transcripts, fed from user_input_transcribed
+        # `retriever` is the one prewarmed for this job process (proc.userdata)
+        self.retriever = SpeculativeRetriever(functools.partial(my_rag_lookup, retriever=retriever))
+        self.tts_model = tts_model
+        # Set by the entrypoint once the room is known
+        self.latency_tracker: Optional[TurnLatencyTracker] = None
+
+    async def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        """Play replies from the TTS audio cache when possible"""
+        if not self.tts_model:
+            async for frame in Agent.default.tts_node(self, text, model_settings):
+                yield frame
+            return
+        synthesize = lambda stream: Agent.default.tts_node(self, stream, model_settings)
+        async for frame in get_tts_cache().tts_node(self.tts_model, text, synthesize, self._on_cached_audio):
+            yield frame
+
+    def _on_cached_audio(self, ttfb: float):
+        """Report a cached reply's time to first audio in place of the TTS metrics"""
+        if self.latency_tracker:
+            speech = self.session.current_speech
+            self.latency_tracker.on_cached_tts(speech.id if speech else None, ttfb)
+
     async def on_user_turn_completed(
         self, turn_ctx: ChatContext, new_message: ChatMessage,
     ) -> None:
-        rag_content = my_rag_lookup(new_message.text_content)
-        turn_ctx.add_message(
-            role="assistant", 
-            content=f"Additional information relevant to the user's next message: {rag_content}"
-        )
+        with span("voice.rag_resolve") as current:
+            rag = await self.retriever.resolve(new_message.text_content)
+            if current is not None:
+                current.set_attribute("rag.reused", rag.reused)
+                current.set_attribute("rag.similarity", rag.similarity)
+                current.set_attribute("rag.wait_time", rag.wait_time)
+        if self.latency_tracker:
+            self.latency_tracker.on_rag({**rag.timings, "rag_wait": rag.wait_time})
+        self.context_manager.prepare_turn(turn_ctx, rag.content)
+        # Persist the pruned context so stale injections don't pile up in the history
+        await self.update_chat_ctx(turn_ctx)
 
 
 # Global VAD instance for efficiency
@@ -105,6 +169,19 @@ def get_vad():
     return vad_instance
 
 
+def prewarm(proc: JobProcess):
+    """Load the VAD, turn detector and retriever once per job process"""
+    start = time.perf_counter()
+    configure_tracing("voice-agent")
+    proc.userdata["vad"] = get_vad()
+    proc.userdata["turn_detector"] = MultilingualModel()
+    retriever = get_converter()
+    if hasattr(retriever, "encode_query"):
+        retriever.encode_query("warmup")
+    proc.userdata["retriever"] = retriever
+    logger.info(f"Process prewarmed in {time.perf_counter() - start:.2f}s")
+
+
 async def entrypoint(ctx: JobContext):
     """
     Main entrypoint for the agent worker.
@@ -130,6 +207,9 @@ async def entrypoint(ctx: JobContext):
         tts_model = metadata.get("tts_model", tts_model)
     except Exception as e:
         logger.warning(f"Could not parse room metadata: {e}")
+
+    # Set by the backend when it dispatches this agent from /token
+    job_metadata = parse_job_metadata(ctx.job.metadata)
     
     # Initialize usage collector for metrics
     usage_collector = metrics.UsageCollector()
@@ -139,26 +219,48 @@ async def entrypoint(ctx: JobContext):
         stt=stt_model,#"assemblyai/universal-streaming:en"
         llm="openai/gpt-4.1-mini",
         tts=tts_model,
+        vad=ctx.proc.userdata["vad"],
+        turn_detection=ctx.proc.userdata["turn_detector"],
         preemptive_generation=True,  # Generate responses while user is speaking
     )
     
+    agent = VoiceAssistant(instructions=instructions, tts_model=tts_model,
+                           retriever=ctx.proc.userdata.get("retriever"))
+    agent.latency_tracker = TurnLatencyTracker(
+        room=ctx.room.name,
+        tenant=job_metadata.get("tenant") or os.getenv("TENANT", "default"),
+    )
+
+    @session.on("user_input_transcribed")
+    def _on_user_input_transcribed(ev: UserInputTranscribedEvent):
+        """Warm up retrieval while the user is still speaking"""
+        agent.retriever.on_transcript(ev.transcript, ev.is_final)
+
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         """Log metrics when collected"""
         metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
+        agent.latency_tracker.on_metrics(ev.metrics)
     
     async def log_usage():
         """Log usage summary on shutdown"""
         summary = usage_collector.get_summary()
         logger.info(f"Session usage summary: {summary}")
+        logger.info(f"TTS cache: {get_tts_cache().stats()}")
+        await asyncio.to_thread(get_tts_cache().flush_usage)
     
     # Register shutdown callback
     ctx.add_shutdown_callback(log_usage)
     
+    # Synthesize the greeting while the session starts and connects, and log how
+    # long it takes until the user hears it
+    presynthesize(session.tts, tts_model, GREETING)
+    track_first_audio(session, ctx.room.name, job_metadata.get("token_issued_at"))
+
     # Start the agent session
     await session.start(
-        agent=VoiceAssistant(instructions=instructions),
+        agent=agent,
         room=ctx.room,
         room_input_options=RoomInputOptions(
             noise_cancellation=noise_cancellation.BVC(),  # Background voice cancellation
@@ -167,17 +269,27 @@ async def entrypoint(ctx: JobContext):
     
     # Connect to the room
     await ctx.connect()
-    await session.say(
-   "Hello. How can I help you today?",
-   allow_interruptions=True,
-)
+    await say_cached(session, tts_model, GREETING, allow_interruptions=True)
+    warm_tts_cache(session, tts_model)
     logger.info(f"Agent successfully started in room: {ctx.room.name}")
 
 
 if __name__ == "__main__":
+    # Export per-turn latency histograms from the worker (see latency_metrics.py)
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+
     # Run the agent worker
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Processes kept prewarmed (models loaded) and ready to take a job
+            num_idle_processes=int(os.getenv("AGENT_NUM_IDLE_PROCESSES", "3")),
+            # Automatic dispatch to every room unless AGENT_NAME is set; named agents are
+            # only started by explicit dispatch (see /token in backend.py)
+            agent_name=os.getenv("AGENT_NAME", ""),
+            # Prewarm loads the embedding model; the first run may also download it
+            initialize_process_timeout=300,
         )
     )
\ No newline at end of file
@@ -1,7 +1,10 @@
+import asyncio
 import logging
 import os
 import sys
-from typing import Optional
+import time
+from pathlib import Path
+from typing import AsyncIterable, Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -9,14 +12,16 @@ from livekit.agents import (
     JobContext,
     JobProcess,
     MetricsCollectedEvent,
+    ModelSettings,
     RoomInputOptions,
     WorkerOptions,
     cli,
     metrics,
 )
+# Only plugins used by the session are imported; STT/LLM/TTS are selected by
+# model string, so the provider plugins aren't needed at import time
 from livekit.plugins import noise_cancellation, silero
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from livekit.plugins import deepgram, groq, cartesia, silero
 from livekit.agents import ChatContext, ChatMessage
 from livekit.agents import function_tool, Agent, RunContext
 
@@ -24,13 +29,94 @@ logger = logging.getLogger("agent-worker")
 logging.basicConfig(level=logging.INFO)
 
 load_dotenv(".env")
-from vector_db_init import MarkdownToVectorDB
+from greeting import (
+    GREETING,
+    get_tts_cache,
+    parse_job_metadata,
+    presynthesize,
+    say_cached,
+    track_first_audio,
+    warm_tts_cache,
+)
+from retrieval_sidecar import get_retriever
+from latency_metrics import TurnLatencyTracker, rag_timings, start_metrics_server
+from tool_retriever import ToolRetriever
+from tracing import configure_tracing, span
+
+# Per-document vector/summary tools (util.get_doc_tools); only the top N most
+# relevant to the user's turn are exposed to the LLM
+DOC_TOOLS = os.getenv("DOC_TOOLS", "0") == "1"
+DOC_TOOLS_TOP_N = int(os.getenv("DOC_TOOLS_TOP_N", "4"))
+
+# Shared by all lookups in this process; uses the retrieval sidecar when available
+_retriever = None
+
+
+def get_converter():
+    """Get or initialize the retriever used by rag_lookup"""
+    global _retriever
+    if _retriever is None:
+        _retriever = get_retriever(
+            knowledge_base_dir="knowledge_base",
+            collection_name="markdown_knowledge_base"
+        )
+    return _retriever
+
+
+def to_function_tool(tool):
+    """Wrap a LlamaIndex QueryEngineTool as a LiveKit function tool"""
+    async def query_document(query: str) -> str:
+        with span("voice.doc_tool", tool=tool.metadata.name):
+            response = await asyncio.to_thread(tool.query_engine.query, query)
+        return str(response)
+
+    return function_tool(query_document, name=tool.metadata.name, description=tool.metadata.description)
+
+
+def build_doc_tool_retriever(retriever, knowledge_base_dir: str = "knowledge_base") -> Optional[ToolRetriever]:
+    """
+    Create the per-document tools of the knowledge base and index their descriptions.
+
+    Tool descriptions are embedded once with the knowledge base model and cached
+    on disk, so this only embeds documents added since the last start.
+
+    Args:
+        retriever: Knowledge base retriever providing encode_texts and model_name
+        knowledge_base_dir: Directory with the markdown documents (files or shards)
+
+    Returns:
+        ToolRetriever over LiveKit function tools, or None without documents
+    """
+    from shard_store import document_keys
+    from util import doc_tool_name, get_doc_tools, get_overview_tools
+
+    tools = []
+    keys = document_keys(knowledge_base_dir)
+    for key in keys:
+        file_path = Path(knowledge_base_dir) / key
+        tools.extend(tool for tool in get_doc_tools(file_path, doc_tool_name(file_path)) if tool is not None)
+    if tools:
+        directories = sorted({key.split("/", 1)[0] for key in keys if "/" in key})
+        tools.extend(get_overview_tools(directories))
+    if not tools:
+        return None
+
+    # Index the LiveKit wrappers under their LlamaIndex tool's name and description
+    descriptions = {to_function_tool(tool): (tool.metadata.name, tool.metadata.description) for tool in tools}
+    return ToolRetriever(
+        list(descriptions),
+        retriever.encode_texts,
+        retriever.model_name,
+        top_n=DOC_TOOLS_TOP_N,
+        describe=descriptions.__getitem__,
+    )
 
 
 class VoiceAssistant(Agent):
     """Voice AI Assistant Agent"""
     
-    def __init__(self, instructions: Optional[str] = None) -> None:
+    def __init__(self, instructions: Optional[str] = None, tts_model: Optional[str] = None,
+                 tool_retriever: Optional[ToolRetriever] = None, retriever=None) -> None:
         default_instructions = """You are an intelligent voice assistant embedded on a website, helping visitors get the information they need quickly and efficiently.
 
 CORE IDENTITY:
@@ -70,6 +156,40 @@ TONE: Professional yet friendly, helpful, and efficient. You're here to make the
         super().__init__(
             instructions=instructions or default_instructions,
         )
+        self.tts_model = tts_model
+        # Set by the entrypoint once the room is known
+        self.latency_tracker: Optional[TurnLatencyTracker] = None
+        # Document tools are swapped in per turn on top of the tools defined here
+        self.tool_retriever = tool_retriever
+        self._base_tools = list(self.tools)
+        # Prewarmed for this job process (proc.userdata); rag_lookup falls back to get_converter()
+        self.knowledge_retriever = retriever
+
+    async def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        """Play replies from the TTS audio cache when possible"""
+        if not self.tts_model:
+            async for frame in Agent.default.tts_node(self, text, model_settings):
+                yield frame
+            return
+        synthesize = lambda stream: Agent.default.tts_node(self, stream, model_settings)
+        async for frame in get_tts_cache().tts_node(self.tts_model, text, synthesize, self._on_cached_audio):
+            yield frame
+
+    def _on_cached_audio(self, ttfb: float):
+        """Report a cached reply's time to first audio in place of the TTS metrics"""
+        if self.latency_tracker:
+            speech = self.session.current_speech
+            self.latency_tracker.on_cached_tts(speech.id if speech else None, ttfb)
+
+    async def on_user_turn_completed(
+        self, turn_ctx: ChatContext, new_message: ChatMessage,
+    ) -> None:
+        """Expose only the document tools relevant to this turn"""
+        if self.tool_retriever is None or not new_message.text_content:
+            return
+        with span("voice.tool_retrieval", top_n=self.tool_retriever.top_n):
+            doc_tools = await asyncio.to_thread(self.tool_retriever.retrieve, new_message.text_content)
+        await self.update_tools(self._base_tools + doc_tools)
     
     @function_tool()
     async def rag_lookup(
@@ -88,14 +208,17 @@ TONE: Professional yet friendly, helpful, and efficient. You're here to make the
             A formatted string containing the retrieved documents with their titles and content.
         """
         try:
-            # Initialize converter
-            converter = MarkdownToVectorDB(
-                knowledge_base_dir="knowledge_base",
-                collection_name="markdown_knowledge_base"
-            )
-            
-            # Search for similar documents
-            results = converter.search_similar(query, limit=limit)
+            # Search for similar documents (blocking, so keep it off the event loop).
+            # The thread reports embed/search timings into `timings` through the context.
+            timings = {}
+            rag_timings.set(timings)
+            start = time.perf_counter()
+            with span("voice.rag_lookup", limit=limit):
+                retriever = self.knowledge_retriever or get_converter()
+                results = await asyncio.to_thread(retriever.search_similar, query, limit)
+            if self.latency_tracker:
+                timings["rag_wait"] = time.perf_counter() - start
+                self.latency_tracker.on_rag(timings, current_turn=True)
             
             # Format results
             list_all_answer = ""
@@ -109,14 +232,35 @@ TONE: Professional yet friendly, helpful, and efficient. You're here to make the
             return "Unable to retrieve information at this time."
 
 
-async def prewarm_models(ctx: JobContext):
-    """Prewarm models before starting the agent session"""
+def prewarm_models(proc: JobProcess):
+    """
+    Load models once per job process, before any job is assigned to it.
+
+    Everything is kept in proc.userdata so every session handled by this
+    process reuses it: the VAD, the turn detector, and the retriever (the
+    embedding model and vector DB client, or a sidecar connection).
+    """
     logger.info("Prewarming models...")
-    
-    # This helps ensure models are loaded before the main session starts
-    # You can add specific model prewarming logic here if needed
-    
-    logger.info("Models prewarmed successfully")
+    start = time.perf_counter()
+    configure_tracing("voice-agent")
+
+    proc.userdata["vad"] = silero.VAD.load()
+    vad_loaded = time.perf_counter()
+
+    proc.userdata["turn_detector"] = MultilingualModel()
+
+    retriever = get_converter()
+    # Run one query encode so the first real lookup doesn't pay for lazy initialization
+    if hasattr(retriever, "encode_query"):
+        retriever.encode_query("warmup")
+    proc.userdata["retriever"] = retriever
+    proc.userdata["tool_retriever"] = build_doc_tool_retriever(retriever) if DOC_TOOLS else None
+    ready = time.perf_counter()
+
+    logger.info(
+        f"Models prewarmed successfully in {ready - start:.2f}s "
+        f"(vad {vad_loaded - start:.2f}s, retriever {ready - vad_loaded:.2f}s)"
+    )
 
 
 async def entrypoint(ctx: JobContext):
@@ -144,6 +288,9 @@ async def entrypoint(ctx: JobContext):
         tts_model = metadata.get("tts_model", tts_model)
     except Exception as e:
         logger.warning(f"Could not parse room metadata: {e}")
+
+    # Set by the backend when it dispatches this agent from /token
+    job_metadata = parse_job_metadata(ctx.job.metadata)
     
     # Initialize usage collector for metrics
     usage_collector = metrics.UsageCollector()
@@ -154,27 +301,48 @@ async def entrypoint(ctx: JobContext):
             stt=stt_model,
             llm=llm_model,
             tts=tts_model,
+            vad=ctx.proc.userdata["vad"],
+            turn_detection=ctx.proc.userdata["turn_detector"],
             preemptive_generation=True,  # Generate responses while user is speaking
         )
         
+        agent = VoiceAssistant(
+            instructions=instructions,
+            tts_model=tts_model,
+            tool_retriever=ctx.proc.userdata.get("tool_retriever"),
+            retriever=ctx.proc.userdata.get("retriever"),
+        )
+        agent.latency_tracker = TurnLatencyTracker(
+            room=ctx.room.name,
+            tenant=job_metadata.get("tenant") or os.getenv("TENANT", "default"),
+        )
+
         @session.on("metrics_collected")
         def _on_metrics_collected(ev: MetricsCollectedEvent):
             """Log metrics when collected"""
             metrics.log_metrics(ev.metrics)
             usage_collector.collect(ev.metrics)
+            agent.latency_tracker.on_metrics(ev.metrics)
         
         async def log_usage():
             """Log usage summary on shutdown"""
             summary = usage_collector.get_summary()
             logger.info(f"Session usage summary: {summary}")
+            logger.info(f"TTS cache: {get_tts_cache().stats()}")
+            await asyncio.to_thread(get_tts_cache().flush_usage)
         
         # Register shutdown callback
         ctx.add_shutdown_callback(log_usage)
         
+        # Synthesize the greeting while the session starts and connects, and log
+        # how long it takes until the user hears it
+        presynthesize(session.tts, tts_model, GREETING)
+        track_first_audio(session, ctx.room.name, job_metadata.get("token_issued_at"))
+
         # Start the agent session
         logger.info("Starting agent session...")
         await session.start(
-            agent=VoiceAssistant(instructions=instructions),
+            agent=agent,
             room=ctx.room,
             room_input_options=RoomInputOptions(
                 noise_cancellation=noise_cancellation.BVC(),  # Background voice cancellation
@@ -186,10 +354,8 @@ async def entrypoint(ctx: JobContext):
         await ctx.connect()
         
         # Initial greeting
-        await session.say(
-            "Hello. How can I help you today?",
-            allow_interruptions=True,
-        )
+        await say_cached(session, tts_model, GREETING, allow_interruptions=True)
+        warm_tts_cache(session, tts_model)
         
         logger.info(f"Agent successfully started in room: {ctx.room.name}")
         
@@ -199,10 +365,21 @@ async def entrypoint(ctx: JobContext):
 
 
 if __name__ == "__main__":
+    # Export per-turn latency histograms from the worker (see latency_metrics.py)
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+
     # Run the agent worker with increased initialization timeout
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
-            initialize_process_timeout=300,  # Increase timeout to 5 minutes (default is 10s)
+            prewarm_fnc=prewarm_models,
+            # Processes kept prewarmed (models loaded) and ready to take a job
+            num_idle_processes=int(os.getenv("AGENT_NUM_IDLE_PROCESSES", "3")),
+            # Automatic dispatch to every room unless AGENT_NAME is set; named agents are
+            # only started by explicit dispatch (see /token in backend.py)
+            agent_name=os.getenv("AGENT_NAME", ""),
+            # Prewarm loads the embedding model; the first run may also download it
+            initialize_process_timeout=300,
         )
     )
@@ -1,13 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from pydantic import BaseModel
 from livekit import api
 import os
+import json
+import time
 from datetime import timedelta
+from typing import Dict, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
-import vector_db_init  
+from latency_metrics import metrics_payload, observe_request
+from tracing import attach_context, configure_tracing, flush, inject_context, span
 load_dotenv()
+configure_tracing("voice-agent-api")
 
 app = FastAPI(title="LiveKit AI Voice Agent API")
 
@@ -20,6 +26,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request durations into the api_request_duration_seconds histogram"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    observe_request(
+        request.method,
+        route.path if route else "unmatched",
+        response.status_code,
+        time.perf_counter() - start,
+        tenant=request.headers.get("x-tenant-id", "default"),
+    )
+    return response
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus metrics for this API process"""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 # API Configuration - NEVER hard-code these, always use environment variables
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
@@ -29,6 +58,95 @@ LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
 if not all([LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET]):
     raise ValueError("Missing required environment variables. Please set LIVEKIT_URL, LIVEKIT_API_KEY, and LIVEKIT_API_SECRET")
 
+# Must match the agent worker's agent_name. When set, /token puts an explicit dispatch of
+# the agent in the token's room configuration: LiveKit dispatches it once, when the room is
+# created by the first join, without an API call from here. Empty keeps automatic dispatch.
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+
+
+def agent_room_config() -> api.RoomConfiguration:
+    """Room configuration dispatching the voice agent to the room the token joins"""
+    metadata = json.dumps({"token_issued_at": time.time()})
+    return api.RoomConfiguration(agents=[api.RoomAgentDispatch(agent_name=AGENT_NAME, metadata=metadata)])
+
+
+# Ingestion (crawler, embedding model, Qdrant client) is only imported when the first
+# extraction job runs, so serving /token and /demo never pays for torch & co.
+# With INGESTION_EXECUTOR=process the jobs run in a separate worker process and
+# the API process never loads the vector DB stack at all.
+INGESTION_EXECUTOR = os.getenv("INGESTION_EXECUTOR", "thread")
+# Precompute document/directory/site summaries (LLM calls) once the vectors are live
+INGESTION_SUMMARIES = os.getenv("INGESTION_SUMMARIES", "1") == "1"
+_ingestion_executor = None
+
+
+def get_ingestion_executor() -> Executor:
+    """Get or create the executor that runs knowledge base extraction jobs"""
+    global _ingestion_executor
+    if _ingestion_executor is None:
+        if INGESTION_EXECUTOR == "process":
+            _ingestion_executor = ProcessPoolExecutor(max_workers=1)
+        else:
+            _ingestion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestion")
+    return _ingestion_executor
+
+
+def run_extraction(website_url: str, max_pages: int, trace_context: Optional[Dict[str, str]] = None,
+                   max_seconds: Optional[float] = None, max_bytes: Optional[int] = None, resume: bool = True):
+    """
+    Crawl a website and rebuild the vector DB from it (blocking)
+
+    Every stage is checkpointed (see ingest_checkpoint.py): a job restarted
+    after a crash continues with the next page, chunk batch or stage, and the
+    previous knowledge base keeps serving until the new one is published.
+
+    Args:
+        website_url: Website to crawl
+        max_pages: Maximum number of pages to extract
+        max_seconds: Crawl time budget (pages are fetched best first, see crawl_frontier.py)
+        max_bytes: Crawl download budget
+        trace_context: Propagated trace context of the request that started the job
+        resume: Continue an unfinished job for the same website and limits (else start over)
+    """
+    from ingest_checkpoint import IngestionCheckpoint
+    from sitemap import WebsiteToMarkdownPipeline
+    import vector_db_init
+
+    # No-op when already configured (thread executor); process workers set up their own exporter
+    configure_tracing("voice-agent-ingestion")
+    try:
+        with attach_context(trace_context), span("ingest.run_extraction", website_url=website_url,
+                                                  max_pages=max_pages):
+            checkpoint = IngestionCheckpoint.for_website(
+                website_url, {"max_pages": max_pages, "max_seconds": max_seconds, "max_bytes": max_bytes},
+                resume=resume,
+            )
+            if checkpoint.stage == "crawl":
+                with span("ingest.crawl", resumed_pages=len(checkpoint.pages)):
+                    pipeline = WebsiteToMarkdownPipeline(base_output_dir='knowledge_base')
+                    pipeline.run(website_url, max_pages=max_pages, max_seconds=max_seconds, max_bytes=max_bytes,
+                                 checkpoint=checkpoint)
+                checkpoint.advance("chunk")
+            success, converter = vector_db_init.init(checkpoint=checkpoint)
+            summaries = None
+            if success and INGESTION_SUMMARIES:
+                from summaries import build_summaries
+                # The knowledge base is already searchable; summaries are a bonus, not a failure
+                try:
+                    summaries = build_summaries(converter)
+                except Exception as e:
+                    summaries = {"error": str(e)}
+    finally:
+        flush()
+    if success:
+        return {
+            "status": "completed",
+            "message": f"Successfully extracted knowledge base from {website_url} and pushed to vectorDB",
+            "max_pages": max_pages,
+            "output_dir": "knowledge_base",
+            "summaries": summaries,
+        }
+
 
 class JoinRequest(BaseModel):
     room_name: str
@@ -44,6 +162,9 @@ class TokenResponse(BaseModel):
 class KnowledgeBaseRequest(BaseModel):
     website_url: str
     max_pages: int = 50
+    max_seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+    resume: bool = True
 
 
 @app.get("/")
@@ -85,6 +206,8 @@ async def create_token(request: JoinRequest):
             can_subscribe=True,
             can_publish_data=True,
         ))
+        if AGENT_NAME:
+            token.with_room_config(agent_room_config())
         
         jwt_token = token.to_jwt()
         
@@ -99,30 +222,20 @@ async def create_token(request: JoinRequest):
 
 
 @app.post("/extract-knowledge-base")
-async def extract_knowledge_base(request: KnowledgeBaseRequest):
+async def extract_knowledge_base(request: KnowledgeBaseRequest, http_request: Request):
     """Extract knowledge base from website URL"""
     try:
-        from sitemap import WebsiteToMarkdownPipeline
         import asyncio
-        from concurrent.futures import ThreadPoolExecutor
-        
-        # Run the scraping in a background thread to avoid blocking
-        def run_extraction():
-            pipeline = WebsiteToMarkdownPipeline(base_output_dir='knowledge_base')
-            pipeline.run(request.website_url, max_pages=request.max_pages)
-            success,converter=vector_db_init.init()
-            if success:
-                return {
-                    "status": "completed",
-                    "message": f"Successfully extracted knowledge base from {request.website_url} and pushed to vectorDB",
-                    "max_pages": request.max_pages,
-                    "output_dir": "knowledge_base"
-                }
 
-        # Execute in thread pool
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            result = await loop.run_in_executor(executor, run_extraction)
+        # Continue the caller's trace (traceparent header) and hand it to the ingestion job,
+        # which may run in another process, as a serialized carrier
+        with attach_context(dict(http_request.headers)), span("POST /extract-knowledge-base"):
+            # Run the scraping in the ingestion executor to avoid blocking
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                get_ingestion_executor(), run_extraction, request.website_url, request.max_pages,
+                inject_context(), request.max_seconds, request.max_bytes, request.resume
+            )
         
         return result
     
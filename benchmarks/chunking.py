@@ -0,0 +1,97 @@
+"""
+Chunking benchmark: markdown-aware token chunker vs. the recursive character splitter.
+
+Chunks knowledge_base/ with each chunker through MarkdownToVectorDB and reports
+the number of chunks, how much of the source text is indexed more than once
+(overlap), how many chunks exceed the model's sequence limit (silently
+truncated at encode time), how many have no title, chunking throughput, the
+raw vector index size and, with --embed, embedding throughput.
+
+    python benchmarks/chunking.py
+    python benchmarks/chunking.py --embed --repeat 10
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from vector_db_init import MarkdownToVectorDB
+
+
+def measure(converter: MarkdownToVectorDB, texts: dict, repeat: int, embed: bool) -> dict:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = converter.split_texts_into_chunks(texts)
+    chunk_time = (time.perf_counter() - start) / repeat
+
+    model = converter.embedding_model
+    limit = model.max_seq_length - 2
+    embedded_texts = [f"{c['context']}\n\n{c['text']}" if c.get("context") else c["text"] for c in chunks]
+    token_counts = [len(ids) for ids in model.tokenizer(embedded_texts, add_special_tokens=False)["input_ids"]]
+    source_chars = sum(len(text) for text in texts.values())
+    dimension = model.get_sentence_embedding_dimension()
+
+    row = {
+        "chunker": converter.chunker,
+        "chunks": len(chunks),
+        "indexed_chars_ratio": sum(len(c["text"]) for c in chunks) / source_chars,
+        "mean_tokens": sum(token_counts) / len(chunks),
+        "over_limit": sum(count > limit for count in token_counts),
+        "truncated_tokens": sum(max(count - limit, 0) for count in token_counts),
+        "no_title": sum(c["title"] == "No title" for c in chunks),
+        "chunk_mb_s": source_chars / 2 ** 20 / chunk_time,
+        "vectors_mb": len(chunks) * dimension * 4 / 2 ** 20,
+    }
+    if embed:
+        start = time.perf_counter()
+        converter.create_embeddings(chunks)
+        elapsed = time.perf_counter() - start
+        row["embed_chunks_s"] = len(chunks) / elapsed
+        row["embed_s"] = elapsed
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledge-base-dir", default=str(ROOT / "knowledge_base"))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--chunkers", nargs="+", default=["recursive", "markdown"])
+    parser.add_argument("--repeat", type=int, default=5, help="Chunking runs to average")
+    parser.add_argument("--embed", action="store_true", help="Also measure embedding throughput")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("vector_db_init").setLevel(logging.WARNING)
+    results = []
+    print(f"{'chunker':<10} {'chunks':>6} {'indexed':>8} {'tokens':>7} {'>limit':>7} {'trunc tok':>9} "
+          f"{'no title':>8} {'MB/s':>7} {'vec MB':>7} {'emb/s':>7}")
+    for chunker in args.chunkers:
+        converter = MarkdownToVectorDB(
+            knowledge_base_dir=args.knowledge_base_dir,
+            model_name=args.model,
+            qdrant_url=":memory:",
+            chunker=chunker,
+        )
+        texts = converter.extract_all_markdown_texts()
+        try:
+            row = measure(converter, texts, args.repeat, args.embed)
+        except ImportError as e:
+            print(f"{chunker:<10} skipped: {e}")
+            continue
+        results.append(row)
+        embed_rate = f"{row['embed_chunks_s']:>7.0f}" if args.embed else f"{'-':>7}"
+        print(f"{chunker:<10} {row['chunks']:>6} {row['indexed_chars_ratio']:>7.2f}x {row['mean_tokens']:>7.0f} "
+              f"{row['over_limit']:>7} {row['truncated_tokens']:>9} {row['no_title']:>8} "
+              f"{row['chunk_mb_s']:>7.2f} {row['vectors_mb']:>7.2f} {embed_rate}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Dedup benchmark: what boilerplate and near-duplicate removal saves.
+
+Indexes knowledge_base/ with and without the dedup stage and reports the
+number of chunks, raw vector index size, chunking and embedding time and,
+on the golden queries (exact numpy search), recall@5 and MRR, to check that
+dropping repeated content doesn't cost retrieval quality.
+
+    python benchmarks/dedup.py
+    python benchmarks/dedup.py --chunker recursive
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from retrieval_bench import NumpyIndex, score
+from vector_db_init import MarkdownToVectorDB
+
+
+def measure(converter: MarkdownToVectorDB, golden: list) -> dict:
+    texts = converter.extract_all_markdown_texts()
+    start = time.perf_counter()
+    chunks = converter.split_texts_into_chunks(texts)
+    chunk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = converter.create_embeddings(chunks)
+    embed_time = time.perf_counter() - start
+
+    index = NumpyIndex(converter, chunks, embeddings)
+    hits, reciprocal_ranks = 0, []
+    for item in golden:
+        query_hits, rr = score(index.search(item["query"], 5), item["expected_sources"], [5])
+        hits += query_hits[5]
+        reciprocal_ranks.append(rr)
+
+    stats = converter.dedup_stats
+    return {
+        "dedup": converter.dedup,
+        "chunks": len(chunks),
+        "indexed_chars": sum(len(chunk["text"]) for chunk in chunks),
+        "boilerplate_ratio": stats.boilerplate_ratio if stats else 0.0,
+        "duplicate_chunks": stats.duplicate_chunks if stats else 0,
+        "chunk_s": chunk_time,
+        "embed_s": embed_time,
+        "vectors_mb": len(chunks) * len(embeddings[0]) * 4 / 2 ** 20,
+        "recall@5": hits / len(golden),
+        "mrr": float(np.mean(reciprocal_ranks)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledge-base-dir", default=str(ROOT / "knowledge_base"))
+    parser.add_argument("--golden", default=str(Path(__file__).with_name("golden_queries.json")))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--chunker", choices=["markdown", "recursive"], default="markdown")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("vector_db_init").setLevel(logging.WARNING)
+    golden = json.loads(Path(args.golden).read_text())
+
+    results = []
+    print(f"{'dedup':<6} {'chunks':>6} {'chars':>8} {'boiler':>7} {'dups':>5} {'chunk s':>8} "
+          f"{'embed s':>8} {'vec MB':>7} {'r@5':>5} {'mrr':>6}")
+    for dedup in (False, True):
+        converter = MarkdownToVectorDB(
+            knowledge_base_dir=args.knowledge_base_dir,
+            model_name=args.model,
+            qdrant_url=":memory:",
+            chunker=args.chunker,
+            dedup=dedup,
+        )
+        row = measure(converter, golden)
+        results.append(row)
+        print(f"{'on' if dedup else 'off':<6} {row['chunks']:>6} {row['indexed_chars']:>8} "
+              f"{row['boilerplate_ratio']:>7.1%} {row['duplicate_chunks']:>5} {row['chunk_s']:>8.2f} "
+              f"{row['embed_s']:>8.2f} {row['vectors_mb']:>7.2f} {row['recall@5']:>5.2f} {row['mrr']:>6.3f}")
+
+    off, on = results
+    print(f"\nDedup saves {1 - on['chunks'] / off['chunks']:.0%} of the index "
+          f"({off['vectors_mb'] - on['vectors_mb']:.2f} MB of vectors) and "
+          f"{1 - on['embed_s'] / off['embed_s']:.0%} of embedding time")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
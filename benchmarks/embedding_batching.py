@@ -0,0 +1,107 @@
+"""
+Concurrency benchmark for query embedding micro-batching.
+
+Drives `model.encode` from many threads at a fixed offered load (queries/s)
+and reports p50/p99 per-query latency, once encoding each query alone and once
+through EmbeddingBatcher.
+
+    python benchmarks/embedding_batching.py --qps 5 20 50 100 200 --duration 10
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from embedding_batcher import EmbeddingBatcher
+
+QUERIES = [
+    "best iem under 5000",
+    "cheapest iem?",
+    "does the shanling ua2 support balanced output",
+    "what is the return policy",
+    "compare kz zsn pro 2 and 7hz zero 2",
+    "which dac works with iphone",
+    "is the sennheiser hd 600 good for beginners",
+    "do you ship internationally",
+]
+
+
+def run_load(encode, qps: float, duration: float):
+    """Fire queries at `qps` (Poisson arrivals) for `duration` seconds, return latencies in ms"""
+    latencies = []
+    lock = threading.Lock()
+    threads = []
+
+    def one_query(text):
+        start = time.perf_counter()
+        encode(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        thread = threading.Thread(target=one_query, args=(random.choice(QUERIES),))
+        thread.start()
+        threads.append(thread)
+        time.sleep(random.expovariate(qps))
+
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--qps", type=float, nargs="+", default=[5, 20, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    model.encode(QUERIES)  # warm up
+
+    batcher = EmbeddingBatcher(model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    modes = {
+        "single": lambda text: model.encode([text], show_progress_bar=False)[0],
+        "batched": batcher.encode,
+    }
+
+    results = []
+    print(f"{'mode':<8} {'qps':>6} {'n':>6} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    for qps in args.qps:
+        for mode, encode in modes.items():
+            batches_before, items_before = batcher.batches, batcher.items
+            latencies = run_load(encode, qps, args.duration)
+            batches = batcher.batches - batches_before
+            mean_batch = (batcher.items - items_before) / batches if batches else 1.0
+            row = {
+                "mode": mode,
+                "qps": qps,
+                "queries": len(latencies),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_batch_size": mean_batch,
+            }
+            results.append(row)
+            print(f"{mode:<8} {qps:>6.0f} {row['queries']:>6} {row['p50_ms']:>8.1f} "
+                  f"{row['p99_ms']:>8.1f} {mean_batch:>6.1f}")
+
+    batcher.close()
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+HTML extraction benchmark: BeautifulSoup + html2text vs. the single-pass lxml extractor.
+
+Converts the same pages with both extractors of WebsiteToMarkdownPipeline
+and reports pages/s on one core (single-threaded; the crawler runs one
+conversion per fetch worker) and how close the fast extractor's markdown
+is to the default one (word-level similarity, 1.0 = same words in the same
+order, plus the number of pages below --min-similarity).
+
+Pages come from --html-dir (saved .html files, e.g. `curl -o` of a few
+shop pages) or, by default, are rebuilt from knowledge_base/: each markdown
+file is rendered back to HTML and wrapped in the chrome of a shop theme
+(head with scripts and styles, header, nav, aside, footer, comments), so
+both extractors have to find the main content.
+
+    python benchmarks/html_extraction.py
+    python benchmarks/html_extraction.py --html-dir saved_pages --repeat 5 --show-diff
+"""
+import argparse
+import difflib
+import html
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fast_extract
+from sitemap import WebsiteToMarkdownPipeline
+
+SHOP_HEAD = """<head><meta charset="utf-8"><title>{title} | Shop</title>
+<link rel="stylesheet" href="/cdn/theme.css">
+<style>body{{font-family:sans-serif}} .price{{color:#c00}}</style>
+<script>window.Shopify = {{"shop": "demo", "currency": "INR", "routes": ["/cart", "/account"]}};</script>
+<script type="application/ld+json">{{"@type": "Product", "name": "{title}"}}</script>
+</head>"""
+SHOP_CHROME_TOP = """<header class="site-header"><a href="/">Shop</a><form action="/search"><input name="q"></form></header>
+<nav><ul>""" + "".join(f'<li><a href="/collections/c{i}">Collection {i}</a></li>' for i in range(30)) + """</ul></nav>
+<!-- announcement bar -->
+<div class="announcement">Free shipping over 999</div>"""
+SHOP_CHROME_BOTTOM = """<aside><h3>You may also like</h3><ul>""" + "".join(
+    f'<li><a href="/products/p{i}">Product {i}</a></li>' for i in range(12)) + """</ul></aside>
+<footer><p>Copyright Shop</p><ul><li><a href="/policies/refund">Refunds</a></li></ul></footer>
+<script src="/cdn/theme.js" defer></script><noscript>Enable JavaScript</noscript>"""
+
+_INLINE_RULES = [
+    (re.compile(r"!\[([^\]]*)\]\(([^)\s]+)\)"), r'<img src="\2" alt="\1">'),
+    (re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)"), r'<a href="\2">\1</a>'),
+    (re.compile(r"\*\*([^*]+)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<!\w)_([^_]+)_(?!\w)"), r"<em>\1</em>"),
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+]
+
+
+def inline_html(text: str) -> str:
+    text = html.escape(text, quote=False)
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Rough HTML for the markdown in knowledge_base/ (headings, lists, tables, paragraphs)"""
+    out, paragraph, list_items, table_rows = [], [], [], []
+
+    def flush():
+        if paragraph:
+            out.append("<p>" + "<br>".join(inline_html(line) for line in paragraph) + "</p>")
+            paragraph.clear()
+        if list_items:
+            ordered = list_items[0][0]
+            tag = "ol" if ordered else "ul"
+            out.append(f"<{tag}>" + "".join(f"<li>{inline_html(item)}</li>" for _, item in list_items) + f"</{tag}>")
+            list_items.clear()
+        if table_rows:
+            rows = [row for row in table_rows if not re.fullmatch(r"[\s|:-]+", row)]
+            cells = [[cell.strip() for cell in row.strip().strip("|").split("|")] for row in rows]
+            out.append("<table>" + "".join(
+                "<tr>" + "".join(f"<{'th' if i == 0 else 'td'}>{inline_html(c)}</{'th' if i == 0 else 'td'}>"
+                                 for c in row) + "</tr>" for i, row in enumerate(cells)) + "</table>")
+            table_rows.clear()
+
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        heading = re.match(r"(#{1,6})\s+(.*)", stripped)
+        item = re.match(r"(?:[*+-]|(\d+)\.)\s+(.*)", stripped)
+        if not stripped:
+            flush()
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{inline_html(heading.group(2))}</h{level}>")
+        elif stripped == "* * *":
+            flush()
+            out.append("<hr>")
+        elif "|" in stripped and (table_rows or stripped.startswith("|")):
+            table_rows.append(stripped)
+        elif item:
+            if paragraph or (list_items and list_items[0][0] != bool(item.group(1))):
+                flush()
+            list_items.append((bool(item.group(1)), item.group(2)))
+        else:
+            if list_items:
+                flush()
+            paragraph.append(stripped)
+    flush()
+    return "\n".join(out)
+
+
+def knowledge_base_pages(directory: Path) -> dict:
+    """Shop-like HTML pages rebuilt from the markdown files of a knowledge base"""
+    pages = {}
+    for path in sorted(directory.rglob("*.md")):
+        text = path.read_text(encoding="utf-8")
+        title = path.stem
+        frontmatter = re.match(r"---\n(.*?)\n---\n", text, re.S)
+        if frontmatter:
+            match = re.search(r"^title:\s*(.*)$", frontmatter.group(1), re.M)
+            title = match.group(1).strip() if match else title
+            text = text[frontmatter.end():]
+        body = markdown_to_html(text)
+        pages[str(path.relative_to(directory))] = (
+            f"<!DOCTYPE html><html>{SHOP_HEAD.format(title=html.escape(title))}<body>{SHOP_CHROME_TOP}"
+            f'<main id="MainContent" role="main">{body}</main>{SHOP_CHROME_BOTTOM}</body></html>'
+        ).encode("utf-8")
+    return pages
+
+
+def words(markdown: str) -> list:
+    """Words of the markdown without the metadata header and markup punctuation"""
+    body = markdown.split("\n---\n", 1)[-1]
+    return re.findall(r"\w+", body)
+
+
+def measure(pipeline: WebsiteToMarkdownPipeline, pages: dict, repeat: int) -> tuple:
+    outputs = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, content in pages.items():
+            outputs[name] = pipeline.clean_html_to_markdown(content, name)
+    elapsed = time.perf_counter() - start
+    return outputs, len(pages) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html-dir", type=Path, help="Directory of saved .html pages")
+    parser.add_argument("--knowledge-base", type=Path, default=ROOT / "knowledge_base",
+                        help="Markdown to rebuild pages from when --html-dir is not given")
+    parser.add_argument("--repeat", type=int, default=3, help="Conversions of each page per extractor")
+    parser.add_argument("--min-similarity", type=float, default=0.95)
+    parser.add_argument("--show-diff", action="store_true", help="Print a diff of the least similar page")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if not fast_extract.available():
+        sys.exit("The lxml extractor needs lxml: pip install lxml")
+    if args.html_dir:
+        pages = {str(path.relative_to(args.html_dir)): path.read_bytes()
+                 for path in sorted(args.html_dir.rglob("*.htm*"))}
+    else:
+        pages = knowledge_base_pages(args.knowledge_base)
+    if not pages:
+        sys.exit("No pages to convert")
+    total_mb = sum(len(content) for content in pages.values()) / 2 ** 20
+    print(f"{len(pages)} pages, {total_mb:.1f} MB of HTML, {args.repeat} conversions each\n")
+
+    results = {}
+    for extractor in ("bs4", "lxml"):
+        pipeline = WebsiteToMarkdownPipeline(base_output_dir="/tmp/html-extraction-bench", extractor=extractor)
+        outputs, pages_per_s = measure(pipeline, pages, args.repeat)
+        results[extractor] = {"outputs": outputs, "pages_per_s": pages_per_s}
+
+    similarities = {
+        name: difflib.SequenceMatcher(None, words(results["bs4"]["outputs"][name]),
+                                      words(results["lxml"]["outputs"][name]), autojunk=False).ratio()
+        for name in pages
+    }
+    rows = []
+    print(f"{'extractor':<10} {'pages/s/core':>13} {'MB/s':>7} {'speedup':>8} {'similarity':>11} {'below min':>10}")
+    for extractor in ("bs4", "lxml"):
+        pages_per_s = results[extractor]["pages_per_s"]
+        row = {
+            "extractor": extractor,
+            "pages_per_s": pages_per_s,
+            "mb_per_s": total_mb / len(pages) * pages_per_s,
+            "speedup": pages_per_s / results["bs4"]["pages_per_s"],
+            "mean_similarity": 1.0 if extractor == "bs4" else sum(similarities.values()) / len(similarities),
+            "min_similarity": 1.0 if extractor == "bs4" else min(similarities.values()),
+            "below_min": 0 if extractor == "bs4" else sum(s < args.min_similarity for s in similarities.values()),
+        }
+        rows.append(row)
+        print(f"{extractor:<10} {row['pages_per_s']:>13.1f} {row['mb_per_s']:>7.2f} {row['speedup']:>7.1f}x "
+              f"{row['mean_similarity']:>11.3f} {row['below_min']:>10}")
+
+    if args.show_diff:
+        name = min(similarities, key=similarities.get)
+        print(f"\nLeast similar page: {name} ({similarities[name]:.3f})")
+        diff = difflib.unified_diff(results["bs4"]["outputs"][name].splitlines(),
+                                    results["lxml"]["outputs"][name].splitlines(),
+                                    "bs4", "lxml", lineterm="", n=1)
+        print("\n".join(list(diff)[:80]))
+    if args.output:
+        Path(args.output).write_text(json.dumps({"rows": rows, "similarity": similarities}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Offline load test: how many concurrent voice sessions one agent worker sustains.
+
+Each simulated session drives a real VoiceAssistant (speculative RAG on
+interim transcripts, context management) through scripted user turns.
+STT, LLM and TTS are stubs that only wait for configurable latencies, so
+nothing goes over the network. Retrieval runs against an in-memory Qdrant
+collection built from knowledge_base/ (the markdown files are left in
+place), or against a stub with a fixed latency.
+
+Per level of concurrency it reports turn latency (end of user speech to
+first agent audio), the part of it spent in on_user_turn_completed (RAG),
+event-loop lag, and CPU and RSS per session. The capacity is the highest
+level whose p95 turn latency and p99 loop lag stay within the limits.
+
+    python benchmarks/load_harness.py --sessions 1 10 25 50 --turns 5
+    python benchmarks/load_harness.py --retriever stub --stub-rag-ms 40 --sessions 50 100 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import agent as agent_module
+from agent import VoiceAssistant
+
+SCRIPT = [
+    "what is the best iem under five thousand rupees",
+    "which is the cheapest iem you have",
+    "does the shanling ua2 support balanced output",
+    "what is your return policy for opened products",
+    "compare the kz zsn pro 2 and the 7hz zero 2",
+    "which dac works with an iphone",
+    "is the sennheiser hd 600 good for beginners",
+    "do you ship internationally and how long does it take",
+]
+
+REPLY = ("Sure. The one most people pick in that range is the 7hz Zero 2, it has a clean, "
+         "balanced sound and a detachable cable. Would you like me to compare it with another option?")
+
+
+@dataclass
+class StageLatencies:
+    """Mean latencies (ms) of the stubbed stages; each sample gets gaussian jitter"""
+    stt_word_ms: float = 250.0     # interval between interim transcripts (speaking rate)
+    stt_final_ms: float = 150.0    # end of speech to final transcript
+    endpointing_ms: float = 300.0  # final transcript to end-of-turn decision
+    llm_ttft_ms: float = 350.0
+    llm_token_ms: float = 15.0
+    tts_ttfb_ms: float = 120.0
+    think_ms: float = 1500.0       # pause between the agent's reply and the next user turn
+    jitter: float = 0.2
+
+    def sample(self, ms: float) -> float:
+        return max(0.0, random.gauss(ms, ms * self.jitter)) / 1000
+
+    @property
+    def pipeline_ms(self) -> float:
+        """Turn latency with zero overhead from the worker itself"""
+        return self.stt_final_ms + self.endpointing_ms + self.llm_ttft_ms + self.tts_ttfb_ms
+
+
+class StubRetriever:
+    """Retriever with a fixed blocking latency, for load tests without the embedding model"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    def search_similar(self, query: str, limit: int = 5):
+        time.sleep(self.latency)
+        return [{"title": "Stub", "text": f"Stub result {i} for {query}", "score": 1.0,
+                 "source": "stub.md", "chunk_id": i} for i in range(limit)]
+
+
+async def stub_stt(assistant: VoiceAssistant, text: str, latencies: StageLatencies) -> float:
+    """Stream interim transcripts word by word, then the final one; returns the end-of-speech time"""
+    words = text.split()
+    for count in range(1, len(words) + 1):
+        await asyncio.sleep(latencies.sample(latencies.stt_word_ms))
+        assistant.retriever.on_transcript(" ".join(words[:count]), is_final=False)
+    end_of_speech = time.perf_counter()
+    await asyncio.sleep(latencies.sample(latencies.stt_final_ms))
+    assistant.retriever.on_transcript(text, is_final=True)
+    await asyncio.sleep(latencies.sample(latencies.endpointing_ms))
+    return end_of_speech
+
+
+async def stub_llm(latencies: StageLatencies):
+    await asyncio.sleep(latencies.sample(latencies.llm_ttft_ms))
+    for token in REPLY.split(" "):
+        yield token + " "
+        await asyncio.sleep(latencies.sample(latencies.llm_token_ms))
+
+
+async def stub_tts(text_stream, latencies: StageLatencies):
+    """Yield one (fake) audio frame per text chunk, the first one after the TTS TTFB"""
+    first = True
+    async for _ in text_stream:
+        if first:
+            await asyncio.sleep(latencies.sample(latencies.tts_ttfb_ms))
+            first = False
+        yield b"\0" * 960
+
+
+async def run_session(session_id: int, turns: int, latencies: StageLatencies, results: list):
+    assistant = VoiceAssistant()
+    # Stagger session starts over one turn so they don't all speak in lockstep
+    await asyncio.sleep(random.uniform(0, latencies.think_ms / 1000))
+    for turn in range(turns):
+        text = SCRIPT[(session_id + turn) % len(SCRIPT)]
+        end_of_speech = await stub_stt(assistant, text, latencies)
+
+        turn_ctx = assistant.chat_ctx.copy()
+        message = turn_ctx.add_message(role="user", content=text)
+        rag_start = time.perf_counter()
+        await assistant.on_user_turn_completed(turn_ctx, message)
+        rag_time = time.perf_counter() - rag_start
+
+        reply = []
+
+        async def _collect():
+            async for token in stub_llm(latencies):
+                reply.append(token)
+                yield token
+
+        first_audio = None
+        async for _ in stub_tts(_collect(), latencies):
+            if first_audio is None:
+                first_audio = time.perf_counter()
+
+        chat_ctx = assistant.chat_ctx.copy()
+        chat_ctx.add_message(role="assistant", content="".join(reply))
+        await assistant.update_chat_ctx(chat_ctx)
+
+        results.append({"latency": first_audio - end_of_speech, "rag": rag_time})
+        await asyncio.sleep(latencies.sample(latencies.think_ms))
+    return assistant.retriever.reused_turns
+
+
+def current_rss_mb() -> float:
+    """Current RSS (Linux), falling back to the peak RSS elsewhere"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def monitor(interval: float, lags: list, rss: list, stop: asyncio.Event):
+    """Sample event-loop lag (sleep overshoot) and RSS until stopped"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+        rss.append(current_rss_mb())
+
+
+async def run_level(sessions: int, turns: int, latencies: StageLatencies) -> dict:
+    results, lags, rss = [], [], []
+    stop = asyncio.Event()
+    baseline_rss = current_rss_mb()
+    monitor_task = asyncio.create_task(monitor(0.01, lags, rss, stop))
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    reused = await asyncio.gather(*(run_session(i, turns, latencies, results) for i in range(sessions)))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    stop.set()
+    await monitor_task
+
+    latency_ms = np.array([r["latency"] for r in results]) * 1000
+    rag_ms = np.array([r["rag"] for r in results]) * 1000
+    lag_ms = np.array(lags) * 1000
+    return {
+        "sessions": sessions,
+        "turns": len(results),
+        "latency_p50_ms": float(np.percentile(latency_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latency_ms, 95)),
+        "latency_p99_ms": float(np.percentile(latency_ms, 99)),
+        "rag_p50_ms": float(np.percentile(rag_ms, 50)),
+        "rag_p95_ms": float(np.percentile(rag_ms, 95)),
+        "rag_share": float(rag_ms.sum() / latency_ms.sum()),
+        "speculation_reuse": sum(reused) / len(results),
+        "loop_lag_p50_ms": float(np.percentile(lag_ms, 50)),
+        "loop_lag_p99_ms": float(np.percentile(lag_ms, 99)),
+        "loop_lag_max_ms": float(lag_ms.max()),
+        "cpu_pct_per_session": 100 * cpu / wall / sessions,
+        "rss_mb_per_session": max(max(rss, default=baseline_rss) - baseline_rss, 0.0) / sessions,
+    }
+
+
+def build_retriever(args):
+    if args.retriever == "stub":
+        return StubRetriever(args.stub_rag_ms)
+
+    from vector_db_init import MarkdownToVectorDB
+    converter = MarkdownToVectorDB(
+        knowledge_base_dir=args.knowledge_base_dir,
+        collection_name="load_test",
+        batch_queries=True,
+        qdrant_url=":memory:",
+    )
+    if not converter.process_markdown_files(delete_markdown=False):
+        sys.exit(f"Could not index {args.knowledge_base_dir}")
+    converter.encode_query("warmup")
+    return converter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--turns", type=int, default=5, help="User turns per session")
+    parser.add_argument("--retriever", choices=["local", "stub"], default="local")
+    parser.add_argument("--stub-rag-ms", type=float, default=30.0)
+    parser.add_argument("--knowledge-base-dir", default="knowledge_base")
+    for name, default in vars(StageLatencies()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=default)
+    parser.add_argument("--slo-ms", type=float, default=1500.0, help="p95 turn latency limit for capacity")
+    parser.add_argument("--max-lag-ms", type=float, default=50.0, help="p99 event-loop lag limit for capacity")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("agent-worker").setLevel(logging.WARNING)
+    random.seed(args.seed)
+    latencies = StageLatencies(**{name: getattr(args, name) for name in vars(StageLatencies())})
+
+    # The agent's RAG lookups go through this retriever instead of a Qdrant server or sidecar
+    agent_module._retriever = build_retriever(args)
+
+    print(f"Stubbed pipeline latency: {latencies.pipeline_ms:.0f}ms, retriever: {args.retriever}")
+    print(f"{'sessions':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rag p95':>8} {'rag %':>6} "
+          f"{'reuse':>6} {'lag p99':>8} {'lag max':>8} {'cpu %/s':>8} {'MB/s':>6}")
+    results = []
+    for sessions in args.sessions:
+        row = asyncio.run(run_level(sessions, args.turns, latencies))
+        results.append(row)
+        print(f"{sessions:>8} {row['latency_p50_ms']:>8.0f} {row['latency_p95_ms']:>8.0f} "
+              f"{row['latency_p99_ms']:>8.0f} {row['rag_p95_ms']:>8.0f} {row['rag_share'] * 100:>6.1f} "
+              f"{row['speculation_reuse']:>6.2f} {row['loop_lag_p99_ms']:>8.1f} {row['loop_lag_max_ms']:>8.1f} "
+              f"{row['cpu_pct_per_session']:>8.2f} {row['rss_mb_per_session']:>6.1f}")
+
+    within = [row["sessions"] for row in results
+              if row["latency_p95_ms"] <= args.slo_ms and row["loop_lag_p99_ms"] <= args.max_lag_ms]
+    capacity = max(within, default=0)
+    print(f"\nCapacity: {capacity} concurrent sessions "
+          f"(p95 latency <= {args.slo_ms:.0f}ms, p99 loop lag <= {args.max_lag_ms:.0f}ms)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "latencies": vars(latencies),
+            "retriever": args.retriever,
+            "capacity": capacity,
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
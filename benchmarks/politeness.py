@@ -0,0 +1,200 @@
+"""
+Politeness benchmark: crawl throughput against a stub server with rate limits.
+
+Starts a local HTTP server that behaves like a rate-limited shop:
+
+- it serves --capacity requests at a time in --latency-ms; more requests
+  queue, so latency rises with concurrency
+- a token bucket allows --rate requests per second (bursts of --burst);
+  beyond that it answers 429 with Retry-After
+- with more than --max-queue requests waiting it answers 503
+
+and fetches pages from it through WebsiteToMarkdownPipeline.fetch_url for
+--seconds with each politeness setting:
+
+- previous: one request at a time with a 1 s pause (the crawler before the
+  politeness controller)
+- fixed-N: N concurrent requests, no adaptation (Retry-After still honored)
+- adaptive: the AIMD controller from politeness.py
+
+and reports pages/s, 429s, 5xx, latency and the concurrency limit reached.
+Throttled requests are retried as in the crawler, so latency includes waits.
+
+    python benchmarks/politeness.py
+    python benchmarks/politeness.py --rate 20 --capacity 6 --modes adaptive fixed-16
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from politeness import PolitenessController
+from sitemap import WebsiteToMarkdownPipeline
+
+PAGE = b"<html><head><title>Product</title></head><body><main>" + b"<p>spec</p>" * 200 + b"</main></body></html>"
+
+
+class StubShop:
+    """Capacity, token bucket and queue limit shared by the stub server's handlers"""
+
+    def __init__(self, capacity: int, latency: float, rate: float, burst: int, max_queue: int,
+                 retry_after: str = "1"):
+        self.workers = threading.Semaphore(capacity)
+        self.latency = latency
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.waiting = 0
+        self.lock = threading.Lock()
+        # (time.monotonic() of arrival, status) of every request
+        self.requests = []
+
+    def admit(self) -> int:
+        """HTTP status for a new request: 200, or 429/503 when limited"""
+        with self.lock:
+            now = time.monotonic()
+            status = self._admit(now)
+            self.requests.append((now, status))
+            return status
+
+    def _admit(self, now: float) -> int:
+        self.tokens = min(self.tokens + (now - self.refilled) * self.rate, self.burst)
+        self.refilled = now
+        if self.tokens < 1:
+            return 429
+        self.tokens -= 1
+        if self.waiting >= self.max_queue:
+            return 503
+        self.waiting += 1
+        return 200
+
+    def serve(self):
+        with self.workers:
+            with self.lock:
+                self.waiting -= 1
+            time.sleep(self.latency)
+
+
+def start_server(shop: StubShop) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = shop.admit()
+            if status == 200:
+                shop.serve()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(PAGE)))
+                self.end_headers()
+                self.wfile.write(PAGE)
+                return
+            self.send_response(status)
+            if status == 429 and shop.retry_after is not None:
+                self.send_header("Retry-After", shop.retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def controller_for(mode: str, max_concurrency: int) -> PolitenessController:
+    if mode == "previous":
+        return PolitenessController(initial_limit=1, min_limit=1, max_limit=1, min_interval=1.0)
+    if mode.startswith("fixed-"):
+        n = float(mode.split("-", 1)[1])
+        return PolitenessController(initial_limit=n, min_limit=n, max_limit=n)
+    return PolitenessController(max_limit=float(max_concurrency))
+
+
+def run_mode(args, mode: str) -> dict:
+    shop = StubShop(args.capacity, args.latency_ms / 1000, args.rate, args.burst, args.max_queue)
+    server = start_server(shop)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    pipeline = WebsiteToMarkdownPipeline(base_output_dir="/tmp/politeness-bench")
+    pipeline.politeness = controller_for(mode, args.max_concurrency)
+    workers = int(pipeline.politeness.host_options["max_limit"])
+    counter = itertools.count()
+    latencies, fetched = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def worker():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            content = pipeline.fetch_url(f"{base_url}/products/p{next(counter)}")
+            with lock:
+                if content:
+                    fetched.append(len(content))
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+    # fetch_url prints every failed request
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(workers):
+            executor.submit(worker)
+    server.shutdown()
+
+    stats = next(iter(pipeline.politeness.stats().values()))
+    return {
+        "mode": mode,
+        "pages": len(fetched),
+        "pages_per_s": len(fetched) / args.seconds,
+        "throttled": stats["throttled"],
+        "errors": stats["errors"],
+        "p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if latencies else None,
+        "final_limit": stats["limit"],
+        "peak_limit": stats["peak_limit"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["previous", "fixed-2", "fixed-16", "adaptive"])
+    parser.add_argument("--seconds", type=float, default=20.0, help="Crawl time per mode")
+    parser.add_argument("--capacity", type=int, default=4, help="Requests the server handles at once")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Service time per request")
+    parser.add_argument("--rate", type=float, default=25.0, help="Allowed requests per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--max-queue", type=int, default=8, help="Queued requests before 503s")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Adaptive controller ceiling")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"Stub server: {args.capacity} at a time x {args.latency_ms:.0f} ms "
+          f"(max {args.capacity * 1000 / args.latency_ms:.0f}/s), rate limit {args.rate:.0f}/s\n")
+    print(f"{'mode':<10} {'pages':>6} {'pages/s':>8} {'429':>5} {'5xx':>5} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'limit':>6} {'peak':>6}")
+    results = []
+    for mode in args.modes:
+        row = run_mode(args, mode)
+        results.append(row)
+        print(f"{mode:<10} {row['pages']:>6} {row['pages_per_s']:>8.1f} {row['throttled']:>5} {row['errors']:>5} "
+              f"{row['p50_ms'] or 0:>7.0f} {row['p95_ms'] or 0:>7.0f} {row['final_limit']:>6.1f} "
+              f"{row['peak_limit']:>6.1f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Retrieval benchmark and regression check on the bundled knowledge base.
+
+Builds an index from knowledge_base/ for every combination of chunker (and
+chunk size for the recursive splitter), embedding model and vector store,
+runs the golden queries against it and reports:
+
+- recall@k: share of queries with an expected source among the top k chunks
+- MRR: mean reciprocal rank of the first chunk from an expected source
+- index build time (chunking + embedding + indexing; model load separately)
+- query latency p50/p99 (query embedding + search, like search_similar)
+- memory: RSS growth while building the index and the raw vector size
+
+Vector stores: "qdrant-memory" (in-process Qdrant), "qdrant" (server at
+--qdrant-url, using a separate benchmark collection) and "numpy" (exact
+brute-force search, the accuracy ceiling for a given model and chunking).
+The markdown files are never deleted.
+
+Results are written as JSON. Pass a previous run with --baseline to fail
+(exit code 1) on recall/MRR drops or latency increases beyond the tolerances.
+
+    python benchmarks/retrieval_bench.py
+    python benchmarks/retrieval_bench.py --chunkers markdown recursive --chunk-sizes 500 1000 2000 \\
+        --models all-MiniLM-L6-v2 BAAI/bge-small-en-v1.5 --baseline benchmarks/results/main.json
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from vector_db_init import MarkdownToVectorDB
+
+COLLECTION = "retrieval_bench"
+
+
+def current_rss_mb() -> float:
+    """Current RSS (Linux), falling back to the peak RSS elsewhere"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class NumpyIndex:
+    """Exact cosine search over an in-memory matrix"""
+
+    def __init__(self, converter: MarkdownToVectorDB, chunks, embeddings):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        self.matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.sources = [chunk["source"] for chunk in chunks]
+        self.converter = converter
+
+    def search(self, query: str, limit: int):
+        vector = np.asarray(self.converter.encode_query(query), dtype=np.float32)
+        scores = self.matrix @ (vector / np.linalg.norm(vector))
+        top = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit]
+        return [self.sources[i] for i in top[np.argsort(-scores[top])]]
+
+
+class QdrantIndex:
+    """The production path: MarkdownToVectorDB.search_similar"""
+
+    def __init__(self, converter: MarkdownToVectorDB, chunks, embeddings):
+        converter.setup_qdrant_collection(len(embeddings[0]), delete_markdown=False)
+        converter.upload_to_qdrant(chunks, embeddings)
+        self.converter = converter
+
+    def search(self, query: str, limit: int):
+        return [hit["source"] for hit in self.converter.search_similar(query, limit=limit)]
+
+
+def score(ranked_sources, expected, ks):
+    """recall@k hits and reciprocal rank for one query"""
+    expected = set(expected)
+    first = next((rank for rank, source in enumerate(ranked_sources, 1) if source in expected), None)
+    hits = {k: first is not None and first <= k for k in ks}
+    return hits, 1.0 / first if first else 0.0
+
+
+def run_config(args, golden, model: str, chunker: str, chunk_size: Optional[int], store: str) -> dict:
+    rss_start = current_rss_mb()
+    load_start = time.perf_counter()
+    converter = MarkdownToVectorDB(
+        knowledge_base_dir=args.knowledge_base_dir,
+        collection_name=COLLECTION,
+        model_name=model,
+        chunk_size=chunk_size or 1000,
+        chunk_overlap=int((chunk_size or 1000) * args.overlap_ratio),
+        qdrant_url=args.qdrant_url if store == "qdrant" else ":memory:",
+        chunker=chunker,
+    )
+    model_load = time.perf_counter() - load_start
+
+    rss_model = current_rss_mb()
+    build_start = time.perf_counter()
+    texts = converter.extract_all_markdown_texts()
+    chunks = converter.split_texts_into_chunks(texts)
+    embeddings = converter.create_embeddings(chunks)
+    index = (NumpyIndex if store == "numpy" else QdrantIndex)(converter, chunks, embeddings)
+    build_time = time.perf_counter() - build_start
+    rss_index = current_rss_mb()
+
+    limit = max(args.k)
+    index.search(golden[0]["query"], limit)  # warm up
+    hits = {k: 0 for k in args.k}
+    reciprocal_ranks, latencies = [], []
+    for item in golden:
+        for repeat in range(args.repeat):
+            start = time.perf_counter()
+            ranked = index.search(item["query"], limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_hits, rr = score(ranked, item["expected_sources"], args.k)
+        reciprocal_ranks.append(rr)
+        for k, hit in query_hits.items():
+            hits[k] += hit
+
+    if store == "qdrant":
+        converter.delete_collection_if_exists()
+    result = {
+        "model": model,
+        "chunker": chunker,
+        "chunk_size": chunk_size,
+        "store": store,
+        "chunks": len(chunks),
+        "dimension": len(embeddings[0]),
+        **{f"recall@{k}": hits[k] / len(golden) for k in args.k},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "model_load_s": model_load,
+        "build_s": build_time,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p99_ms": float(np.percentile(latencies, 99)),
+        "model_rss_mb": rss_model - rss_start,
+        "index_rss_mb": rss_index - rss_model,
+        "vectors_mb": len(embeddings) * len(embeddings[0]) * 4 / 2 ** 20,
+    }
+    del index, converter, embeddings
+    gc.collect()
+    return result
+
+
+def config_key(result: dict):
+    return result["model"], result.get("chunker", "recursive"), result["chunk_size"], result["store"]
+
+
+def compare(results, baseline_path: str, args) -> list:
+    """Regressions of `results` against a previous run"""
+    baseline = {config_key(r): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(config_key(result))
+        if previous is None:
+            continue
+        name = "/".join(str(part) for part in config_key(result))
+        for metric in [f"recall@{k}" for k in args.k] + ["mrr"]:
+            if metric in previous and result[metric] < previous[metric] - args.max_quality_drop:
+                regressions.append(f"{name}: {metric} {previous[metric]:.3f} -> {result[metric]:.3f}")
+        for metric in ("query_p99_ms", "build_s"):
+            if result[metric] > previous[metric] * (1 + args.max_latency_increase):
+                regressions.append(f"{name}: {metric} {previous[metric]:.1f} -> {result[metric]:.1f}")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=str(Path(__file__).with_name("golden_queries.json")))
+    parser.add_argument("--knowledge-base-dir", default=str(ROOT / "knowledge_base"))
+    parser.add_argument("--models", nargs="+", default=["all-MiniLM-L6-v2"])
+    parser.add_argument("--chunkers", nargs="+", choices=["markdown", "recursive"], default=["markdown", "recursive"])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000, 2000],
+                        help="Chunk sizes in characters for the recursive chunker")
+    parser.add_argument("--overlap-ratio", type=float, default=0.2)
+    parser.add_argument("--stores", nargs="+", choices=["qdrant-memory", "qdrant", "numpy"],
+                        default=["qdrant-memory", "numpy"])
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/retrieval-<rev>-<time>.json)")
+    parser.add_argument("--baseline", help="Previous results file to check for regressions")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.getLogger("vector_db_init").setLevel(logging.WARNING)
+    golden = json.loads(Path(args.golden).read_text())
+
+    results = []
+    header = "".join(f"{f'r@{k}':>6}" for k in args.k)
+    print(f"{'model':<24} {'chunker':<9} {'chunk':>5} {'store':<13} {'chunks':>6} {header} {'mrr':>6} "
+          f"{'build s':>8} {'p50 ms':>7} {'p99 ms':>7} {'idx MB':>7}")
+    configs = [(chunker, size) for chunker in args.chunkers
+               for size in (args.chunk_sizes if chunker == "recursive" else [None])]
+    for model in args.models:
+        for chunker, chunk_size in configs:
+            for store in args.stores:
+                row = run_config(args, golden, model, chunker, chunk_size, store)
+                results.append(row)
+                recalls = "".join(f"{row[f'recall@{k}']:>6.2f}" for k in args.k)
+                print(f"{model[-24:]:<24} {chunker:<9} {chunk_size or '-':>5} {store:<13} {row['chunks']:>6} {recalls} "
+                      f"{row['mrr']:>6.3f} {row['build_s']:>8.2f} {row['query_p50_ms']:>7.1f} "
+                      f"{row['query_p99_ms']:>7.1f} {row['index_rss_mb']:>7.1f}")
+
+    revision = git_revision()
+    output = Path(args.output) if args.output else (
+        Path(__file__).parent / "results" / f"retrieval-{revision}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "revision": revision,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "golden_queries": len(golden),
+        "results": results,
+    }, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory-per-job comparison: in-process vector DB vs retrieval sidecar client.
+
+Each mode runs in a fresh subprocess that sets up retrieval the way an agent
+job would, runs one query, and reports its peak RSS. With N concurrent jobs
+on a host, in-process costs ~N x in-process RSS, while the sidecar costs
+~N x client RSS + one sidecar process.
+
+    python retrieval_sidecar.py &              # for the sidecar mode
+    python benchmarks/sidecar_memory.py --jobs 8
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+JOB_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+if {mode!r} == "in-process":
+    from vector_db_init import MarkdownToVectorDB
+    retriever = MarkdownToVectorDB(knowledge_base_dir="knowledge_base", collection_name="markdown_knowledge_base")
+else:
+    from retrieval_sidecar import RetrievalClient
+    retriever = RetrievalClient({socket!r})
+ready = time.perf_counter() - start
+error = None
+try:
+    retriever.search_similar("best iem?", limit=5)
+except Exception as e:
+    error = str(e)
+print(json.dumps({{
+    "ready_s": ready,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "query_error": error,
+}}))
+"""
+
+
+def measure(mode: str, socket_path: str) -> dict:
+    script = JOB_SCRIPT.format(root=str(ROOT), mode=mode, socket=socket_path)
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def sidecar_rss_mb(socket_path: str):
+    """RSS of the running sidecar process, found through the socket's owner (Linux only)"""
+    try:
+        pids = subprocess.run(["fuser", socket_path], capture_output=True, text=True).stdout.split()
+        with open(f"/proc/{pids[0]}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=8, help="Concurrent jobs per host to extrapolate to")
+    parser.add_argument("--socket", default="/tmp/rag-sidecar.sock")
+    args = parser.parse_args()
+
+    in_process = measure("in-process", args.socket)
+    client = measure("sidecar", args.socket)
+    sidecar = sidecar_rss_mb(args.socket)
+
+    print(f"{'mode':<12} {'ready s':>8} {'RSS/job MB':>11} {f'{args.jobs} jobs MB':>12}")
+    print(f"{'in-process':<12} {in_process['ready_s']:>8.2f} {in_process['max_rss_mb']:>11.0f} "
+          f"{in_process['max_rss_mb'] * args.jobs:>12.0f}")
+    total = client["max_rss_mb"] * args.jobs + (sidecar or 0)
+    print(f"{'sidecar':<12} {client['ready_s']:>8.2f} {client['max_rss_mb']:>11.0f} {total:>12.0f}"
+          + ("" if sidecar else "  (sidecar RSS not found)"))
+    for name, result in (("in-process", in_process), ("sidecar", client)):
+        if result["query_error"]:
+            print(f"warning: {name} query failed: {result['query_error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Worker startup benchmark: module import time and time-to-ready.
+
+Each measurement runs in a fresh interpreter so nothing is cached between
+them. "import" is the cost of `import <module>` alone (what the CLI and
+every job process pay up front); "ready" additionally runs the agent's
+prewarm function, i.e. the time until a process can accept a job.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --modules backend vector_db_init --no-prewarm
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import importlib
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+ready = None
+prewarm = getattr(module, {prewarm!r}, None) if {run_prewarm!r} else None
+if prewarm is not None:
+    class Proc:
+        userdata = {{}}
+    prewarm(Proc())
+    ready = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"import_s": imported - start, "ready_s": ready, "max_rss_mb": rss_mb}}))
+"""
+
+PREWARM_FUNCTIONS = {
+    "agent": "prewarm",
+    "agents_rag_as_tool": "prewarm_models",
+}
+
+
+def measure(module: str, run_prewarm: bool) -> dict:
+    script = SCRIPT.format(root=str(ROOT), module=module,
+                           prewarm=PREWARM_FUNCTIONS.get(module, ""), run_prewarm=run_prewarm)
+    # backend refuses to import without LiveKit credentials; placeholders are enough here
+    env = {**os.environ}
+    for name in ("LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET"):
+        env.setdefault(name, "benchmark")
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, env=env)
+    if output.returncode != 0:
+        return {"error": output.stderr.strip().splitlines()[-1] if output.stderr else "failed"}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+",
+                        default=["vector_db_init", "retrieval_sidecar", "backend", "agent", "agents_rag_as_tool"])
+    parser.add_argument("--no-prewarm", action="store_true", help="Only measure import time")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'module':<22} {'import s':>9} {'ready s':>9} {'RSS MB':>8}")
+    for module in args.modules:
+        runs = [measure(module, not args.no_prewarm) for _ in range(args.repeat)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            print(f"{module:<22} error: {errors[0]}")
+            continue
+        import_s = min(run["import_s"] for run in runs)
+        ready = [run["ready_s"] for run in runs if run["ready_s"] is not None]
+        ready_s = f"{min(ready):>9.2f}" if ready else f"{'-':>9}"
+        rss_mb = min(run["max_rss_mb"] for run in runs)
+        print(f"{module:<22} {import_s:>9.2f} {ready_s} {rss_mb:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Tool retrieval benchmark: prompt size and TTFT with per-document tools.
+
+util.get_doc_tools creates a vector and a summary tool per document. This
+grows a catalog from the knowledge_base/ documents plus synthetic product
+pages and, per catalog size, compares exposing every document tool to the
+LLM with exposing the top N picked by ToolRetriever:
+
+- prompt tokens of the tool schemas (tiktoken if installed, else ~4 chars/token)
+- time to index the tool descriptions; embeddings are cached on disk as in
+  the agent, so each size only embeds the tools the previous one didn't have
+- tool retrieval latency per turn (query embedding + scoring)
+- tool recall@N on the golden queries: share of queries for which a tool of
+  an expected document is among the exposed ones
+- with --measure-ttft, time to first streamed token of a real chat completion
+  (needs OPENAI_API_KEY; OpenAI accepts at most 128 tools per request, so
+  "all tools" is skipped above that)
+
+    python benchmarks/tool_retrieval.py
+    python benchmarks/tool_retrieval.py --documents 14 100 500 1000 --top-n 4 --measure-ttft
+"""
+import argparse
+import itertools
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tool_retriever import ToolRetriever
+from util import SUMMARY_TOOL_DESCRIPTION, VECTOR_TOOL_DESCRIPTION, doc_tool_name
+
+OPENAI_TOOL_LIMIT = 128
+BRANDS = ["moondrop", "fiio", "tanchjim", "truthear", "simgot", "letshuoer", "kiwi-ears", "hidizs",
+          "tripowin", "ikko", "dunu", "thieaudio", "kinera", "tinhifi", "blon", "cca"]
+MODELS = ["aria", "chu", "zero", "hexa", "ew200", "s12", "cadenza", "mp145", "lea", "oh10",
+          "titan", "legacy", "celest", "t3", "bl03", "cra"]
+KINDS = ["iem", "dac", "dongle", "cable", "eartips", "amp"]
+
+# The agent's own tool, always exposed
+BASE_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "rag_lookup",
+        "description": "Look up information from the knowledge base using RAG (Retrieval Augmented Generation).",
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string"}, "limit": {"type": "integer", "default": 5}},
+            "required": ["query"],
+        },
+    },
+}]
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken"
+    except ImportError:
+        return lambda text: len(text) // 4, "approx"
+
+
+def catalog(knowledge_base_dir: Path, size: int, synthetic_dir: Path) -> list:
+    """`size` document paths: the knowledge base first, then synthetic product pages"""
+    paths = sorted(knowledge_base_dir.rglob("*.md"))[:size]
+    combos = itertools.product(BRANDS, MODELS, KINDS)
+    while len(paths) < size:
+        brand, model, kind = next(combos)
+        paths.append(synthetic_dir / f"{brand}-{model}-{kind}.md")
+    return paths
+
+
+def tool_schema(name: str, description: str) -> dict:
+    """Function schema the LLM receives for a LiveKit-wrapped document tool"""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]},
+        },
+    }
+
+
+def document_tools(paths) -> list:
+    """(schema, document path) of the vector and summary tool of every document"""
+    tools = []
+    for path in paths:
+        name = doc_tool_name(path)
+        for prefix, template in (("vector_tool", VECTOR_TOOL_DESCRIPTION), ("summary_tool", SUMMARY_TOOL_DESCRIPTION)):
+            description = template.format(name=name, file_name=path.name)
+            tools.append((tool_schema(f"{prefix}_{name}", description), path))
+    return tools
+
+
+def measure_ttft(client, llm_model: str, queries, tools_for) -> float:
+    """Median time to the first streamed chunk (text or tool call), in ms"""
+    latencies = []
+    for query in queries:
+        tools = tools_for(query)
+        start = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=llm_model,
+            messages=[{"role": "system", "content": "You are a helpful voice assistant for an audio store."},
+                      {"role": "user", "content": query}],
+            tools=tools,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta if chunk.choices else None
+            if delta is not None and (delta.content or delta.tool_calls):
+                latencies.append((time.perf_counter() - start) * 1000)
+                break
+        stream.close()
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--knowledge-base-dir", default=str(ROOT / "knowledge_base"))
+    parser.add_argument("--golden", default=str(Path(__file__).with_name("golden_queries.json")))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Embedding model")
+    parser.add_argument("--documents", type=int, nargs="+", default=[14, 50, 100, 250, 500, 1000])
+    parser.add_argument("--top-n", type=int, default=4)
+    parser.add_argument("--measure-ttft", action="store_true", help="Time real streaming LLM calls")
+    parser.add_argument("--llm-model", default="gpt-4.1-mini")
+    parser.add_argument("--ttft-queries", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("tool_retriever").setLevel(logging.WARNING)
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    embed = lambda texts: model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+    count_tokens, tokenizer = token_counter()
+    golden = json.loads(Path(args.golden).read_text())
+    client = None
+    if args.measure_ttft:
+        from openai import OpenAI
+        client = OpenAI()
+
+    results = []
+    print(f"Tokens counted with {tokenizer}; top {args.top_n} tools of the query plus rag_lookup\n")
+    print(f"{'docs':>5} {'tools':>6} {'all tok':>8} {'topN tok':>8} {'index s':>8} {'p50 ms':>7} "
+          f"{'p99 ms':>7} {'recall':>6} {'all ttft':>9} {'topN ttft':>9}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for size in args.documents:
+            paths = catalog(Path(args.knowledge_base_dir), size, Path(args.knowledge_base_dir) / "synthetic")
+            tools = document_tools(paths)
+            start = time.perf_counter()
+            retriever = ToolRetriever(
+                tools, embed, args.model, top_n=args.top_n,
+                describe=lambda tool: (tool[0]["function"]["name"], tool[0]["function"]["description"]),
+                cache_dir=cache_dir,
+            )
+            index_time = time.perf_counter() - start
+
+            latencies, recalled, top_tokens = [], 0, []
+            for item in golden:
+                start = time.perf_counter()
+                selected = retriever.retrieve(item["query"])
+                latencies.append((time.perf_counter() - start) * 1000)
+                sources = {doc_tool_name(Path(args.knowledge_base_dir) / source) for source in item["expected_sources"]}
+                recalled += any(doc_tool_name(path) in sources for _, path in selected)
+                top_tokens.append(count_tokens(json.dumps(BASE_TOOLS + [schema for schema, _ in selected])))
+
+            all_schemas = BASE_TOOLS + [schema for schema, _ in tools]
+            row = {
+                "documents": size,
+                "tools": len(tools),
+                "all_tokens": count_tokens(json.dumps(all_schemas)),
+                "top_n_tokens": float(np.mean(top_tokens)),
+                "index_s": index_time,
+                "retrieve_p50_ms": float(np.percentile(latencies, 50)),
+                "retrieve_p99_ms": float(np.percentile(latencies, 99)),
+                "recall": recalled / len(golden),
+                "all_ttft_ms": None,
+                "top_n_ttft_ms": None,
+            }
+            if client is not None:
+                queries = [item["query"] for item in golden[:args.ttft_queries]]
+                if len(all_schemas) <= OPENAI_TOOL_LIMIT:
+                    row["all_ttft_ms"] = measure_ttft(client, args.llm_model, queries, lambda query: all_schemas)
+                row["top_n_ttft_ms"] = measure_ttft(
+                    client, args.llm_model, queries,
+                    lambda query: BASE_TOOLS + [schema for schema, _ in retriever.retrieve(query)],
+                )
+            results.append(row)
+
+            ttfts = "".join(f"{value:>10.0f}" if value is not None else f"{'-':>10}"
+                            for value in (row["all_ttft_ms"], row["top_n_ttft_ms"]))
+            print(f"{size:>5} {row['tools']:>6} {row['all_tokens']:>8} {row['top_n_tokens']:>8.0f} "
+                  f"{row['index_s']:>8.2f} {row['retrieve_p50_ms']:>7.1f} {row['retrieve_p99_ms']:>7.1f} "
+                  f"{row['recall']:>6.2f}{ttfts}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Vector compression benchmark: memory, latency and recall of compact vectors vs. float32.
+
+Embeds knowledge_base/ once, then indexes the same vectors in one collection
+per compression mode (vector_compression.py) and runs the golden queries
+through MarkdownToVectorDB.vector_search, reporting:
+
+- RAM / disk MB: vector storage in RAM (float32, int8 or 1 bit per dimension
+  of the searched vector) and full-precision vectors kept on disk
+- overlap@k: share of the exact float32 top k (numpy brute force) returned
+- recall@k and MRR on the expected sources of the golden queries
+- search latency p50/p99 (query embeddings are computed beforehand)
+
+Modes are written as <mode>[/<truncation dims>], e.g. int8, binary/192.
+
+--distractors adds synthetic points (noisy mixes of real chunk vectors) to
+reach a catalog-sized collection. Quantization is only applied by a Qdrant
+server: with the default in-process store (:memory:) searches are exact, so
+only truncation changes the results. Pass --qdrant-url for real numbers.
+
+    python benchmarks/vector_compression.py
+    python benchmarks/vector_compression.py --qdrant-url http://localhost:6333 --distractors 100000 \\
+        --modes none int8 binary int8/192 binary/192
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from retrieval_bench import score
+from vector_compression import VectorCompression
+from vector_db_init import MarkdownToVectorDB
+
+COLLECTION = "vector_compression_bench"
+
+
+def parse_mode(value: str, oversampling=None) -> VectorCompression:
+    mode, _, dims = value.partition("/")
+    return VectorCompression(mode=mode, truncate_dim=int(dims) if dims else None, oversampling=oversampling)
+
+
+def storage_mb(compression: VectorCompression, points: int, dimension: int) -> tuple:
+    """(RAM, disk) MB of vector storage for a compression mode"""
+    full = points * dimension * 4 / 2 ** 20
+    if not compression.enabled:
+        return full, 0.0
+    searched = compression.truncate_dim or dimension
+    bytes_per_dim = {"none": 4, "int8": 1, "binary": 1 / 8}[compression.mode]
+    return points * searched * bytes_per_dim / 2 ** 20, full
+
+
+def distractor_vectors(embeddings: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    """Noisy mixes of two real vectors, so distractors are close to real content"""
+    rng = np.random.default_rng(seed)
+    a = embeddings[rng.integers(len(embeddings), size=count)]
+    b = embeddings[rng.integers(len(embeddings), size=count)]
+    mix = rng.uniform(0.2, 0.8, size=(count, 1)).astype(np.float32)
+    noise = rng.normal(scale=0.02, size=a.shape).astype(np.float32)
+    return mix * a + (1 - mix) * b + noise
+
+
+def build_collection(converter: MarkdownToVectorDB, chunks, vectors: np.ndarray, batch_size: int = 256):
+    if converter.has_collection(COLLECTION):
+        converter.qdrant_client.delete_collection(collection_name=COLLECTION)
+    converter.create_collection(COLLECTION, vectors.shape[1])
+    for i in range(0, len(chunks), batch_size):
+        converter.qdrant_client.upsert(
+            collection_name=COLLECTION,
+            points=[converter.make_point(chunk, vector)
+                    for chunk, vector in zip(chunks[i:i + batch_size], vectors[i:i + batch_size])],
+            wait=True,
+        )
+
+
+def exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores)[:k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=str(Path(__file__).with_name("golden_queries.json")))
+    parser.add_argument("--knowledge-base-dir", default=str(ROOT / "knowledge_base"))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--modes", nargs="+", default=["none", "int8", "binary", "none/192", "int8/192"])
+    parser.add_argument("--oversampling", type=float, help="Candidates per result (default per mode)")
+    parser.add_argument("--qdrant-url", default=":memory:")
+    parser.add_argument("--distractors", type=int, default=0, help="Synthetic points added to the collection")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("vector_db_init").setLevel(logging.WARNING)
+    golden = json.loads(Path(args.golden).read_text())
+    converter = MarkdownToVectorDB(
+        knowledge_base_dir=args.knowledge_base_dir,
+        collection_name=COLLECTION,
+        model_name=args.model,
+        qdrant_url=args.qdrant_url,
+    )
+    chunks = converter.split_texts_into_chunks(converter.extract_all_markdown_texts())
+    vectors = np.asarray(converter.create_embeddings(chunks), dtype=np.float32)
+    if args.distractors:
+        vectors = np.concatenate([vectors, distractor_vectors(vectors, args.distractors)])
+        chunks = chunks + [{"text": "", "source": "distractor", "title": "", "chunk_id": i,
+                            "char_count": 0, "word_count": 0} for i in range(args.distractors)]
+    queries = [np.asarray(converter.encode_query(item["query"]), dtype=np.float32) for item in golden]
+    exact = [exact_top(vectors, query, args.k) for query in queries]
+    keys = [(chunk["source"], chunk["chunk_id"]) for chunk in chunks]
+    print(f"{len(chunks)} points of {vectors.shape[1]} dimensions, {len(golden)} queries, "
+          f"Qdrant {args.qdrant_url}\n")
+
+    rows = []
+    print(f"{'mode':<12} {'oversample':>10} {'RAM MB':>8} {'disk MB':>8} {f'overlap@{args.k}':>10} "
+          f"{f'r@{args.k}':>6} {'mrr':>6} {'p50 ms':>7} {'p99 ms':>7}")
+    for value in args.modes:
+        compression = parse_mode(value, args.oversampling)
+        converter.compression = compression
+        build_collection(converter, chunks, vectors)
+        converter._search_compression = None  # Re-read from the new collection
+
+        overlaps, reciprocal_ranks, latencies, hits = [], [], [], 0
+        converter.vector_search(queries[0], None, args.k)  # warm up
+        for item, query, expected in zip(golden, queries, exact):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = converter.vector_search(query, None, args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            found = {(hit.payload["source"], hit.payload["chunk_id"]) for hit in result}
+            overlaps.append(len(found & {keys[i] for i in expected}) / len(expected))
+            query_hits, rr = score([hit.payload["source"] for hit in result], item["expected_sources"], [args.k])
+            hits += query_hits[args.k]
+            reciprocal_ranks.append(rr)
+
+        ram_mb, disk_mb = storage_mb(compression, len(chunks), vectors.shape[1])
+        row = {
+            "mode": compression.describe(),
+            "oversampling": compression.oversampling,
+            "points": len(chunks),
+            "ram_mb": ram_mb,
+            "disk_mb": disk_mb,
+            f"overlap@{args.k}": float(np.mean(overlaps)),
+            f"recall@{args.k}": hits / len(golden),
+            "mrr": float(np.mean(reciprocal_ranks)),
+            "search_p50_ms": float(np.percentile(latencies, 50)),
+            "search_p99_ms": float(np.percentile(latencies, 99)),
+        }
+        rows.append(row)
+        print(f"{row['mode']:<12} {row['oversampling']:>10.1f} {ram_mb:>8.2f} {disk_mb:>8.2f} "
+              f"{row[f'overlap@{args.k}']:>10.3f} {row[f'recall@{args.k}']:>6.2f} {row['mrr']:>6.3f} "
+              f"{row['search_p50_ms']:>7.2f} {row['search_p99_ms']:>7.2f}")
+
+    converter.qdrant_client.delete_collection(collection_name=COLLECTION)
+    if args.output:
+        Path(args.output).write_text(json.dumps({"qdrant_url": args.qdrant_url, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
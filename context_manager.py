@@ -0,0 +1,212 @@
+import logging
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Optional
+
+from livekit.agents import ChatContext, ChatMessage
+
+logger = logging.getLogger("agent-worker")
+
+# Ids of messages managed by ContextManager. Anything else in the chat context
+# (system prompt, user/assistant turns, tool calls) is left untouched unless it
+# has to be evicted to stay under the token budget.
+RAG_MESSAGE_PREFIX = "rag_"
+SUMMARY_MESSAGE_ID = "ctx_summary"
+
+
+@dataclass
+class PromptSizeMetrics:
+    """Size of the prompt sent to the LLM for a single user turn"""
+    turn: int
+    items: int
+    chars: int
+    est_tokens: int
+    prefix_tokens: int
+    rag_tokens: int
+    rag_messages_removed: int
+    items_evicted: int
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Cheap token estimate, good enough for budgeting without loading a tokenizer"""
+    if not text:
+        return 0
+    return int(len(text) / chars_per_token) + 1
+
+
+def _item_text(item) -> str:
+    """Text that an item contributes to the prompt"""
+    item_type = getattr(item, "type", "message")
+    if item_type == "message":
+        return item.text_content or ""
+    if item_type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item_type == "function_call_output":
+        return item.output or ""
+    return ""
+
+
+class ContextManager:
+    """
+    Keeps the per-session ChatContext bounded.
+
+    - Only the last `rag_window` retrieved-context messages are kept; older
+      "Additional information..." injections are dropped every turn.
+    - When the estimated prompt size goes over `max_prompt_tokens`, the oldest
+      conversation items are evicted down to `target_prompt_tokens` and replaced
+      by a one-line summary of what the user asked earlier.
+    - The leading system/developer messages are never modified, so the prompt
+      prefix stays byte-identical and provider prompt caching keeps applying.
+      Evicting down to a low watermark (instead of one item per turn) keeps the
+      rest of the prefix stable for several turns between evictions.
+    """
+
+    def __init__(self,
+                 rag_window: int = 1,
+                 max_prompt_tokens: int = 6000,
+                 target_prompt_tokens: Optional[int] = None,
+                 min_recent_items: int = 6,
+                 chars_per_token: float = 4.0):
+        """
+        Args:
+            rag_window: Number of most recent RAG injections to keep
+            max_prompt_tokens: Estimated prompt size that triggers eviction
+            target_prompt_tokens: Size to evict down to (default: 75% of max)
+            min_recent_items: Most recent conversation items that are never evicted
+            chars_per_token: Ratio used by the token estimate
+        """
+        self.rag_window = max(rag_window, 1)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.target_prompt_tokens = target_prompt_tokens or int(max_prompt_tokens * 0.75)
+        self.min_recent_items = min_recent_items
+        self.chars_per_token = chars_per_token
+        self.turn = 0
+        # Only the latest questions go in the summary
+        self._evicted_questions: Deque[str] = deque(maxlen=10)
+
+    def _tokens(self, item) -> int:
+        return estimate_tokens(_item_text(item), self.chars_per_token)
+
+    @staticmethod
+    def _is_rag(item) -> bool:
+        return getattr(item, "id", "").startswith(RAG_MESSAGE_PREFIX)
+
+    @staticmethod
+    def _is_summary(item) -> bool:
+        return getattr(item, "id", "") == SUMMARY_MESSAGE_ID
+
+    @staticmethod
+    def _prefix_length(chat_ctx: ChatContext) -> int:
+        """Number of leading system/developer messages (the cacheable prefix)"""
+        count = 0
+        for item in chat_ctx.items:
+            if getattr(item, "type", None) == "message" and item.role in ("system", "developer"):
+                count += 1
+            else:
+                break
+        return count
+
+    def remove_stale_rag(self, chat_ctx: ChatContext, keep: Optional[int] = None) -> int:
+        """Remove all but the `keep` most recent RAG messages, returns number removed"""
+        keep = self.rag_window - 1 if keep is None else keep
+        rag_ids = [item.id for item in chat_ctx.items if self._is_rag(item)]
+        stale = set(rag_ids[:max(len(rag_ids) - keep, 0)])
+        if stale:
+            chat_ctx.items[:] = [item for item in chat_ctx.items if item.id not in stale]
+        return len(stale)
+
+    def inject_rag(self, chat_ctx: ChatContext, content: str) -> ChatMessage:
+        """Add the retrieved context for the current turn"""
+        return chat_ctx.add_message(
+            role="assistant",
+            content=f"Additional information relevant to the user's next message: {content}",
+            id=f"{RAG_MESSAGE_PREFIX}{self.turn}",
+        )
+
+    def _summary(self) -> str:
+        """Summary message text of the evicted questions ("" before any eviction)"""
+        if not self._evicted_questions:
+            return ""
+        return "Earlier in this conversation the user asked about: " + "; ".join(self._evicted_questions)
+
+    def _summary_tokens(self) -> int:
+        return estimate_tokens(self._summary(), self.chars_per_token)
+
+    def evict_over_budget(self, chat_ctx: ChatContext) -> int:
+        """Evict the oldest conversation items if the prompt is over budget"""
+        total = sum(self._tokens(item) for item in chat_ctx.items)
+        if total <= self.max_prompt_tokens:
+            return 0
+
+        prefix_len = self._prefix_length(chat_ctx)
+        prefix = chat_ctx.items[:prefix_len]
+        body = [item for item in chat_ctx.items[prefix_len:] if not self._is_summary(item)]
+        protected = body[-self.min_recent_items:] if self.min_recent_items else []
+        evictable = body[:len(body) - len(protected)]
+
+        total = sum(self._tokens(item) for item in prefix + body)
+        evicted = 0
+        evicted_calls = set()
+        # The summary replacing the evicted questions counts towards the budget too
+        while evictable and total + self._summary_tokens() > self.target_prompt_tokens:
+            item = evictable.pop(0)
+            total -= self._tokens(item)
+            evicted += 1
+            if getattr(item, "type", None) == "message" and item.role == "user":
+                self._evicted_questions.append(_item_text(item).strip()[:120])
+            elif getattr(item, "type", None) == "function_call":
+                evicted_calls.add(item.call_id)
+
+        # Never keep a tool output whose call was evicted (even a recent one)
+        retained = []
+        for item in evictable + protected:
+            if getattr(item, "type", None) == "function_call_output" and item.call_id in evicted_calls:
+                total -= self._tokens(item)
+                evicted += 1
+            else:
+                retained.append(item)
+
+        items = list(prefix)
+        if self._evicted_questions:
+            items.append(ChatMessage(role="assistant", content=[self._summary()], id=SUMMARY_MESSAGE_ID))
+        items.extend(retained)
+        chat_ctx.items[:] = items
+
+        total += self._summary_tokens()
+        logger.info(f"Context over budget, evicted {evicted} items (~{total} tokens remaining)")
+        return evicted
+
+    def measure(self, chat_ctx: ChatContext, rag_removed: int = 0, evicted: int = 0) -> PromptSizeMetrics:
+        """Compute prompt size metrics for the current turn"""
+        prefix_len = self._prefix_length(chat_ctx)
+        texts = [_item_text(item) for item in chat_ctx.items]
+        return PromptSizeMetrics(
+            turn=self.turn,
+            items=len(chat_ctx.items),
+            chars=sum(len(text) for text in texts),
+            est_tokens=sum(estimate_tokens(text, self.chars_per_token) for text in texts),
+            prefix_tokens=sum(estimate_tokens(text, self.chars_per_token) for text in texts[:prefix_len]),
+            rag_tokens=sum(self._tokens(item) for item in chat_ctx.items if self._is_rag(item)),
+            rag_messages_removed=rag_removed,
+            items_evicted=evicted,
+        )
+
+    def prepare_turn(self, chat_ctx: ChatContext, rag_content: str) -> PromptSizeMetrics:
+        """
+        Prune the context and inject this turn's retrieved information.
+
+        Args:
+            chat_ctx: The turn context passed to on_user_turn_completed
+            rag_content: Retrieved knowledge base content for the new message
+
+        Returns:
+            PromptSizeMetrics for the resulting prompt
+        """
+        self.turn += 1
+        removed = self.remove_stale_rag(chat_ctx)
+        self.inject_rag(chat_ctx, rag_content)
+        evicted = self.evict_over_budget(chat_ctx)
+
+        turn_metrics = self.measure(chat_ctx, rag_removed=removed, evicted=evicted)
+        logger.info(f"Prompt size: {asdict(turn_metrics)}")
+        return turn_metrics
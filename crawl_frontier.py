@@ -0,0 +1,248 @@
+"""
+Priority crawl frontier with page, time and byte budgets.
+
+URLs found in sitemaps go into a heap ordered by a score combining:
+
+- the sitemap <priority> (0.5 when missing, as the sitemap protocol defines)
+- URL pattern rules: e.g. product and collection pages first, account and
+  cart pages never
+- freshness: a bonus for a recent <lastmod> that halves every
+  `freshness_half_life_days`
+
+Discovery pushes URLs while fetch workers pop the best one known so far,
+so fetching starts with the first sitemap instead of after the last one.
+Sitemaps themselves are ranked with the same rules (product sitemaps
+before blog sitemaps), so the best pages tend to be discovered first.
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urldefrag
+
+# (regex, weight); the first matching rule applies, None excludes the URL
+DEFAULT_URL_RULES: List[Tuple[str, Optional[float]]] = [
+    (r"/(cart|checkout|account|login|search)(/|$|\?)", None),
+    (r"/products/", 1.0),
+    (r"/collections/", 0.8),
+    (r"/pages/", 0.4),
+    (r"/(blogs|news)/", -0.2),
+    (r"/(tags|tagged)/", -0.5),
+]
+
+# Sitemap files are ranked by name, e.g. Shopify's sitemap_products_1.xml
+DEFAULT_SITEMAP_RULES: List[Tuple[str, Optional[float]]] = [
+    (r"product", 1.0),
+    (r"collection", 0.8),
+    (r"page", 0.4),
+    (r"(blog|article|news)", -0.2),
+]
+
+
+@dataclass
+class CrawlBudget:
+    """Limits of one crawl; None means unlimited"""
+    max_pages: Optional[int] = None
+    max_seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+    def exhausted(self, pages: int, elapsed: float, fetched_bytes: int) -> Optional[str]:
+        """Name of the first exhausted limit, or None"""
+        if self.max_pages is not None and pages >= self.max_pages:
+            return "pages"
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return "time"
+        if self.max_bytes is not None and fetched_bytes >= self.max_bytes:
+            return "bytes"
+        return None
+
+
+class CrawlTracker:
+    """Crawl progress shared by the discovery and fetch threads, checked against a budget"""
+
+    def __init__(self, budget: CrawlBudget, pages: int = 0):
+        """
+        Args:
+            budget: Limits of the crawl
+            pages: Pages saved before (a resumed crawl), counted against the page budget
+        """
+        self.budget = budget
+        self.start = time.monotonic()
+        self.pages = pages
+        self.failed = 0
+        self.in_flight = 0
+        self.fetched_bytes = 0
+        self.stop_reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def exhausted(self, in_flight: bool = True) -> Optional[str]:
+        """
+        The exhausted limit
+
+        Args:
+            in_flight: Count pages being fetched as done. Discovery passes False: idle
+                workers hold reservations while they wait for the URLs it finds.
+        """
+        with self._lock:
+            return self._exhausted(in_flight)
+
+    def _exhausted(self, in_flight: bool = True) -> Optional[str]:
+        pages = self.pages + self.in_flight if in_flight else self.pages
+        reason = self.budget.exhausted(pages, self.elapsed, self.fetched_bytes)
+        if reason and self.stop_reason is None:
+            self.stop_reason = reason
+        return reason
+
+    def reserve(self) -> bool:
+        """Claim budget for one more page fetch"""
+        with self._lock:
+            if self._exhausted():
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, saved: bool):
+        """Return a reserved fetch; only saved pages count against the page budget"""
+        with self._lock:
+            self.in_flight -= 1
+            if saved:
+                self.pages += 1
+            else:
+                self.failed += 1
+
+    def cancel(self):
+        """Return a reserved fetch that didn't happen"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def add_bytes(self, count: int):
+        with self._lock:
+            self.fetched_bytes += count
+
+
+@dataclass(order=True)
+class FrontierItem:
+    sort_key: Tuple[float, int]
+    url: str = field(compare=False)
+    score: float = field(compare=False, default=0.0)
+    lastmod: Optional[datetime] = field(compare=False, default=None)
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """Sitemap <lastmod> (W3C datetime) as an aware datetime, None if missing or invalid"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_priority(value: Optional[str]) -> float:
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except (TypeError, ValueError):
+        return 0.5
+
+
+class UrlScorer:
+    """Scores URLs from their sitemap metadata and the URL rules"""
+
+    def __init__(self, rules: Sequence[Tuple[str, Optional[float]]] = DEFAULT_URL_RULES,
+                 freshness_weight: float = 0.5, freshness_half_life_days: float = 90.0):
+        self.rules = [(re.compile(pattern), weight) for pattern, weight in rules]
+        self.freshness_weight = freshness_weight
+        self.freshness_half_life_days = freshness_half_life_days
+
+    def rule_weight(self, url: str) -> Optional[float]:
+        for pattern, weight in self.rules:
+            if pattern.search(url):
+                return weight
+        return 0.0
+
+    def freshness(self, lastmod: Optional[datetime], now: Optional[datetime] = None) -> float:
+        if lastmod is None:
+            return 0.0
+        age_days = max(((now or datetime.now(timezone.utc)) - lastmod).total_seconds() / 86400, 0.0)
+        return self.freshness_weight * 0.5 ** (age_days / self.freshness_half_life_days)
+
+    def score(self, url: str, priority: Optional[str] = None, lastmod: Optional[datetime] = None) -> Optional[float]:
+        """Score of a URL (higher is crawled first), None if a rule excludes it"""
+        weight = self.rule_weight(url)
+        if weight is None:
+            return None
+        return parse_priority(priority) + weight + self.freshness(lastmod)
+
+
+class CrawlFrontier:
+    """Thread-safe max-score queue of URLs to fetch, fed while it is consumed"""
+
+    def __init__(self, scorer: Optional[UrlScorer] = None):
+        self.scorer = scorer or UrlScorer()
+        self._heap: List[FrontierItem] = []
+        self._seen = set()
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._discovery_done = False
+        self.excluded = 0
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    @property
+    def seen(self) -> int:
+        return len(self._seen)
+
+    def push(self, url: str, priority: Optional[str] = None, lastmod: Optional[str] = None) -> bool:
+        """Add a URL unless already seen or excluded; returns whether it was added"""
+        url = urldefrag(url.strip())[0]
+        parsed_lastmod = parse_lastmod(lastmod)
+        score = self.scorer.score(url, priority, parsed_lastmod)
+        with self._condition:
+            if url in self._seen:
+                return False
+            self._seen.add(url)
+            if score is None:
+                self.excluded += 1
+                return False
+            # Ties keep discovery order
+            item = FrontierItem((-score, next(self._order)), url, score, parsed_lastmod)
+            heapq.heappush(self._heap, item)
+            self._condition.notify()
+        return True
+
+    def skip(self, urls: Iterable[str]):
+        """Mark URLs as seen without queueing them (e.g. pages fetched before a restart)"""
+        with self._condition:
+            self._seen.update(urldefrag(url.strip())[0] for url in urls)
+
+    def pop(self, timeout: float = 0.5) -> Optional[FrontierItem]:
+        """Best queued item, waiting up to `timeout` for one while discovery is running"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._heap:
+                remaining = deadline - time.monotonic()
+                if self._discovery_done or remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return heapq.heappop(self._heap)
+
+    def finish_discovery(self):
+        """No more URLs will be pushed; lets waiting consumers stop"""
+        with self._condition:
+            self._discovery_done = True
+            self._condition.notify_all()
+
+    @property
+    def discovery_done(self) -> bool:
+        return self._discovery_done
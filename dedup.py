@@ -0,0 +1,204 @@
+"""
+Corpus-level removal of boilerplate and near-duplicate content before embedding.
+
+Two passes:
+
+1. Boilerplate blocks. Pages are split into markdown blocks (paragraphs,
+   lists, tables); a block whose normalized text shows up on many pages
+   (shipping banners, "you may also like", footers, review widgets) is kept
+   on the first page it appears on and removed from all the others, so its
+   information is still retrievable once.
+2. Near-duplicate chunks. Chunks are MinHashed over word shingles and
+   bucketed with LSH; a chunk whose estimated Jaccard similarity to an
+   already kept chunk is above the threshold is dropped.
+
+Only numpy is needed.
+"""
+import logging
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from markdown_chunker import parse_blocks, parse_frontmatter
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class DedupStats:
+    """What the dedup passes removed"""
+    pages: int = 0
+    boilerplate_blocks: int = 0
+    boilerplate_chars: int = 0
+    input_chars: int = 0
+    input_chunks: int = 0
+    duplicate_chunks: int = 0
+
+    @property
+    def boilerplate_ratio(self) -> float:
+        return self.boilerplate_chars / self.input_chars if self.input_chars else 0.0
+
+    @property
+    def duplicate_ratio(self) -> float:
+        return self.duplicate_chunks / self.input_chunks if self.input_chunks else 0.0
+
+    def summary(self) -> str:
+        return (f"removed {self.boilerplate_blocks} boilerplate blocks "
+                f"({self.boilerplate_chars} chars, {self.boilerplate_ratio:.0%} of {self.pages} pages) "
+                f"and {self.duplicate_chunks}/{self.input_chunks} near-duplicate chunks")
+
+
+def normalize_block(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def remove_boilerplate(pages: Dict[str, str],
+                       min_pages: int = 3,
+                       min_page_fraction: float = 0.2,
+                       min_chars: int = 20,
+                       stats: Optional[DedupStats] = None) -> Dict[str, str]:
+    """
+    Remove blocks repeated across many pages, keeping their first occurrence.
+
+    Args:
+        pages: Page id -> markdown text (frontmatter is preserved)
+        min_pages: A block must appear on at least this many pages to be boilerplate
+        min_page_fraction: ...and on at least this fraction of all pages
+        min_chars: Shorter blocks are always kept (cheap, and often page-specific facts)
+        stats: Updated with what was removed
+
+    Returns:
+        Page id -> cleaned markdown text
+    """
+    stats = stats if stats is not None else DedupStats()
+    parsed = {}
+    page_frequency = Counter()
+    for page_id, text in pages.items():
+        meta, body = parse_frontmatter(text)
+        frontmatter = text[:len(text) - len(body)]
+        blocks = parse_blocks(body)
+        parsed[page_id] = (frontmatter, blocks)
+        page_frequency.update({normalize_block(block) for kind, block in blocks if kind != "heading"})
+
+    threshold = max(min_pages, min_page_fraction * len(pages))
+    seen = set()
+    cleaned = {}
+    for page_id, (frontmatter, blocks) in parsed.items():
+        kept = []
+        for kind, block in blocks:
+            stats.input_chars += len(block)
+            key = normalize_block(block)
+            if (kind != "heading" and len(key) >= min_chars
+                    and page_frequency[key] >= threshold and key in seen):
+                stats.boilerplate_blocks += 1
+                stats.boilerplate_chars += len(block)
+                continue
+            seen.add(key)
+            kept.append(block)
+        cleaned[page_id] = frontmatter + "\n\n".join(kept) + "\n"
+    stats.pages += len(pages)
+    return cleaned
+
+
+class MinHasher:
+    """MinHash signatures over word shingles"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        # a * x stays below 2**63 for 32-bit shingle hashes, so uint64 math doesn't overflow
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        grams = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(_MERSENNE_PRIME)
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """LSH index answering "is this text a near duplicate of one already added?" """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at or above which texts are duplicates
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm / bands rows each); candidates are verified
+                against `threshold`, so bands only trade recall for speed
+            shingle_size: Words per shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, signature: np.ndarray) -> Tuple[int, float]:
+        """Best matching added item (index, estimated similarity) or (-1, 0.0)"""
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        best, best_similarity = -1, 0.0
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return best, best_similarity
+
+    def add(self, signature: np.ndarray) -> int:
+        item = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(item)
+        return item
+
+    def add_if_new(self, text: str) -> bool:
+        """Add `text` unless it is a near duplicate of an added text; returns whether it was added"""
+        signature = self.hasher.signature(text)
+        _, similarity = self.query(signature)
+        if similarity >= self.threshold:
+            return False
+        self.add(signature)
+        return True
+
+
+def drop_near_duplicates(chunks: List[Dict], threshold: float = 0.8,
+                         stats: Optional[DedupStats] = None) -> List[Dict]:
+    """
+    Drop chunks that are near duplicates of an earlier chunk.
+
+    Args:
+        chunks: Chunk dicts with a "text" key, in priority order (earlier ones are kept)
+        threshold: Estimated Jaccard similarity above which a chunk is dropped
+        stats: Updated with what was removed
+
+    Returns:
+        The kept chunks, in their original order
+    """
+    stats = stats if stats is not None else DedupStats()
+    index = NearDuplicateIndex(threshold=threshold)
+    kept = [chunk for chunk in chunks if index.add_if_new(chunk["text"])]
+    stats.input_chunks += len(chunks)
+    stats.duplicate_chunks += len(chunks) - len(kept)
+    return kept
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent query encodes into single model calls.
+
+    Callers from any thread (or any event loop, via `aencode`) submit a text
+    and get a future back. A background thread takes the first pending request,
+    gathers whatever else is queued, waits at most `max_wait_ms` for more and
+    encodes up to `max_batch_size` texts in one `model.encode` call.
+
+    When the encoder is idle a lone request is only delayed by `max_wait_ms`
+    (set it to 0 to dispatch immediately); under load, requests that arrive
+    while a batch is encoding are picked up together in the next one.
+
+    Batching needs concurrent queries in the same process. LiveKit runs each
+    agent job in its own process, so it is enabled where one process serves
+    many sessions: the retrieval sidecar (and the load test's shared
+    retriever), not the in-process fallback of get_retriever.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """
+        Args:
+            model: SentenceTransformer (or anything with a compatible `encode`)
+            max_batch_size: Maximum number of texts per encode call
+            max_wait_ms: Maximum time the first request of a batch waits for others
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding, returns a Future resolving to its embedding"""
+        if self._closed:
+            raise RuntimeError("EmbeddingBatcher is closed")
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Blocking encode of a single text through the batcher"""
+        return self.submit(text).result()
+
+    async def aencode(self, text: str) -> np.ndarray:
+        """Async encode of a single text through the batcher"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def close(self):
+        """Stop the background thread after draining pending requests"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the sentinel so the run loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            # Callers cancelled meanwhile (e.g. an aencode task) are skipped; the others
+            # can't be cancelled any more once their future runs
+            batch = [(text, future) for text, future in self._collect(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+            except Exception as e:
+                logger.error(f"Batch encode of {len(texts)} queries failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
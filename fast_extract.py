@@ -0,0 +1,255 @@
+"""
+Single-pass HTML to markdown extraction on lxml.
+
+The default extractor (sitemap.py) parses each page with BeautifulSoup's
+pure-Python html.parser, serializes the main element back to HTML and
+parses it again in html2text. This one parses once with lxml's C parser,
+picks the main content element with the same selectors and writes markdown
+in one walk over it, skipping scripts, navigation and other non-content
+elements on the way instead of removing them first.
+
+The markdown follows html2text's conventions (ignore_links=False,
+ignore_images=False, body_width=0) so both extractors produce the same
+text; tables are written as pipe tables, which markdown_chunker keeps
+together.
+
+lxml is optional: `available()` tells whether this extractor can be used.
+"""
+import re
+from typing import List, Tuple
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# Elements dropped with their content, as in clean_html_to_markdown
+SKIP_TAGS = {"script", "style", "nav", "footer", "header", "aside", "iframe", "noscript",
+             "template", "svg", "form", "button", "select"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "figure", "figcaption", "dl", "dt", "dd",
+              "address", "details", "summary", "center"}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BOLD_TAGS = {"strong", "b"}
+ITALIC_TAGS = {"em", "i"}
+
+# Tried in order, like the selectors of clean_html_to_markdown
+MAIN_XPATHS = [
+    "//main",
+    "//article",
+    "//*[@role='main']",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]",
+    "//*[@id='content']",
+]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def available() -> bool:
+    return lxml is not None
+
+
+class _MarkdownWriter:
+    """Accumulates markdown, tracking pending line breaks and inline spacing"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.pending_breaks = 0
+        self.at_line_start = True
+        self.need_space = False
+        self.prefix = ""  # blockquote markers
+
+    def block(self, breaks: int = 2):
+        if self.parts:
+            self.pending_breaks = max(self.pending_breaks, breaks)
+        self.need_space = False
+
+    def line_break(self):
+        self.parts.append("  \n" + self.prefix)
+        self.at_line_start = True
+        self.need_space = False
+
+    def write(self, text: str, raw: bool = False):
+        """Append inline text; whitespace is collapsed unless `raw`"""
+        if not raw:
+            leading_space = text[:1].isspace()
+            trailing_space = text[-1:].isspace()
+            text = _WHITESPACE_RE.sub(" ", text).strip()
+            if not text:
+                self.need_space = self.need_space or leading_space or trailing_space
+                return
+            if leading_space:
+                self.need_space = True
+        if self.pending_breaks:
+            self.parts.append(("\n" + self.prefix) * self.pending_breaks)
+            self.pending_breaks = 0
+            self.at_line_start = True
+        elif self.need_space and not self.at_line_start:
+            self.parts.append(" ")
+        self.parts.append(text)
+        self.at_line_start = False
+        self.need_space = not raw and trailing_space
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+class MarkdownExtractor:
+    """Writes the markdown of an lxml element tree in one walk"""
+
+    def __init__(self):
+        self.out = _MarkdownWriter()
+        self.lists: List[Tuple[str, int]] = []
+
+    def inline_markdown(self, element) -> str:
+        """Markdown of an element's content on one line (table cells, link texts)"""
+        extractor = MarkdownExtractor()
+        extractor.children(element)
+        return _WHITESPACE_RE.sub(" ", extractor.out.text()).strip()
+
+    def children(self, element):
+        if element.text:
+            self.out.write(element.text)
+        for child in element:
+            self.element(child)
+            if child.tail:
+                self.out.write(child.tail)
+
+    def element(self, element):
+        tag = element.tag
+        if not isinstance(tag, str):  # comments and processing instructions
+            return
+        tag = tag.lower()
+        if tag in SKIP_TAGS:
+            return
+
+        if tag in HEADING_TAGS:
+            self.out.block()
+            self.out.write("#" * HEADING_TAGS[tag] + " " + self.inline_markdown(element), raw=True)
+            self.out.block()
+        elif tag in BLOCK_TAGS:
+            self.out.block()
+            self.children(element)
+            self.out.block()
+        elif tag == "br":
+            self.out.line_break()
+        elif tag == "hr":
+            self.out.block()
+            self.out.write("* * *", raw=True)
+            self.out.block()
+        elif tag == "a":
+            self.link(element)
+        elif tag == "img":
+            alt = _WHITESPACE_RE.sub(" ", element.get("alt") or "").strip()
+            if element.get("src"):
+                self.out.write(f"![{alt}]({element.get('src')})", raw=True)
+        elif tag in BOLD_TAGS or tag in ITALIC_TAGS:
+            content = self.inline_markdown(element)
+            if content:
+                mark = "**" if tag in BOLD_TAGS else "_"
+                self.out.write(f"{mark}{content}{mark}", raw=True)
+        elif tag == "code":
+            content = element.text_content().strip()
+            if content:
+                self.out.write(f"`{content}`", raw=True)
+        elif tag == "pre":
+            self.out.block()
+            code = element.text_content().strip("\n")
+            self.out.write("\n".join("    " + line for line in code.splitlines()), raw=True)
+            self.out.block()
+        elif tag in ("ul", "ol"):
+            self.out.block(1 if self.lists else 2)
+            self.lists.append((tag, 0))
+            self.children(element)
+            self.lists.pop()
+            self.out.block(1 if self.lists else 2)
+        elif tag == "li":
+            self.list_item(element)
+        elif tag == "table":
+            self.table(element)
+        elif tag == "blockquote":
+            self.out.block()
+            previous = self.out.prefix
+            self.out.prefix += "> "
+            self.out.parts.append(("\n" * self.out.pending_breaks) + self.out.prefix if self.out.parts else "> ")
+            self.out.pending_breaks = 0
+            self.out.at_line_start = True
+            self.children(element)
+            self.out.prefix = previous
+            self.out.block()
+        else:
+            self.children(element)
+
+    def link(self, element):
+        href = (element.get("href") or "").strip()
+        content = self.inline_markdown(element)
+        if not href or href.startswith("#") or href.startswith("javascript:"):
+            if content:
+                self.out.write(content, raw=True)
+        elif content:
+            self.out.write(f"[{content}]({href})", raw=True)
+
+    def list_item(self, element):
+        kind, count = self.lists[-1] if self.lists else ("ul", 0)
+        if self.lists:
+            self.lists[-1] = (kind, count + 1)
+        self.out.block(1)
+        marker = f"{count + 1}. " if kind == "ol" else "* "
+        self.out.write("  " * max(len(self.lists), 1) + marker, raw=True)
+        self.out.need_space = False
+        self.children(element)
+
+    def table(self, element):
+        rows = []
+        for row in element.iter("tr"):
+            cells = [self.inline_markdown(cell).replace("|", "\\|") for cell in row
+                     if isinstance(cell.tag, str) and cell.tag.lower() in ("td", "th")]
+            if any(cells):
+                rows.append(cells)
+        if not rows:
+            return
+        width = max(len(cells) for cells in rows)
+        lines = []
+        for i, cells in enumerate(rows):
+            lines.append("| " + " | ".join(cells + [""] * (width - len(cells))) + " |")
+            if i == 0:
+                lines.append("|" + "---|" * width)
+        self.out.block()
+        self.out.write("\n".join(lines), raw=True)
+        self.out.block()
+
+
+def find_main_content(root):
+    """The main content element, chosen like clean_html_to_markdown does, else <body>"""
+    for xpath in MAIN_XPATHS:
+        for candidate in root.xpath(xpath):
+            # Skip candidates inside elements the extractor drops
+            if not any(isinstance(parent.tag, str) and parent.tag.lower() in SKIP_TAGS
+                       for parent in candidate.iterancestors()):
+                return candidate
+    body = root.find(".//body")
+    return body if body is not None else root
+
+
+def extract(html_content) -> Tuple[str, str]:
+    """
+    Title and markdown of the main content of an HTML page.
+
+    Args:
+        html_content: Page HTML (bytes or str)
+
+    Returns:
+        (title, markdown)
+    """
+    if lxml is None:
+        raise ImportError("The fast extractor needs lxml: pip install lxml")
+    try:
+        root = lxml.html.document_fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        return "Untitled", ""
+    title_element = root.find(".//title")
+    title = title_element.text_content().strip() if title_element is not None else ""
+    extractor = MarkdownExtractor()
+    extractor.element(find_main_content(root))
+    markdown = re.sub(r"[ \t]+\n", lambda m: "  \n" if m.group(0).startswith("  ") else "\n", extractor.out.text())
+    return title or "Untitled", re.sub(r"\n{3,}", "\n\n", markdown).strip()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from livekit import rtc
+from livekit.agents import AgentSession, AgentStateChangedEvent
+
+from tts_cache import TTSAudioCache
+
+logger = logging.getLogger("agent-worker")
+
+GREETING = "Hello. How can I help you today?"
+
+# In-flight and loaded audio for fixed utterances, keyed by (tts model/voice, text).
+# Entries are futures so loading can be started early (e.g. while the session
+# connects) and awaited later without synthesizing twice. Audio is persisted in the
+# shared disk cache, so only the first process ever to use a voice calls the TTS.
+_audio_cache: Dict[Tuple[str, str], "asyncio.Future[List[rtc.AudioFrame]]"] = {}
+_tts_cache: Optional[TTSAudioCache] = None
+
+
+def get_tts_cache() -> TTSAudioCache:
+    """Get or initialize the disk cache of synthesized utterances"""
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSAudioCache()
+    return _tts_cache
+
+
+async def _load_or_synthesize(tts, tts_model: str, text: str) -> List[rtc.AudioFrame]:
+    cache = get_tts_cache()
+    frames = await asyncio.to_thread(cache.get, tts_model, text)
+    if frames is not None:
+        return frames
+    start = time.perf_counter()
+    frames = await cache.synthesize(tts, tts_model, text)
+    logger.info(f"Synthesized and cached '{text}' for {tts_model} in {time.perf_counter() - start:.2f}s")
+    return frames
+
+
+def presynthesize(tts, tts_model: str, text: str) -> "asyncio.Future[List[rtc.AudioFrame]]":
+    """Start loading or synthesizing `text` in the background unless it's loaded already"""
+    key = (tts_model, text)
+    future = _audio_cache.get(key)
+    if future is None or (future.done() and (future.cancelled() or future.exception())):
+        future = asyncio.ensure_future(_load_or_synthesize(tts, tts_model, text))
+        _audio_cache[key] = future
+    return future
+
+
+async def get_cached_audio(tts, tts_model: str, text: str) -> List[rtc.AudioFrame]:
+    """Get audio for `text` from the cache, synthesizing it on the first request"""
+    return await asyncio.shield(presynthesize(tts, tts_model, text))
+
+
+_background_tasks = set()
+
+
+def warm_tts_cache(session: AgentSession, tts_model: str):
+    """Synthesize fixed and frequently spoken utterances that aren't cached yet, in the background"""
+    task = asyncio.create_task(get_tts_cache().warm(session.tts, tts_model))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _replay(frames: List[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+    for frame in frames:
+        yield frame
+
+
+async def say_cached(session: AgentSession, tts_model: str, text: str, **kwargs):
+    """
+    session.say() that plays cached audio, falling back to live TTS on errors
+
+    Returns the speech handle once the utterance has been played out, like `await session.say(...)`.
+    """
+    try:
+        frames = await get_cached_audio(session.tts, tts_model, text)
+    except Exception as e:
+        logger.warning(f"Could not get cached audio for '{text}', using live TTS: {e}")
+        handle = session.say(text, **kwargs)
+    else:
+        handle = session.say(text, audio=_replay(frames), **kwargs)
+    await handle.wait_for_playout()
+    return handle
+
+
+def parse_job_metadata(metadata: Optional[str]) -> dict:
+    """Parse the JSON metadata attached to an explicit agent dispatch"""
+    try:
+        return json.loads(metadata) if metadata else {}
+    except json.JSONDecodeError as e:
+        logger.warning(f"Could not parse job metadata: {e}")
+        return {}
+
+
+def track_first_audio(session: AgentSession, room_name: str, token_issued_at: Optional[float] = None):
+    """
+    Log the time until the agent first starts speaking in this session.
+
+    Reports the time since the job started and, when the backend put
+    `token_issued_at` in the dispatch metadata, the end-to-end time from token
+    issuance to first agent audio (wall clocks, so it assumes the backend and
+    worker hosts are NTP-synced).
+    """
+    job_started = time.time()
+
+    def _on_agent_state_changed(ev: AgentStateChangedEvent):
+        if ev.new_state != "speaking":
+            return
+        session.off("agent_state_changed", _on_agent_state_changed)
+        now = time.time()
+        message = f"First agent audio in room {room_name}: {now - job_started:.2f}s after job start"
+        if token_issued_at:
+            message += f", {now - token_issued_at:.2f}s after token issuance"
+        logger.info(message)
+
+    session.on("agent_state_changed", _on_agent_state_changed)
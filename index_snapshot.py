@@ -0,0 +1,338 @@
+"""
+Versioned snapshots of the knowledge base vector index.
+
+A new agent host (or a test run with QDRANT_URL=:memory:) otherwise has to
+crawl and embed the website before it can answer anything. A snapshot is a
+self-contained directory that can be copied to it instead:
+
+    manifest.json     format version, collection, counts, vector dtype and the
+                      fingerprint of the embedding model that made the vectors
+    vectors.npy       chunk vectors, float32 or int8 (one row per point)
+    scales.npy        per-row scales of int8 vectors
+    payloads.jsonl    point ID and payload per row, in the order of vectors.npy
+    summaries.jsonl   precomputed summaries (summaries.py) with their vectors
+
+Importing memory-maps vectors.npy and upserts it in batches into a new
+build collection, then switches the collection alias to it (see
+MarkdownToVectorDB.switch_alias), so the running index is replaced at once.
+Vectors of a different embedding model would make every search return
+garbage, so import refuses a snapshot whose model fingerprint (embeddings
+of a few probe sentences) doesn't match the configured model.
+
+    python index_snapshot.py export snapshots/kb --dtype int8
+    python index_snapshot.py info snapshots/kb
+    python index_snapshot.py import snapshots/kb
+
+With INDEX_SNAPSHOT=<dir>, the retriever imports the snapshot when its
+collection doesn't exist yet (see retrieval_sidecar.get_retriever). Job
+processes starting together on a fresh host take a file lock for it, so
+only one of them imports.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from vector_compression import full_vector
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent bootstraps aren't serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "voice-agent-index-snapshot"
+SNAPSHOT_VERSION = 1
+INDEX_SNAPSHOT = os.getenv("INDEX_SNAPSHOT")
+BOOTSTRAP_LOCK_DIR = Path(os.getenv("INDEX_BOOTSTRAP_LOCK_DIR", tempfile.gettempdir()))
+# Embedded by export and import; a model producing different vectors for them is a different model
+PROBE_TEXTS = [
+    "What is the price of these wireless headphones?",
+    "Shipping and return policy for orders",
+    "Driver size, impedance and frequency response specifications",
+]
+MIN_PROBE_SIMILARITY = 0.99
+
+
+class SnapshotModelMismatch(ValueError):
+    """The snapshot's vectors come from a different embedding model"""
+
+
+def model_fingerprint(converter) -> dict:
+    """Name, dimension and probe sentence embeddings of a converter's embedding model"""
+    probes = np.asarray(converter.encode_texts(PROBE_TEXTS), dtype=np.float32)
+    return {
+        "name": converter.model_name,
+        "dimension": int(probes.shape[1]),
+        "probe_embeddings": np.round(probes, 6).tolist(),
+    }
+
+
+def check_model(expected: dict, actual: dict):
+    """Raise SnapshotModelMismatch unless two fingerprints are of the same model"""
+    if expected["dimension"] != actual["dimension"]:
+        raise SnapshotModelMismatch(
+            f"Snapshot vectors have {expected['dimension']} dimensions ({expected['name']}), "
+            f"the model has {actual['dimension']} ({actual['name']})")
+    a = np.asarray(expected["probe_embeddings"], dtype=np.float32)
+    b = np.asarray(actual["probe_embeddings"], dtype=np.float32)
+    similarity = float(np.min(np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))))
+    if similarity < MIN_PROBE_SIMILARITY:
+        raise SnapshotModelMismatch(
+            f"Snapshot was made with {expected['name']}, whose embeddings differ from the configured "
+            f"{actual['name']} (probe similarity {similarity:.3f})")
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: vectors ~= quantized * scales[:, None]"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _scroll(qdrant_client, collection_name: str, with_vectors: bool = True, batch_size: int = 256):
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name, limit=batch_size, offset=offset,
+            with_payload=True, with_vectors=with_vectors,
+        )
+        yield from points
+        if offset is None:
+            return
+
+
+class IndexSnapshot:
+    """A snapshot directory, with vectors.npy memory-mapped"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No snapshot manifest in {self.path}")
+        self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if self.manifest.get("format") != SNAPSHOT_FORMAT or self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{self.path} is not a version {SNAPSHOT_VERSION} index snapshot")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.scales = np.load(self.path / "scales.npy", mmap_mode="r") if self.manifest["dtype"] == "int8" else None
+
+    def __len__(self) -> int:
+        return self.manifest["points"]
+
+    def batches(self, batch_size: int = 256) -> Iterator[Tuple[List[dict], np.ndarray]]:
+        """(payload rows, float32 vectors) in batches, read from the memory map"""
+        with open(self.path / "payloads.jsonl", encoding="utf-8") as f:
+            rows, start = [], 0
+            for line in f:
+                rows.append(json.loads(line))
+                if len(rows) == batch_size:
+                    yield rows, self._vectors(start, start + len(rows))
+                    start += len(rows)
+                    rows = []
+            if rows:
+                yield rows, self._vectors(start, start + len(rows))
+
+    def _vectors(self, start: int, end: int) -> np.ndarray:
+        vectors = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[start:end])[:, None]
+        return vectors
+
+    def summaries(self) -> List[dict]:
+        path = self.path / "summaries.jsonl"
+        if not path.exists():
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+
+def export_snapshot(converter, path, dtype: str = "float32") -> dict:
+    """
+    Write the converter's collection and summaries to a snapshot directory.
+
+    Args:
+        converter: MarkdownToVectorDB of the collection to export
+        path: Snapshot directory (replaced if it exists)
+        dtype: "float32" or "int8" (4x smaller, per-row scaled)
+
+    Returns:
+        The snapshot manifest
+    """
+    from summaries import SummaryStore
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    count = converter.qdrant_client.count(collection_name=converter.collection_name, exact=True).count
+    fingerprint = model_fingerprint(converter)
+    vectors = np.lib.format.open_memmap(tmp_path / "vectors.npy", mode="w+", dtype=np.dtype(dtype),
+                                        shape=(count, fingerprint["dimension"]))
+    scales = np.zeros(count, dtype=np.float32)
+    written = 0
+    with open(tmp_path / "payloads.jsonl", "w", encoding="utf-8") as f:
+        for point in _scroll(converter.qdrant_client, converter.collection_name):
+            if written == count:
+                break  # Points added while exporting
+            vector = np.asarray([full_vector(point.vector)], dtype=np.float32)
+            if dtype == "int8":
+                vector, scale = quantize_int8(vector)
+                scales[written] = scale[0]
+            vectors[written] = vector[0]
+            f.write(json.dumps({"id": point.id, "payload": point.payload}, ensure_ascii=False) + "\n")
+            written += 1
+    vectors.flush()
+    del vectors
+    if dtype == "int8":
+        np.save(tmp_path / "scales.npy", scales[:written])
+
+    store = SummaryStore(converter.qdrant_client, converter.collection_name)
+    summaries = 0
+    if store.exists():
+        with open(tmp_path / "summaries.jsonl", "w", encoding="utf-8") as f:
+            for point in _scroll(converter.qdrant_client, store.collection_name):
+                f.write(json.dumps({"payload": point.payload, "vector": point.vector}, ensure_ascii=False) + "\n")
+                summaries += 1
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "collection": converter.collection_name,
+        "points": written,
+        "summaries": summaries,
+        "dtype": dtype,
+        "model": fingerprint,
+    }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Exported {written} points and {summaries} summaries to {path}")
+    return manifest
+
+
+def import_snapshot(converter, path, batch_size: int = 256) -> dict:
+    """
+    Load a snapshot into a new build collection and switch the converter's collection alias to it.
+
+    Args:
+        converter: MarkdownToVectorDB whose collection is replaced
+        path: Snapshot directory
+        batch_size: Points per upsert
+
+    Returns:
+        Import stats (points, summaries, build collection, seconds)
+
+    Raises:
+        SnapshotModelMismatch: The snapshot was made with another embedding model
+    """
+    from qdrant_client.http.models import PointStruct
+    from summaries import SummaryStore
+
+    start = time.perf_counter()
+    snapshot = IndexSnapshot(path)
+    check_model(snapshot.manifest["model"], model_fingerprint(converter))
+
+    # A new build per import, so re-importing never drops the collection being served
+    build_id = "snapshot" + time.strftime("%Y%m%d%H%M%S")
+    build = converter.build_collection_name(build_id)
+    for n in itertools.count(2):
+        if not converter.has_collection(build):
+            break
+        build = converter.build_collection_name(f"{build_id}-{n}")
+    converter.create_collection(build, snapshot.manifest["model"]["dimension"])
+    for rows, vectors in snapshot.batches(batch_size):
+        converter.qdrant_client.upsert(
+            collection_name=build,
+            points=[PointStruct(id=row["id"], vector=converter.compression.point_vector(vector), payload=row["payload"])
+                    for row, vector in zip(rows, vectors)],
+        )
+
+    previous = converter.switch_alias(build)
+    if previous and previous != build:
+        converter.qdrant_client.delete_collection(collection_name=previous)
+
+    summaries = snapshot.summaries()
+    if summaries:
+        store = SummaryStore(converter.qdrant_client, converter.collection_name)
+        if store.exists():
+            converter.qdrant_client.delete_collection(collection_name=store.collection_name)
+        store.setup(snapshot.manifest["model"]["dimension"])
+        store.upsert([row["payload"] for row in summaries], [np.asarray(row["vector"]) for row in summaries])
+
+    stats = {"points": len(snapshot), "summaries": len(summaries), "collection": build,
+             "seconds": round(time.perf_counter() - start, 2)}
+    logger.info(f"Imported snapshot {path}: {stats}")
+    return stats
+
+
+def _collection_exists(converter) -> bool:
+    return converter.alias_target() is not None or converter.has_collection(converter.collection_name)
+
+
+def bootstrap(converter, path: Optional[str] = INDEX_SNAPSHOT) -> Optional[dict]:
+    """
+    Import a snapshot if the converter's collection doesn't exist yet (fresh host or test run)
+
+    Every job process of a fresh host gets here at once. Unserialized, each
+    would import its own build and delete the one the previous import had
+    published. The import runs under a file lock (per host, in
+    INDEX_BOOTSTRAP_LOCK_DIR) and the collection is checked again once the
+    lock is held, so the processes that waited use the first import.
+    """
+    if not path or _collection_exists(converter):
+        return None
+    BOOTSTRAP_LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(BOOTSTRAP_LOCK_DIR / f"index-bootstrap-{converter.collection_name}.lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if _collection_exists(converter):
+            logger.info(f"Collection {converter.collection_name} was imported by another process")
+            return None
+        logger.info(f"Collection {converter.collection_name} missing, importing snapshot {path}")
+        return import_snapshot(converter, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import", "info"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--collection", default="markdown_knowledge_base")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Embedding model of the collection")
+    parser.add_argument("--dtype", choices=["float32", "int8"], default="float32", help="Vector type (export)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "info":
+        snapshot = IndexSnapshot(args.path)
+        manifest = {key: value for key, value in snapshot.manifest.items() if key != "model"}
+        manifest["model"] = {key: snapshot.manifest["model"][key] for key in ("name", "dimension")}
+        manifest["size_mb"] = round(sum(p.stat().st_size for p in snapshot.path.iterdir()) / 2 ** 20, 2)
+        print(json.dumps(manifest, indent=2))
+        return
+
+    from vector_db_init import MarkdownToVectorDB
+    converter = MarkdownToVectorDB(collection_name=args.collection, model_name=args.model)
+    if args.command == "export":
+        manifest = export_snapshot(converter, args.path, dtype=args.dtype)
+        print(f"Exported {manifest['points']} points ({manifest['dtype']}) to {args.path}")
+    else:
+        try:
+            stats = import_snapshot(converter, args.path)
+        except SnapshotModelMismatch as e:
+            parser.exit(1, f"Refusing to import: {e}\n")
+        print(f"Imported {stats['points']} points into {stats['collection']} in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
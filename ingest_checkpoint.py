@@ -0,0 +1,185 @@
+"""
+Durable checkpoints of a knowledge base extraction job, so a restarted job resumes.
+
+A job (one website) keeps its state in INGESTION_CHECKPOINT_DIR/<job id>/:
+
+    job.json          stage, job parameters, build collection
+    frontier.jsonl    page URLs discovered in sitemaps (appended per sitemap,
+                      "discovery_done" in job.json once all sitemaps are read)
+    shards/           fetched pages (shard_store.py), appended per page
+    chunks.jsonl      chunked documents, written once chunking finishes
+    upserted.txt      IDs of the points in the build collection, appended
+                      after each upserted batch
+
+and moves through the stages
+
+    crawl -> chunk -> embed -> publish
+
+Nothing that serves the agent is touched before "publish": the vectors go
+into a new build collection and the pages stay in the job directory. The
+publish step points the collection alias at the build, replaces the
+knowledge base documents and only then deletes the previous collection,
+so a crash at any point leaves the agent with the old knowledge base.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from shard_store import ShardStore
+
+logger = logging.getLogger(__name__)
+
+INGESTION_CHECKPOINT_DIR = Path(os.getenv("INGESTION_CHECKPOINT_DIR", ".cache/ingestion"))
+STAGES = ["crawl", "chunk", "embed", "publish"]
+
+
+def job_id(website_url: str) -> str:
+    """Directory name of a website's job: host plus a hash of the URL"""
+    host = re.sub(r"[^\w.-]", "_", urlparse(website_url).netloc) or "site"
+    return f"{host}-{hashlib.sha256(website_url.strip().encode('utf-8')).hexdigest()[:10]}"
+
+
+def _write_json(path: Path, data: Any):
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class IngestionCheckpoint:
+    """State and intermediate results of one extraction job on disk"""
+
+    def __init__(self, directory, params: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            directory: Job directory (created if missing)
+            params: Job parameters of a new job (website_url, max_pages, ...)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.state_path = self.directory / "job.json"
+        if self.state_path.exists():
+            self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        else:
+            self.state = {
+                "params": params or {},
+                "stage": STAGES[0],
+                "discovery_done": False,
+                # Unique even for jobs started within the same second
+                "build_id": f"{time.strftime('%Y%m%d%H%M%S')}-{os.urandom(3).hex()}",
+                "created": time.time(),
+            }
+            self._save()
+        self.pages = ShardStore(self.directory)
+
+    @classmethod
+    def for_website(cls, website_url: str, params: Dict[str, Any], resume: bool = True,
+                    root: Path = INGESTION_CHECKPOINT_DIR) -> "IngestionCheckpoint":
+        """
+        The website's unfinished job if it has the same parameters, else a new job.
+
+        Args:
+            website_url: Website being extracted
+            params: Job parameters; a job started with different ones is discarded
+            resume: False to always discard an unfinished job
+            root: Directory of all job directories
+        """
+        directory = Path(root) / job_id(website_url)
+        params = {"website_url": website_url, **params}
+        if directory.exists():
+            existing = cls(directory)
+            if resume and existing.state["params"] == params:
+                logger.info(f"Resuming extraction job {directory.name} at stage {existing.stage} "
+                            f"({len(existing.pages)} pages fetched)")
+                return existing
+            logger.info(f"Discarding unfinished extraction job {directory.name}")
+            existing.discard()
+        return cls(directory, params)
+
+    def _save(self):
+        _write_json(self.state_path, self.state)
+
+    @property
+    def stage(self) -> str:
+        return self.state["stage"]
+
+    def reached(self, stage: str) -> bool:
+        """Whether the job is at or past `stage`"""
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def advance(self, stage: str):
+        """Record that every stage before `stage` is complete"""
+        self.state["stage"] = stage
+        self._save()
+        logger.info(f"Extraction job {self.directory.name}: stage {stage}")
+
+    def set(self, **values):
+        self.state.update(values)
+        self._save()
+
+    @property
+    def build_id(self) -> str:
+        return self.state["build_id"]
+
+    # crawl
+
+    def record_discovered(self, entries: Iterable[Dict[str, Any]]):
+        """Append discovered page entries (loc, priority, lastmod)"""
+        lines = "".join(json.dumps({key: entry.get(key) for key in ("loc", "priority", "lastmod")}) + "\n"
+                        for entry in entries)
+        if lines:
+            with open(self.directory / "frontier.jsonl", "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def discovered(self) -> List[Dict[str, Any]]:
+        """Page entries discovered so far (a line cut short by a crash is skipped)"""
+        path = self.directory / "frontier.jsonl"
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def fetched_urls(self) -> Set[str]:
+        return {entry.url for entry in self.pages.entries() if entry.url}
+
+    # chunk
+
+    def save_chunks(self, chunks: List[Dict[str, Any]]):
+        path = self.directory / "chunks.jsonl"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def load_chunks(self) -> List[Dict[str, Any]]:
+        with open(self.directory / "chunks.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    # embed
+
+    def record_upserted(self, point_ids: Iterable[str]):
+        with open(self.directory / "upserted.txt", "a", encoding="utf-8") as f:
+            f.write("".join(f"{point_id}\n" for point_id in point_ids))
+
+    def upserted(self) -> Set[str]:
+        path = self.directory / "upserted.txt"
+        if not path.exists():
+            return set()
+        return {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+
+    def discard(self):
+        """Delete the job directory"""
+        shutil.rmtree(self.directory, ignore_errors=True)
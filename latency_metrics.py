@@ -0,0 +1,235 @@
+"""
+Per-turn latency instrumentation with Prometheus export.
+
+Each user turn is tracked by its speech id and gets one structured log line
+with end-of-utterance delay, retrieval time (embedding and vector search
+separately, plus how long the turn actually waited on it), LLM time to
+first token and TTS time to first byte. The same values are observed into
+Prometheus histograms labelled by tenant and room. TTS audio cache hits,
+misses and hit rate are exported alongside.
+
+prometheus_client is optional: without it everything still gets logged and
+the exporters are no-ops. Agent jobs run in separate processes, so the
+worker exporter aggregates them through prometheus_client's multiprocess
+mode; set PROMETHEUS_MULTIPROC_DIR to an empty directory to enable it.
+"""
+import json
+import logging
+import os
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger("agent-worker")
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import REGISTRY, multiprocess, start_http_server
+except ImportError:
+    Histogram = None
+
+# Room names are unique per session, so per-room series are opt-in
+PER_ROOM_LABELS = os.getenv("METRICS_PER_ROOM", "0") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+
+TURN_STAGES = {
+    "eou_delay": "End of speech to end-of-turn decision",
+    "transcription_delay": "End of speech to final transcript",
+    "rag_embed": "Query embedding time",
+    "rag_search": "Vector search time",
+    "rag_wait": "Time the turn waited on retrieval",
+    "llm_ttft": "LLM time to first token",
+    "tts_ttfb": "TTS time to first byte",
+}
+
+_histograms: Dict[str, "Histogram"] = {}
+
+# Retrieval timings for the lookup running in the current context. asyncio.to_thread
+# copies the context, so code deep inside a lookup can report into it.
+rag_timings: ContextVar[Optional[dict]] = ContextVar("rag_timings", default=None)
+
+
+def record_rag_timing(stage: str, seconds: float):
+    """Report a retrieval stage duration for the lookup in progress (if any)"""
+    timings = rag_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def _histogram(stage: str):
+    if Histogram is None:
+        return None
+    if stage not in _histograms:
+        _histograms[stage] = Histogram(
+            f"voice_turn_{stage}_seconds",
+            TURN_STAGES[stage],
+            ["tenant", "room"],
+            buckets=LATENCY_BUCKETS,
+        )
+    return _histograms[stage]
+
+
+class TurnLatencyTracker:
+    """
+    Collects the timings of each turn from the session's metrics events.
+
+    RAG timings are reported by the agent before the turn's end-of-utterance
+    metrics are emitted (on_user_turn_completed runs first), so they are
+    attached to the next EOU event. A turn is emitted once its TTS metrics
+    arrive, which is the last stage. Replies played from the TTS audio cache
+    produce no TTS metrics; the agent reports their time to first audio with
+    on_cached_tts() instead.
+    """
+
+    def __init__(self, room: str, tenant: str = "default", max_pending: int = 20):
+        self.room = room
+        self.tenant = tenant
+        self.labels = {"tenant": tenant, "room": room if PER_ROOM_LABELS else "all"}
+        self.max_pending = max_pending
+        self._pending_rag: Optional[dict] = None
+        self._turns: Dict[str, dict] = {}
+        # Emitted turns, so metrics arriving after a cached reply don't open a new one
+        self._emitted = deque(maxlen=max_pending)
+
+    def on_rag(self, timings: dict, current_turn: bool = False):
+        """
+        Report retrieval timings.
+
+        Args:
+            timings: Stage name -> seconds
+            current_turn: Attach to the turn being answered (RAG run as an LLM tool
+                call) instead of the next one (RAG run in on_user_turn_completed)
+        """
+        if not current_turn:
+            self._pending_rag = timings
+        elif self._turns:
+            turn = self._turns[next(reversed(self._turns))]
+            for stage, seconds in timings.items():
+                turn[stage] = turn.get(stage, 0.0) + seconds
+        else:
+            # No EOU event opened a turn (e.g. text input); the next turn didn't wait on this lookup
+            logger.debug(f"Dropping retrieval timings without an open turn: {timings}")
+
+    def on_cached_tts(self, speech_id: Optional[str], ttfb: float):
+        """
+        Report the time to first audio of a reply played from the TTS audio cache.
+
+        Args:
+            speech_id: Speech id of the reply (from the session's current speech)
+            ttfb: Seconds from the first text of the reply to its first audio frame
+        """
+        if not speech_id or speech_id in self._emitted:
+            return
+        turn = self._turn(speech_id)
+        turn["tts_ttfb"] = ttfb
+        turn["tts_cached"] = 1
+        # The LLM metrics may still be on their way; the turn is emitted once both are in
+        if "llm_ttft" in turn:
+            self._emit(speech_id, self._turns.pop(speech_id))
+
+    def on_metrics(self, ev_metrics):
+        """Feed a metrics object from the session's metrics_collected event"""
+        kind = getattr(ev_metrics, "type", "")
+        speech_id = getattr(ev_metrics, "speech_id", None)
+        if not speech_id or speech_id in self._emitted:
+            return
+
+        if kind == "eou_metrics":
+            turn = self._turn(speech_id)
+            turn["eou_delay"] = ev_metrics.end_of_utterance_delay
+            turn["transcription_delay"] = ev_metrics.transcription_delay
+            if self._pending_rag:
+                turn.update(self._pending_rag)
+                self._pending_rag = None
+        elif kind == "llm_metrics":
+            turn = self._turn(speech_id)
+            turn.setdefault("llm_ttft", ev_metrics.ttft)
+            if turn.get("tts_cached"):
+                self._emit(speech_id, self._turns.pop(speech_id))
+        elif kind == "tts_metrics":
+            turn = self._turns.pop(speech_id, None)
+            if turn is not None:
+                turn.setdefault("tts_ttfb", ev_metrics.ttfb)
+                self._emit(speech_id, turn)
+
+    def _turn(self, speech_id: str) -> dict:
+        if speech_id not in self._turns and len(self._turns) >= self.max_pending:
+            # A turn without TTS (e.g. interrupted): emit what we have
+            oldest = next(iter(self._turns))
+            self._emit(oldest, self._turns.pop(oldest))
+        return self._turns.setdefault(speech_id, {})
+
+    def _emit(self, speech_id: str, turn: dict):
+        self._emitted.append(speech_id)
+        for stage, seconds in turn.items():
+            histogram = _histogram(stage) if stage in TURN_STAGES else None
+            if histogram is not None and seconds is not None and seconds >= 0:
+                histogram.labels(**self.labels).observe(seconds)
+        record = {"room": self.room, "tenant": self.tenant, "speech_id": speech_id}
+        record.update({stage: round(seconds, 4) for stage, seconds in turn.items() if seconds is not None})
+        logger.info(f"Turn latency: {json.dumps(record)}")
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def start_metrics_server(port: int) -> bool:
+    """Serve /metrics for this process (and its job processes in multiprocess mode)"""
+    if Histogram is None:
+        logger.warning("prometheus_client is not installed, metrics export disabled")
+        return False
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set, metrics from job processes won't be exported")
+    start_http_server(port, registry=_registry())
+    logger.info(f"Serving Prometheus metrics on :{port}/metrics")
+    return True
+
+
+def metrics_payload():
+    """(body, content type) for a /metrics HTTP endpoint"""
+    if Histogram is None:
+        return b"", "text/plain"
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+_request_histogram = None
+
+
+def observe_request(method: str, path: str, status: int, seconds: float, tenant: str = "default"):
+    """Record the duration of an API request"""
+    global _request_histogram
+    if Histogram is None:
+        return
+    if _request_histogram is None:
+        _request_histogram = Histogram(
+            "api_request_duration_seconds",
+            "API request duration",
+            ["method", "path", "status", "tenant"],
+            buckets=LATENCY_BUCKETS,
+        )
+    _request_histogram.labels(method=method, path=path, status=str(status), tenant=tenant).observe(seconds)
+
+
+_tts_cache_lookups = None
+_tts_cache_hit_rate = None
+
+
+def observe_tts_cache(hit: bool, hit_rate: float):
+    """Count a TTS audio cache lookup and publish the process's running hit rate"""
+    global _tts_cache_lookups, _tts_cache_hit_rate
+    if Histogram is None:
+        return
+    if _tts_cache_lookups is None:
+        _tts_cache_lookups = Counter("tts_cache_lookups", "TTS audio cache lookups", ["result"])
+        # One series per live job process in multiprocess mode; the overall rate is
+        # rate(tts_cache_lookups_total{result="hit"}) / rate(tts_cache_lookups_total)
+        _tts_cache_hit_rate = Gauge("tts_cache_hit_rate", "TTS audio cache hit rate of the process",
+                                    multiprocess_mode="liveall")
+    _tts_cache_lookups.labels(result="hit" if hit else "miss").inc()
+    _tts_cache_hit_rate.set(hit_rate)
@@ -0,0 +1,273 @@
+"""
+Markdown-structure-aware chunking sized in embedding model tokens.
+
+Pages are split along their heading hierarchy. Within a section, tables,
+lists, code blocks and paragraphs are kept whole whenever they fit, and
+consecutive blocks are packed into chunks of at most `max_tokens` model
+tokens, so the embedding model never silently truncates a chunk. Blocks
+that are too large on their own are split by rows (tables repeat their
+header), items, lines, sentences and finally words.
+
+Every chunk records the page title from the frontmatter and its section
+path. The "Title > Section > Subsection" breadcrumb is kept as the chunk's
+`context` and counted in its token budget, so it can be embedded together
+with the text without pushing the chunk over the model's limit.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_FRONTMATTER_RE = re.compile(r"\A---\s*\n(.*?)\n---\s*\n", re.DOTALL)
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM_RE = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_TOKEN_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_token_count(texts: Sequence[str]) -> List[int]:
+    """Word/punctuation count, a lower bound on WordPiece tokens (used without a tokenizer)"""
+    return [len(_TOKEN_ESTIMATE_RE.findall(text)) for text in texts]
+
+
+def tokenizer_counter(tokenizer) -> Callable[[Sequence[str]], List[int]]:
+    """Batch token counter for a Hugging Face tokenizer (e.g. SentenceTransformer.tokenizer)"""
+    def count(texts: Sequence[str]) -> List[int]:
+        if not texts:
+            return []
+        encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+    return count
+
+
+def parse_frontmatter(text: str) -> Tuple[Dict[str, str], str]:
+    """Split a page into its `key: value` frontmatter and body"""
+    match = _FRONTMATTER_RE.match(text)
+    if not match:
+        return {}, text
+    meta = {}
+    for line in match.group(1).splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            meta[key.strip()] = value.strip()
+    return meta, text[match.end():]
+
+
+def _block_kind(line: str) -> str:
+    stripped = line.strip()
+    if stripped.startswith("|"):
+        return "table"
+    if _LIST_ITEM_RE.match(line):
+        return "list"
+    return "text"
+
+
+def parse_blocks(body: str) -> List[Tuple[str, str]]:
+    """
+    Split a markdown body into (kind, text) blocks.
+
+    Kinds are "heading" (text is the raw heading line), "code", "table",
+    "list" and "text". Blank lines end a block; a change between table,
+    list and text lines also ends it.
+    """
+    blocks = []
+    current: List[str] = []
+    current_kind = None
+    in_fence = False
+
+    def flush():
+        nonlocal current, current_kind
+        if current:
+            blocks.append((current_kind, "\n".join(current)))
+        current, current_kind = [], None
+
+    for line in body.splitlines():
+        if in_fence:
+            current.append(line)
+            if _FENCE_RE.match(line):
+                in_fence = False
+                flush()
+            continue
+        if _FENCE_RE.match(line):
+            flush()
+            current, current_kind, in_fence = [line], "code", True
+            continue
+        if not line.strip():
+            flush()
+            continue
+        if _HEADING_RE.match(line):
+            flush()
+            blocks.append(("heading", line.strip()))
+            continue
+
+        kind = _block_kind(line)
+        # Indented lines continue the list item above them
+        if current_kind == "list" and kind == "text" and line[:1].isspace():
+            kind = "list"
+        if current_kind is not None and kind != current_kind:
+            flush()
+        current_kind = kind
+        current.append(line)
+    flush()
+    return blocks
+
+
+class MarkdownChunker:
+    """Heading-aware markdown splitter that sizes chunks in model tokens"""
+
+    def __init__(self,
+                 count_tokens: Optional[Callable[[Sequence[str]], List[int]]] = None,
+                 max_tokens: int = 254,
+                 min_tokens: int = 48):
+        """
+        Args:
+            count_tokens: Batch token counter (see tokenizer_counter); defaults to an estimate
+            max_tokens: Maximum tokens per chunk including the breadcrumb, without
+                special tokens (MiniLM encodes at most 256 tokens including [CLS]/[SEP])
+            min_tokens: Chunks smaller than this keep absorbing the next section
+                instead of being emitted on their own
+        """
+        self.count_tokens = count_tokens or approx_token_count
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+
+    def _split_oversized(self, kind: str, text: str, budget: int) -> List[str]:
+        """Split one block that doesn't fit in `budget` tokens into pieces that do"""
+        lines = text.split("\n")
+        header: List[str] = []
+        if kind == "table" and len(lines) > 2 and _TABLE_SEPARATOR_RE.match(lines[1]):
+            header, lines = lines[:2], lines[2:]
+        if len(lines) > 1:
+            units, joiner = lines, "\n"
+        else:
+            units = _SENTENCE_RE.split(text)
+            joiner = " "
+            if len(units) == 1:
+                units = text.split()
+
+        if len(units) == 1:
+            # A single "word" longer than the budget (e.g. run-together image links): cut it
+            # into character slices of roughly `budget` tokens each
+            tokens = self.count_tokens([text])[0]
+            step = max(1, int(len(text) * budget * 0.9 / max(tokens, 1)))
+            return [text[i:i + step] for i in range(0, len(text), step)]
+
+        header_tokens = self.count_tokens(["\n".join(header)])[0] if header else 0
+        if header_tokens > budget // 2:
+            # Repeating a header this large would leave no room for rows
+            units, header, header_tokens = header + units, [], 0
+        pieces, current, current_tokens = [], [], header_tokens
+        for unit, tokens in zip(units, self.count_tokens(units)):
+            if tokens + header_tokens > budget:
+                # A single line/sentence that is still too large: recurse down to words
+                if current:
+                    pieces.append(joiner.join(header + current) if header else joiner.join(current))
+                    current, current_tokens = [], header_tokens
+                pieces.extend(self._split_oversized("text", unit, budget - header_tokens))
+                continue
+            if current and current_tokens + tokens > budget:
+                pieces.append(joiner.join(header + current) if header else joiner.join(current))
+                current, current_tokens = [], header_tokens
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            pieces.append(joiner.join(header + current) if header else joiner.join(current))
+        return pieces
+
+    def split(self, text: str, source: str = "") -> List[Dict]:
+        """
+        Split one markdown page into chunks.
+
+        Args:
+            text: Page content, optionally starting with a --- frontmatter block
+            source: Page identifier stored with each chunk
+
+        Returns:
+            Chunk dicts with text, context (breadcrumb), title, section, source,
+            token_count (text + context), char_count, word_count
+        """
+        meta, body = parse_frontmatter(text)
+        blocks = parse_blocks(body)
+        title = meta.get("title")
+        if not title:
+            title = next((_HEADING_RE.match(b)[2] for kind, b in blocks if kind == "heading"), "No title")
+
+        token_counts = self.count_tokens([block for _, block in blocks])
+        chunks = []
+        headings: List[Tuple[int, str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        section_path: List[str] = []
+        breadcrumb_tokens = 0
+
+        def breadcrumb(path: List[str]) -> str:
+            return " > ".join([title] + path)
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                chunk_text = "\n\n".join(current)
+                chunks.append({
+                    "text": chunk_text,
+                    "context": breadcrumb(section_path),
+                    "title": title,
+                    "section": " > ".join(section_path),
+                    "source": source,
+                    "token_count": current_tokens + breadcrumb_tokens,
+                    "char_count": len(chunk_text),
+                    "word_count": len(chunk_text.split()),
+                })
+            current, current_tokens = [], 0
+
+        def start_chunk():
+            nonlocal section_path, breadcrumb_tokens
+            # The first heading usually repeats the page title
+            section_path = [name for _, name in headings if name != title]
+            breadcrumb_tokens = self.count_tokens([breadcrumb(section_path)])[0]
+
+        # Tokens of an absorbed heading that is the last block of the current chunk
+        trailing_heading = None
+
+        def flush_overflow():
+            # A section heading left dangling at the end of a chunk moves into the next
+            # chunk's breadcrumb instead
+            nonlocal current_tokens
+            if trailing_heading is not None:
+                current.pop()
+                current_tokens -= trailing_heading
+            flush()
+            start_chunk()
+
+        for (kind, block), tokens in zip(blocks, token_counts):
+            if kind == "heading":
+                match = _HEADING_RE.match(block)
+                level, name = len(match[1]), match[2]
+                if current_tokens + breadcrumb_tokens >= self.min_tokens:
+                    flush()
+                headings = [(lvl, n) for lvl, n in headings if lvl < level] + [(level, name)]
+                if not current:
+                    continue
+                # Small chunk absorbing the next section: keep the heading as text
+                current.append(block)
+                current_tokens += tokens
+                trailing_heading = tokens
+                continue
+
+            if not current:
+                start_chunk()
+            budget = self.max_tokens - breadcrumb_tokens
+            if tokens > budget:
+                flush_overflow()
+                budget = self.max_tokens - breadcrumb_tokens
+                for piece in self._split_oversized(kind, block, budget):
+                    current.append(piece)
+                    current_tokens = self.count_tokens([piece])[0]
+                    flush()
+            else:
+                if current_tokens + tokens > budget:
+                    flush_overflow()
+                current.append(block)
+                current_tokens += tokens
+            trailing_heading = None
+        flush()
+        return chunks
@@ -0,0 +1,242 @@
+"""
+Adaptive per-host politeness for the crawler (AIMD concurrency control).
+
+Each host gets a HostController holding a concurrency limit that is tuned
+from the responses, like TCP congestion control:
+
+- additive increase: while latency stays near the host's baseline, the
+  limit grows by about one request per window of responses
+- multiplicative decrease: on 429, 5xx or latency rising above
+  `latency_tolerance` times the baseline, the limit is cut (at most once per
+  round trip, so one burst of slow responses counts as one signal)
+- Retry-After (seconds or HTTP date) pauses every request to the host, and
+  429/503 without it back off exponentially; afterwards the limit grows
+  slowly near the value that was throttled, as rate limits don't move
+- robots.txt Crawl-delay is a minimum interval between request starts, on
+  every host the crawl of the site touches
+
+So the crawler converges on the highest concurrency the host serves
+without slowing down or throttling, instead of a fixed sleep per request.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(retry_at.timestamp() - (now or datetime.now(timezone.utc).timestamp()), 0.0)
+
+
+class HostController:
+    """AIMD concurrency limit and request pacing for one host"""
+
+    def __init__(self,
+                 initial_limit: float = 2.0,
+                 min_limit: float = 1.0,
+                 max_limit: float = 8.0,
+                 decrease_factor: float = 0.5,
+                 latency_tolerance: float = 1.5,
+                 min_interval: float = 0.0,
+                 max_backoff: float = 300.0):
+        """
+        Args:
+            initial_limit: Concurrent requests allowed at first
+            min_limit: Never allow fewer concurrent requests than this
+            max_limit: Never allow more concurrent requests than this
+            decrease_factor: Limit multiplier on a congestion signal
+            latency_tolerance: Latency above this multiple of the baseline is congestion
+            min_interval: Minimum seconds between request starts (Crawl-delay)
+            max_backoff: Longest pause honored for Retry-After or error backoff
+        """
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.latency: Optional[float] = None   # EWMA of response times
+        self.baseline: Optional[float] = None  # latency of the unloaded host
+        self.last_decrease = 0.0
+        self.throttle_limit: Optional[float] = None
+        self.consecutive_throttles = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.peak_limit = initial_limit
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for a request slot within the limit and the pacing"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.in_flight < int(self.limit) and now >= self.next_start:
+                    self.in_flight += 1
+                    self.next_start = max(self.next_start, now) + self.min_interval
+                    return
+                timeout = self.next_start - now if self.in_flight < int(self.limit) else None
+                self._condition.wait(timeout)
+
+    def release(self, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """
+        Record a finished request and adapt the limit.
+
+        Args:
+            status: HTTP status, None for a connection error or timeout
+            latency: Seconds from request start to response
+            retry_after: Seconds from the Retry-After header, if any
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.requests += 1
+            now = time.monotonic()
+            if status in THROTTLE_STATUSES or status is None or status >= 500:
+                if status in THROTTLE_STATUSES:
+                    self.throttled += 1
+                    self.consecutive_throttles += 1
+                    pause = retry_after if retry_after is not None else 2.0 ** self.consecutive_throttles
+                    self.next_start = max(self.next_start, now + min(pause, self.max_backoff))
+                else:
+                    self.errors += 1
+                self._decrease(now, throttled=status in THROTTLE_STATUSES)
+            else:
+                self.consecutive_throttles = 0
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if self.baseline is None or self.latency < self.baseline:
+                    self.baseline = self.latency
+                else:
+                    # Follow lasting changes of the host's unloaded speed slowly
+                    self.baseline += 0.001 * (self.latency - self.baseline)
+                if self.latency > self.latency_tolerance * self.baseline:
+                    self._decrease(now)
+                else:
+                    self._increase()
+            self._condition.notify_all()
+
+    def _increase(self):
+        step = 1.0 / self.limit
+        if self.throttle_limit is not None:
+            if self.limit > self.throttle_limit:
+                self.throttle_limit = None
+            elif self.limit >= 0.8 * self.throttle_limit:
+                # Probe slowly near the concurrency the host last throttled at
+                step *= 0.1
+        self.limit = min(self.limit + step, self.max_limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, now: float, throttled: bool = False):
+        if throttled:
+            self.throttle_limit = self.limit
+        # Responses to requests sent before the last cut carry no new information
+        elif now - self.last_decrease < (self.latency or 0.0):
+            return
+        self.limit = max(self.limit * self.decrease_factor, self.min_limit)
+        self.last_decrease = now
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "peak_limit": round(self.peak_limit, 2),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "latency_ms": round((self.latency or 0.0) * 1000, 1),
+            "baseline_ms": round((self.baseline or 0.0) * 1000, 1),
+        }
+
+
+class PolitenessController:
+    """HostControllers by host, created on first request"""
+
+    def __init__(self, **host_options):
+        """
+        Args:
+            host_options: HostController arguments; max_limit defaults to
+                CRAWL_MAX_CONCURRENCY, then 8
+        """
+        host_options.setdefault("max_limit", float(os.getenv("CRAWL_MAX_CONCURRENCY", "8")))
+        self.host_options = host_options
+        self._hosts: Dict[str, HostController] = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> HostController:
+        netloc = urlparse(url).netloc
+        with self._lock:
+            if netloc not in self._hosts:
+                self._hosts[netloc] = HostController(**self.host_options)
+            return self._hosts[netloc]
+
+    def set_crawl_delay(self, url: str, delay: Optional[float]):
+        """Apply a robots.txt Crawl-delay to the URL's host"""
+        if delay:
+            self._apply_min_interval(self.host(url), float(delay))
+
+    def set_site_crawl_delay(self, delay: Optional[float]):
+        """
+        Apply a site's robots.txt Crawl-delay to every host of the crawl.
+
+        A site's sitemaps and pages are often spread over several hosts (www
+        and apex, a CDN), so the delay covers the hosts seen so far and any
+        host created afterwards.
+        """
+        if not delay:
+            return
+        with self._lock:
+            self.host_options["min_interval"] = max(self.host_options.get("min_interval", 0.0), float(delay))
+            controllers = list(self._hosts.values())
+        for controller in controllers:
+            self._apply_min_interval(controller, float(delay))
+
+    @staticmethod
+    def _apply_min_interval(controller: HostController, interval: float):
+        with controller._condition:
+            controller.min_interval = max(controller.min_interval, interval)
+
+    @contextmanager
+    def request(self, url: str):
+        """
+        Hold a request slot for the URL's host; report the response through the yielded dict
+
+            with politeness.request(url) as result:
+                response = session.get(url)
+                result["status"] = response.status_code
+                result["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+        """
+        controller = self.host(url)
+        controller.acquire()
+        result = {"status": None, "retry_after": None}
+        start = time.monotonic()
+        try:
+            yield result
+        finally:
+            controller.release(result["status"], time.monotonic() - start, result["retry_after"])
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {netloc: controller.stats() for netloc, controller in self._hosts.items()}
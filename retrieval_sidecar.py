@@ -0,0 +1,260 @@
+"""
+Local retrieval sidecar.
+
+One process per host owns the embedding model and the Qdrant client and
+serves `search_similar` over a Unix domain socket, so agent job processes
+don't each import torch + sentence-transformers and load MiniLM.
+
+Run it next to the agent worker:
+
+    python retrieval_sidecar.py --socket /tmp/rag-sidecar.sock
+
+Agent code gets a retriever with `get_retriever()`, which returns a
+RetrievalClient when the sidecar socket exists and falls back to an
+in-process MarkdownToVectorDB otherwise. This module only imports the
+heavy vector DB stack when the server (or the fallback) is started.
+
+Protocol: one JSON object per line in each direction.
+    -> {"id": 1, "method": "search_similar", "params": {"query": "...", "limit": 5},
+        "trace": {"traceparent": "..."}}
+    <- {"id": 1, "result": [...], "timings": {"rag_embed": 0.004, ...}}
+       or {"id": 1, "error": "..."}
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from latency_metrics import rag_timings, record_rag_timing
+from tracing import attach_context, configure_tracing, inject_context, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.getenv("RETRIEVAL_SIDECAR_SOCKET", "/tmp/rag-sidecar.sock")
+
+
+class RetrievalClient:
+    """
+    Thin client for the retrieval sidecar with the same `search_similar`
+    contract as MarkdownToVectorDB.
+
+    Each thread keeps one persistent connection, which is re-opened once if
+    the sidecar was restarted in between calls.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._model_name = None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+    def call(self, method: str, **params):
+        """Send a request to the sidecar and return its result"""
+        request = json.dumps({
+            "id": next(self._ids),
+            "method": method,
+            "params": params,
+            "trace": inject_context(),
+        }).encode() + b"\n"
+        for attempt in range(2):
+            try:
+                sock, reader = self._connection()
+                sock.sendall(request)
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("Retrieval sidecar closed the connection")
+                break
+            except (OSError, ConnectionError):
+                self._reset()
+                if attempt:
+                    raise
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Retrieval sidecar error: {response['error']}")
+        # Report the sidecar's stage timings as if the lookup had run in this process
+        for stage, seconds in response.get("timings", {}).items():
+            record_rag_timing(stage, seconds)
+        return response["result"]
+
+    def search_similar(self, query: str, limit: int = 5, source: Optional[str] = None,
+                       max_chars: Optional[int] = 200) -> List[Dict]:
+        """Search for similar text chunks"""
+        return self.call("search_similar", query=query, limit=limit, source=source, max_chars=max_chars)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts with the sidecar's model"""
+        return np.asarray(self.call("encode_texts", texts=texts), dtype=np.float32)
+
+    def get_summary(self, scope: str) -> Optional[str]:
+        """Precomputed summary of a document, directory or the site"""
+        return self.call("get_summary", scope=scope)
+
+    @property
+    def model_name(self) -> str:
+        if self._model_name is None:
+            self._model_name = self.call("model_name")
+        return self._model_name
+
+    def ping(self) -> bool:
+        try:
+            return self.call("ping") == "pong"
+        except (OSError, RuntimeError):
+            return False
+
+    def close(self):
+        self._reset()
+
+
+def sidecar_available(socket_path: str = DEFAULT_SOCKET_PATH) -> bool:
+    """Check whether a sidecar is listening on `socket_path`"""
+    return os.path.exists(socket_path) and RetrievalClient(socket_path, timeout=1.0).ping()
+
+
+def get_retriever(knowledge_base_dir: str = "knowledge_base",
+                  collection_name: str = "markdown_knowledge_base",
+                  socket_path: str = DEFAULT_SOCKET_PATH):
+    """
+    Get a retriever exposing `search_similar`.
+
+    Returns:
+        RetrievalClient if a sidecar is running, otherwise an in-process MarkdownToVectorDB
+    """
+    if sidecar_available(socket_path):
+        logger.info(f"Using retrieval sidecar at {socket_path}")
+        return RetrievalClient(socket_path)
+
+    logger.info("Retrieval sidecar not running, loading vector DB in-process")
+    from index_snapshot import bootstrap
+    from vector_db_init import MarkdownToVectorDB
+    # LiveKit runs one job per process, so there are no other sessions' queries to batch with
+    converter = MarkdownToVectorDB(
+        knowledge_base_dir=knowledge_base_dir,
+        collection_name=collection_name,
+    )
+    bootstrap(converter)
+    return converter
+
+
+class RetrievalSidecar:
+    """Unix socket server exposing a shared MarkdownToVectorDB"""
+
+    def __init__(self, converter, socket_path: str = DEFAULT_SOCKET_PATH):
+        self.converter = converter
+        self.socket_path = socket_path
+
+    async def _dispatch(self, method: str, params: dict, timings: dict):
+        if method == "ping":
+            return "pong"
+        if method == "search_similar":
+            # Run in a thread so concurrent clients share query embedding batches.
+            # The thread inherits this context, so search_similar reports into `timings`.
+            rag_timings.set(timings)
+            return await asyncio.to_thread(self.converter.search_similar, **params)
+        if method == "encode_texts":
+            embeddings = await asyncio.to_thread(self.converter.encode_texts, **params)
+            return embeddings.tolist()
+        if method == "get_summary":
+            return await asyncio.to_thread(self.converter.get_summary, **params)
+        if method == "model_name":
+            return self.converter.model_name
+        raise ValueError(f"Unknown method: {method}")
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            timings = {}
+            with attach_context(request.get("trace")), span(f"sidecar.{request['method']}"):
+                result = await self._dispatch(request["method"], request.get("params", {}), timings)
+            response = {"id": request_id, "result": result, "timings": timings}
+        except Exception as e:
+            logger.error(f"Error handling sidecar request: {e}")
+            response = {"id": request_id, "error": str(e)}
+
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        try:
+            while line := await reader.readline():
+                await self._handle_request(line, writer, write_lock)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            if sidecar_available(self.socket_path):
+                raise RuntimeError(f"A retrieval sidecar is already running at {self.socket_path}")
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        logger.info(f"Retrieval sidecar listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Shared embedding/retrieval sidecar")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--knowledge-base-dir", default="knowledge_base")
+    parser.add_argument("--collection", default="markdown_knowledge_base")
+    parser.add_argument("--snapshot", default=os.getenv("INDEX_SNAPSHOT"),
+                        help="Index snapshot to import if the collection doesn't exist (index_snapshot.py)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    configure_tracing("retrieval-sidecar")
+    from index_snapshot import bootstrap
+    from vector_db_init import MarkdownToVectorDB
+    converter = MarkdownToVectorDB(
+        knowledge_base_dir=args.knowledge_base_dir,
+        collection_name=args.collection,
+        batch_queries=True,
+    )
+    bootstrap(converter, args.snapshot)
+    try:
+        asyncio.run(RetrievalSidecar(converter, args.socket).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Per-domain cache of robots.txt and discovered sitemap locations.
+
+Discovering a site's sitemaps costs a robots.txt fetch and several probes
+of common sitemap paths. The results (the raw robots.txt, so its rules and
+Crawl-delay can be re-parsed, and the sitemap URLs found) are kept in a
+JSON file for a TTL, so rebuilding the knowledge base of the same site
+skips discovery entirely.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.robotparser import RobotFileParser
+
+logger = logging.getLogger(__name__)
+
+ROBOTS_CACHE_PATH = Path(os.getenv("ROBOTS_CACHE_PATH", ".cache/robots.json"))
+ROBOTS_CACHE_TTL = float(os.getenv("ROBOTS_CACHE_TTL", str(24 * 3600)))
+
+
+@dataclass
+class SiteInfo:
+    """What discovery found for one domain"""
+    domain: str
+    robots_txt: Optional[str] = None
+    sitemaps: List[str] = field(default_factory=list)
+    fetched_at: float = field(default_factory=time.time)
+
+    def parser(self) -> RobotFileParser:
+        """robots.txt rules (everything allowed when the site has none)"""
+        parser = RobotFileParser(f"{self.domain}/robots.txt")
+        parser.parse((self.robots_txt or "").splitlines())
+        return parser
+
+    def crawl_delay(self, user_agent: str) -> Optional[float]:
+        """Crawl-delay for the user agent (falling back to the * group), if any"""
+        parser = self.parser()
+        delay = parser.crawl_delay(user_agent) or parser.crawl_delay("*")
+        return float(delay) if delay is not None else None
+
+
+class RobotsCache:
+    """SiteInfo per domain persisted in a JSON file, valid for `ttl` seconds"""
+
+    def __init__(self, path: Path = ROBOTS_CACHE_PATH, ttl: float = ROBOTS_CACHE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sites: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self._sites = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read robots cache {self.path}: {e}")
+
+    def get(self, domain: str) -> Optional[SiteInfo]:
+        """Cached SiteInfo of a domain, None if missing or older than the TTL"""
+        with self._lock:
+            entry = self._sites.get(domain)
+        if entry is None or time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return SiteInfo(**entry)
+
+    def put(self, info: SiteInfo):
+        with self._lock:
+            self._sites[info.domain] = asdict(info)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(self._sites, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
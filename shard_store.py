@@ -0,0 +1,252 @@
+"""
+Append-only compressed shards of knowledge base documents.
+
+Instead of one markdown file per crawled page (a directory tree with
+thousands of small files that the indexer has to rglob and open again), the
+crawler appends documents to a few large shard files:
+
+    knowledge_base/shards/pages-00000.jsonl.gz   records, one gzip member each
+    knowledge_base/shards/pages-00001.jsonl.gz   (new shard every SHARD_MAX_BYTES)
+    knowledge_base/shards/index.jsonl            key, shard, offset, length per record
+
+Each record is a JSON line ({"key", "url", "text"}) compressed as its own
+gzip member, so a shard is a valid .gz file (`zcat pages-00000.jsonl.gz`)
+and any record can be read by seeking to its offset. Records are never
+rewritten: appending a key again supersedes the earlier record.
+
+Keys are the relative paths the files would have had (products/x.md), so
+documents keep the same `source` in the vector collection either way.
+
+    python shard_store.py info knowledge_base
+    python shard_store.py export knowledge_base --to knowledge_base_export
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR_NAME = "shards"
+SHARD_MAX_BYTES = int(os.getenv("SHARD_MAX_BYTES", str(64 * 2 ** 20)))
+INDEX_NAME = "index.jsonl"
+
+
+@dataclass
+class ShardEntry:
+    """Location of one record"""
+    key: str
+    shard: str
+    offset: int
+    length: int
+    chars: int
+    url: Optional[str] = None
+
+
+class ShardStore:
+    """Documents by key in append-only gzip shards under `<directory>/shards`"""
+
+    def __init__(self, directory, max_shard_bytes: int = SHARD_MAX_BYTES):
+        """
+        Args:
+            directory: Knowledge base directory (the shards go in its shards/ subdirectory)
+            max_shard_bytes: Start a new shard once the current one reaches this size
+        """
+        self.path = Path(directory) / SHARD_DIR_NAME
+        self.max_shard_bytes = max_shard_bytes
+        self._entries: Dict[str, ShardEntry] = {}
+        self._lock = threading.Lock()
+        self._shard: Optional[Path] = None
+        self._torn_index = False
+        self._load_index()
+
+    @staticmethod
+    def exists(directory) -> bool:
+        return (Path(directory) / SHARD_DIR_NAME / INDEX_NAME).exists()
+
+    def _load_index(self):
+        index_path = self.path / INDEX_NAME
+        if not index_path.exists():
+            return
+        with open(index_path, "rb") as f:
+            data = f.read()
+        # A crash can cut the last line short: the next append starts a new line after it
+        self._torn_index = bool(data) and not data.endswith(b"\n")
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            try:
+                entry = ShardEntry(**json.loads(line))
+            except (TypeError, ValueError):
+                # A line cut short by a crash; its record is simply not indexed
+                logger.warning(f"Skipping malformed line of {index_path}")
+                continue
+            self._entries[entry.key] = entry
+        shards = sorted(self.path.glob("pages-*.jsonl.gz"))
+        self._shard = shards[-1] if shards else None
+
+    def _writable_shard(self) -> Path:
+        if self._shard is None or (self._shard.exists() and self._shard.stat().st_size >= self.max_shard_bytes):
+            number = int(self._shard.name.split("-")[1].split(".")[0]) + 1 if self._shard else 0
+            self._shard = self.path / f"pages-{number:05d}.jsonl.gz"
+        return self._shard
+
+    def append(self, key: str, text: str, url: Optional[str] = None) -> ShardEntry:
+        """Store a document under `key`, superseding any earlier record of it"""
+        record = gzip.compress(
+            (json.dumps({"key": key, "url": url, "text": text}, ensure_ascii=False) + "\n").encode("utf-8"),
+            compresslevel=6,
+        )
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            shard = self._writable_shard()
+            with open(shard, "ab") as f:
+                offset = f.tell()
+                f.write(record)
+            entry = ShardEntry(key=key, shard=shard.name, offset=offset, length=len(record),
+                               chars=len(text), url=url)
+            # The record is written before its index line, so a crash never indexes a partial record
+            with open(self.path / INDEX_NAME, "a", encoding="utf-8") as f:
+                f.write(("\n" if self._torn_index else "") + json.dumps(asdict(entry)) + "\n")
+            self._torn_index = False
+            self._entries[key] = entry
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[str]:
+        return sorted(self._entries)
+
+    def entries(self) -> List[ShardEntry]:
+        """Current entries in storage order (shard, offset)"""
+        return sorted(self._entries.values(), key=lambda entry: (entry.shard, entry.offset))
+
+    @staticmethod
+    def _decode(record: bytes) -> dict:
+        return json.loads(gzip.decompress(record))
+
+    def read(self, key: str) -> str:
+        """Text of one document (KeyError if missing)"""
+        entry = self._entries[key]
+        with open(self.path / entry.shard, "rb") as f:
+            f.seek(entry.offset)
+            return self._decode(f.read(entry.length))["text"]
+
+    def iter_documents(self) -> Iterator[Tuple[str, str]]:
+        """(key, text) of every current document, reading each shard once sequentially"""
+        entries = self.entries()
+        shard_name, f = None, None
+        try:
+            for entry in entries:
+                if entry.shard != shard_name:
+                    if f is not None:
+                        f.close()
+                    shard_name, f = entry.shard, open(self.path / entry.shard, "rb")
+                f.seek(entry.offset)
+                yield entry.key, self._decode(f.read(entry.length))["text"]
+        finally:
+            if f is not None:
+                f.close()
+
+    def stats(self) -> dict:
+        shards = sorted(self.path.glob("pages-*.jsonl.gz"))
+        stored = sum(path.stat().st_size for path in shards)
+        live = sum(entry.length for entry in self._entries.values())
+        return {
+            "documents": len(self._entries),
+            "shards": len(shards),
+            "stored_mb": round(stored / 2 ** 20, 2),
+            "superseded_mb": round((stored - live) / 2 ** 20, 2),
+            "text_mb": round(sum(entry.chars for entry in self._entries.values()) / 2 ** 20, 2),
+        }
+
+    def export(self, directory) -> int:
+        """
+        Write every document as a markdown file under `directory`, plus INDEX.md.
+
+        Args:
+            directory: Output directory (created if missing)
+
+        Returns:
+            Number of documents written
+        """
+        directory = Path(directory)
+        lines, created = [], set()
+        for key, text in self.iter_documents():
+            path = directory / key
+            if path.parent not in created:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                created.add(path.parent)
+            path.write_text(text, encoding="utf-8")
+            lines.append(f"- [{self._entries[key].url or key}]({key})\n")
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "INDEX.md").write_text(index_markdown(lines), encoding="utf-8")
+        return len(lines)
+
+    def move_to(self, directory):
+        """Move the shards to `directory`, replacing the shards there"""
+        target = Path(directory) / SHARD_DIR_NAME
+        with self._lock:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            replaced = target.with_name(f"{SHARD_DIR_NAME}.replaced")
+            if target.exists():
+                shutil.rmtree(replaced, ignore_errors=True)
+                target.rename(replaced)
+            shutil.move(str(self.path), str(target))
+            shutil.rmtree(replaced, ignore_errors=True)
+            self.path = target
+
+    def clear(self):
+        """Delete all shards and the index"""
+        with self._lock:
+            if self.path.exists():
+                shutil.rmtree(self.path)
+            self._entries.clear()
+            self._shard = None
+            self._torn_index = False
+
+
+def document_keys(directory) -> List[str]:
+    """Keys (relative paths) of the documents of a knowledge base, as files or in shards"""
+    directory = Path(directory)
+    keys = {path.relative_to(directory).as_posix() for path in directory.rglob("*.md")} if directory.exists() else set()
+    if ShardStore.exists(directory):
+        keys.update(ShardStore(directory).keys())
+    return sorted(keys)
+
+
+def index_markdown(lines: List[str]) -> str:
+    """INDEX.md content from its page list lines"""
+    return (f"# Knowledge Base Index\n\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"Total Pages: {len(lines)}\n\n## Pages\n\n" + "".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["info", "export"])
+    parser.add_argument("knowledge_base_dir", nargs="?", default="knowledge_base")
+    parser.add_argument("--to", help="Export directory (export)")
+    args = parser.parse_args()
+
+    if not ShardStore.exists(args.knowledge_base_dir):
+        parser.error(f"No shards in {args.knowledge_base_dir}")
+    store = ShardStore(args.knowledge_base_dir)
+    if args.command == "info":
+        print(json.dumps(store.stats(), indent=2))
+    else:
+        if not args.to:
+            parser.error("export needs --to")
+        print(f"Exported {store.export(args.to)} documents to {args.to}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,94 +3,237 @@ import xml.etree.ElementTree as ET
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
+import os
 import re
 from html import unescape
 from bs4 import BeautifulSoup
 import html2text
 
+import fast_extract
+from crawl_frontier import DEFAULT_SITEMAP_RULES, CrawlBudget, CrawlFrontier, CrawlTracker, UrlScorer
+from politeness import THROTTLE_STATUSES, PolitenessController, parse_retry_after
+from robots_cache import RobotsCache, SiteInfo
+from shard_store import ShardStore, index_markdown
+from tracing import in_current_trace, span
+
 class WebsiteToMarkdownPipeline:
-    def __init__(self, base_output_dir='knowledge_base'):
+    def __init__(self, base_output_dir='knowledge_base', extractor=None, output_format=None):
+        """
+        Args:
+            base_output_dir: Directory the markdown files are written to
+            extractor: HTML to markdown conversion, "bs4" (BeautifulSoup + html2text) or
+                "lxml" (single-pass, see fast_extract.py); defaults to HTML_EXTRACTOR, then "bs4"
+            output_format: "shards" (append-only compressed shards, see shard_store.py) or
+                "files" (one .md file per page); defaults to KB_OUTPUT_FORMAT, then "shards"
+        """
         self.base_output_dir = Path(base_output_dir)
+        self.output_format = output_format or os.getenv("KB_OUTPUT_FORMAT", "shards")
+        self.shards = ShardStore(self.base_output_dir) if self.output_format == "shards" else None
+        self._created_dirs = set()
+        self.extractor = extractor or os.getenv("HTML_EXTRACTOR", "bs4")
+        if self.extractor == "lxml" and not fast_extract.available():
+            print("lxml is not installed, using the bs4 extractor")
+            self.extractor = "bs4"
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
-        self.html_converter = html2text.HTML2Text()
-        self.html_converter.ignore_links = False
-        self.html_converter.ignore_images = False
-        self.html_converter.body_width = 0  # Don't wrap text
-        
-    def fetch_url(self, url, delay=1):
-        """Fetch URL content with rate limiting"""
+        # html2text converters keep parser state, so each fetch worker gets its own
+        self._local = threading.local()
+        # robots.txt rules and sitemap locations per domain (see discover_sitemaps)
+        self.robots_cache = RobotsCache()
+        self.site_info = None
+        self.robots_parser = None
+        # Adaptive per-host concurrency, Retry-After and Crawl-delay (see politeness.py)
+        self.politeness = PolitenessController()
+        
+    @property
+    def html_converter(self):
+        """html2text converter of the calling thread"""
+        converter = getattr(self._local, "html_converter", None)
+        if converter is None:
+            converter = html2text.HTML2Text()
+            converter.ignore_links = False
+            converter.ignore_images = False
+            converter.body_width = 0  # Don't wrap text
+            self._local.html_converter = converter
+        return converter
+
+    def fetch_url(self, url, max_retries=3):
+        """
+        Fetch URL content, paced per host by the politeness controller
+
+        429/503 responses are retried after the pause the controller derives
+        from Retry-After (or exponential backoff).
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                with self.politeness.request(url) as result, span("crawl.fetch_url", url=url) as current:
+                    response = self.session.get(url, timeout=30)
+                    result["status"] = response.status_code
+                    result["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+                    if current is not None:
+                        current.set_attribute("http.status_code", response.status_code)
+                        current.set_attribute("http.response_bytes", len(response.content))
+                if response.status_code in THROTTLE_STATUSES and attempt < max_retries:
+                    continue
+                response.raise_for_status()
+                return response.content
+            except requests.RequestException as e:
+                print(f"Error fetching {url}: {e}")
+                return None
+    
+    def polite_request(self, method, url, **kwargs):
+        """session.request() paced by the politeness controller, reporting the response to it"""
+        with self.politeness.request(url) as result:
+            response = self.session.request(method, url, **kwargs)
+            result["status"] = response.status_code
+            result["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+        return response
+
+    @staticmethod
+    def _definite(status_code):
+        """Whether a response status is the site's answer (not a transient error or throttling)"""
+        return status_code < 500 and status_code not in THROTTLE_STATUSES
+
+    def fetch_robots_txt(self, robots_url):
+        """
+        robots.txt of a site
+
+        Returns:
+            (content or None if the site has none, whether that's definite): None is
+            not definite after a network error, a 5xx or throttling
+        """
         try:
-            time.sleep(delay)  # Rate limiting
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            with span("crawl.fetch_url", url=robots_url):
+                response = self.polite_request("GET", robots_url, timeout=10)
+            if response.status_code == 200:
+                return response.text, True
+            return None, self._definite(response.status_code)
         except requests.RequestException as e:
-            print(f"Error fetching {url}: {e}")
+            print(f"Error fetching {robots_url}: {e}")
+            return None, False
+
+    def probe_sitemap(self, url):
+        """
+        Check that a sitemap exists without downloading it: HEAD, else the first 2 KB
+
+        Returns:
+            True or False, or None when the site didn't answer definitely (network
+            error, 5xx, throttling)
+        """
+        try:
+            with span("crawl.probe_sitemap", url=url):
+                response = self.polite_request("HEAD", url, timeout=10, allow_redirects=True)
+                if response.status_code in (404, 410):
+                    return False
+                if response.status_code == 200 and 'xml' in response.headers.get('Content-Type', ''):
+                    return True
+                # HEAD not supported, or an ambiguous content type (gzip, text/plain,
+                # an HTML soft 404): sniff the start of the document
+                response = self.polite_request("GET", url, timeout=10, stream=True,
+                                               headers={'Range': 'bytes=0-2047'})
+                try:
+                    if response.status_code not in (200, 206):
+                        return False if self._definite(response.status_code) else None
+                    head = response.raw.read(2048, decode_content=True)
+                finally:
+                    response.close()
+                return b'<urlset' in head or b'<sitemapindex' in head
+        except requests.RequestException:
             return None
-    
+
     def discover_sitemaps(self, base_url):
-        """Discover sitemap URLs from robots.txt and common locations"""
-        sitemaps = []
+        """
+        Discover sitemap URLs from robots.txt and common locations
+
+        robots.txt and all common locations are probed at once. The result,
+        including the robots.txt rules and Crawl-delay, is cached per domain
+        (see robots_cache.py), so repeated builds of a site skip discovery. It
+        isn't cached when a request failed (network error, 5xx, throttling).
+        """
         parsed = urlparse(base_url)
         domain = f"{parsed.scheme}://{parsed.netloc}"
-        
-        # Try robots.txt
-        robots_url = urljoin(domain, '/robots.txt')
-        content = self.fetch_url(robots_url, delay=0.5)
-        if content:
-            for line in content.decode('utf-8', errors='ignore').split('\n'):
-                if line.lower().startswith('sitemap:'):
-                    sitemap_url = line.split(':', 1)[1].strip()
-                    sitemaps.append(sitemap_url)
-        
-        # Try common sitemap locations
+
+        cached = self.robots_cache.get(domain)
+        if cached is not None:
+            print(f"Using cached sitemap locations for {domain}")
+            self.use_site_info(cached)
+            return cached.sitemaps or [urljoin(domain, '/sitemap.xml')]
+
         common_locations = [
             '/sitemap.xml',
             '/sitemap_index.xml',
             '/sitemap-index.xml',
             '/sitemap1.xml'
         ]
-        
-        for location in common_locations:
-            url = urljoin(domain, location)
-            if url not in sitemaps:
-                content = self.fetch_url(url, delay=0.5)
-                if content:
-                    try:
-                        ET.fromstring(content)
-                        sitemaps.append(url)
-                    except:
-                        pass
-        
+        candidates = [urljoin(domain, location) for location in common_locations]
+
+        with span("crawl.discover_sitemaps", domain=domain):
+            with ThreadPoolExecutor(max_workers=len(candidates) + 1) as executor:
+                robots = executor.submit(in_current_trace(self.fetch_robots_txt), urljoin(domain, '/robots.txt'))
+                found = list(executor.map(in_current_trace(self.probe_sitemap), candidates))
+
+        robots_txt, robots_definite = robots.result()
+        info = SiteInfo(domain=domain, robots_txt=robots_txt)
+        # robots.txt entries first, then the common locations that exist
+        sitemaps = list(info.parser().site_maps() or [])
+        sitemaps += [url for url, exists in zip(candidates, found) if exists and url not in sitemaps]
+        info.sitemaps = sitemaps
+        # An outage must not disable the robots rules and discovery until the entry expires
+        if robots_definite and None not in found:
+            self.robots_cache.put(info)
+        else:
+            print(f"Not caching the discovery of {domain}: robots.txt or sitemap probes failed")
+        self.use_site_info(info)
+
         return sitemaps if sitemaps else [urljoin(domain, '/sitemap.xml')]
+
+    def use_site_info(self, info):
+        """Apply a site's robots.txt rules and Crawl-delay to the crawl"""
+        self.site_info = info
+        self.robots_parser = info.parser()
+        # The site's pages and sitemaps may be served from other hosts (www/apex, CDN)
+        self.politeness.set_site_crawl_delay(info.crawl_delay(self.session.headers['User-Agent']))
+
+    def allowed(self, url):
+        """Whether robots.txt allows fetching the URL"""
+        return self.robots_parser is None or self.robots_parser.can_fetch(self.session.headers['User-Agent'], url)
     
     def parse_sitemap(self, xml_content):
         """Parse sitemap and return all URLs"""
+        return [(entry['type'], entry['loc']) for entry in self.parse_sitemap_entries(xml_content)]
+
+    def parse_sitemap_entries(self, xml_content):
+        """Parse sitemap and return its entries with their lastmod and priority"""
         try:
             root = ET.fromstring(xml_content)
             namespaces = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-            
-            urls = []
+
+            def text(element, tag):
+                child = element.find(f'sm:{tag}', namespaces)
+                return child.text.strip() if child is not None and child.text else None
+
+            entries = []
             
             # Check for sitemap index
             sitemaps = root.findall('sm:sitemap', namespaces)
             if sitemaps:
                 for sitemap in sitemaps:
-                    loc = sitemap.find('sm:loc', namespaces)
-                    if loc is not None:
-                        urls.append(('sitemap', loc.text))
+                    if text(sitemap, 'loc'):
+                        entries.append({'type': 'sitemap', 'loc': text(sitemap, 'loc'),
+                                        'lastmod': text(sitemap, 'lastmod'), 'priority': None})
             else:
                 # Regular sitemap
                 for url in root.findall('sm:url', namespaces):
-                    loc = url.find('sm:loc', namespaces)
-                    if loc is not None:
-                        urls.append(('page', loc.text))
+                    if text(url, 'loc'):
+                        entries.append({'type': 'page', 'loc': text(url, 'loc'),
+                                        'lastmod': text(url, 'lastmod'), 'priority': text(url, 'priority')})
             
-            return urls
+            return entries
         except ET.ParseError as e:
             print(f"Error parsing XML: {e}")
             return []
@@ -124,6 +267,14 @@ class WebsiteToMarkdownPipeline:
     
     def clean_html_to_markdown(self, html_content, page_url):
         """Convert HTML to clean Markdown"""
+        with span("crawl.clean_html_to_markdown", url=page_url, html_bytes=len(html_content),
+                  extractor=self.extractor):
+            if self.extractor == "lxml":
+                title_text, markdown = fast_extract.extract(html_content)
+                return self.markdown_header(title_text, page_url) + markdown
+            return self._clean_html_to_markdown(html_content, page_url)
+
+    def _clean_html_to_markdown(self, html_content, page_url):
         soup = BeautifulSoup(html_content, 'html.parser')
         
         # Remove script, style, nav, footer, and other non-content elements
@@ -155,8 +306,11 @@ class WebsiteToMarkdownPipeline:
         # Clean up excessive newlines
         markdown = re.sub(r'\n{3,}', '\n\n', markdown)
         
-        # Add metadata header
-        header = f"""---
+        return self.markdown_header(title_text, page_url) + markdown.strip()
+
+    def markdown_header(self, title_text, page_url):
+        """Metadata header of a page's markdown file"""
+        return f"""---
 title: {title_text}
 source: {page_url}
 fetched: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -165,8 +319,6 @@ fetched: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 # {title_text}
 
 """
-        
-        return header + markdown.strip()
     
     def url_to_filename(self, url):
         """Convert URL to safe filename"""
@@ -210,17 +362,19 @@ fetched: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             return None
     
     def save_markdown(self, url, markdown_content):
-        """Save markdown content to file"""
+        """Save markdown content to a shard or file; returns its path in the knowledge base"""
         directory, filename = self.url_to_filename(url)
-        
-        # Create full path
-        if directory:
-            full_dir = self.base_output_dir / directory
-        else:
-            full_dir = self.base_output_dir
-        
-        full_dir.mkdir(parents=True, exist_ok=True)
-        filepath = full_dir / filename
+        key = f"{directory}/{filename}" if directory else filename
+        filepath = self.base_output_dir / key
+
+        if self.shards is not None:
+            entry = self.shards.append(key, markdown_content, url=url)
+            print(f"Saved: {key} ({entry.shard})")
+            return filepath
+
+        if filepath.parent not in self._created_dirs:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(filepath.parent)
         
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(markdown_content)
@@ -229,67 +383,158 @@ fetched: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         return filepath
     
     def create_index(self, processed_pages):
-        """Create an index file listing all pages"""
-        index_content = f"""# Knowledge Base Index
+        """Create an index file listing all pages (shards have their own index, see shard_store.py)"""
+        if self.shards is not None:
+            print(f"\nShards: {self.shards.stats()} in {self.shards.path}")
+            return
 
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Total Pages: {len(processed_pages)}
-
-## Pages
-
-"""
-        for url, filepath in processed_pages:
-            relative_path = filepath.relative_to(self.base_output_dir)
-            index_content += f"- [{url}]({relative_path})\n"
-        
+        index_content = index_markdown([f"- [{url}]({filepath.relative_to(self.base_output_dir)})\n"
+                                        for url, filepath in processed_pages])
         index_path = self.base_output_dir / 'INDEX.md'
         with open(index_path, 'w', encoding='utf-8') as f:
             f.write(index_content)
         
         print(f"\nIndex created: {index_path}")
     
-    def run(self, website_url, max_pages=None):
-        """Main pipeline execution"""
+    def discover_pages(self, website_url, frontier, tracker, checkpoint=None):
+        """
+        Feed page URLs from the site's sitemaps into the frontier (runs alongside fetching)
+
+        Sitemaps are processed best first (e.g. product sitemaps before blog
+        sitemaps) and discovery stops early once the crawl budget is used up.
+        With a checkpoint (ingest_checkpoint.py), the pages found are recorded
+        per sitemap, and so is finishing discovery.
+        """
+        sitemap_frontier = CrawlFrontier(UrlScorer(DEFAULT_SITEMAP_RULES, freshness_weight=0))
+        try:
+            with span("crawl.discover", url=website_url):
+                for sitemap in self.discover_sitemaps(website_url):
+                    sitemap_frontier.push(sitemap)
+                while not tracker.exhausted(in_flight=False):
+                    item = sitemap_frontier.pop(timeout=0)
+                    if item is None:
+                        if checkpoint is not None:
+                            checkpoint.set(discovery_done=True)
+                        break
+                    print(f"Processing sitemap: {item.url}")
+                    content = self.fetch_url(item.url)
+                    if not content:
+                        continue
+                    tracker.add_bytes(len(content))
+                    discovered = []
+                    for entry in self.parse_sitemap_entries(content):
+                        if entry['type'] == 'sitemap':
+                            sitemap_frontier.push(entry['loc'], entry['priority'], entry['lastmod'])
+                        elif self.allowed(entry['loc']):
+                            if frontier.push(entry['loc'], entry['priority'], entry['lastmod']):
+                                discovered.append(entry)
+                    if checkpoint is not None:
+                        checkpoint.record_discovered(discovered)
+        finally:
+            frontier.finish_discovery()
+        print(f"Discovery finished: {frontier.seen} URLs ({frontier.excluded} excluded by URL rules)")
+
+    def resume_crawl(self, checkpoint, frontier):
+        """
+        Restore a checkpointed crawl: skip the fetched pages and queue the discovered ones
+
+        Returns:
+            (url, filepath) of the pages fetched before
+        """
+        fetched = [(entry.url, self.base_output_dir / entry.key) for entry in checkpoint.pages.entries()]
+        frontier.skip(url for url, _ in fetched)
+        for entry in checkpoint.discovered():
+            if self.allowed(entry['loc']):
+                frontier.push(entry['loc'], entry['priority'], entry['lastmod'])
+        print(f"Resuming crawl: {len(fetched)} pages fetched, {len(frontier)} queued"
+              f"{'' if checkpoint.state['discovery_done'] else ', continuing discovery'}")
+        return fetched
+
+    def crawl_pages(self, frontier, tracker, processed_pages, lock):
+        """Fetch the best queued pages until the frontier is drained or the budget is used up"""
+        while tracker.reserve():
+            item = frontier.pop()
+            if item is None:
+                tracker.cancel()
+                if frontier.discovery_done and not len(frontier):
+                    return
+                continue
+
+            saved = False
+            try:
+                print(f"Processing ({item.score:.2f}): {item.url}")
+                html_content = self.fetch_url(item.url)
+                if html_content:
+                    tracker.add_bytes(len(html_content))
+                    markdown = self.clean_html_to_markdown(html_content, item.url)
+                    filepath = self.save_markdown(item.url, markdown)
+                    with lock:
+                        processed_pages.append((item.url, filepath))
+                    saved = True
+            except Exception as e:
+                print(f"Error converting {item.url}: {e}")
+            finally:
+                tracker.release(saved)
+
+    def run(self, website_url, max_pages=None, max_seconds=None, max_bytes=None, concurrency=None,
+            checkpoint=None):
+        """
+        Main pipeline execution
+
+        Pages are fetched best first (see crawl_frontier.py) while the sitemaps
+        are still being read, until every page is fetched or a budget runs out.
+
+        Args:
+            website_url: Website to crawl
+            max_pages: Maximum number of pages to save
+            max_seconds: Stop starting new fetches after this many seconds
+            max_bytes: Stop starting new fetches after downloading this many bytes
+            concurrency: Fetch workers, the most pages fetched in parallel; the politeness
+                controller decides how many run per host (defaults to CRAWL_MAX_CONCURRENCY, then 8)
+            checkpoint: IngestionCheckpoint to write pages and discovered URLs to and to
+                resume from (pages then go to its shards instead of base_output_dir)
+        """
         print(f"Starting pipeline for: {website_url}\n")
+        concurrency = concurrency or int(self.politeness.host_options["max_limit"])
+        if checkpoint is not None:
+            self.base_output_dir = checkpoint.directory
+            self.shards = checkpoint.pages
         
         # Create output directory
         self.base_output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Discover sitemaps
-        print("Discovering sitemaps...")
-        sitemaps = self.discover_sitemaps(website_url)
-        print(f"Found {len(sitemaps)} sitemap(s)\n")
-        
-        # Extract all URLs
-        print("Extracting URLs from sitemaps...")
-        all_urls = []
-        for sitemap in sitemaps:
-            urls = self.extract_all_urls(sitemap)
-            all_urls.extend(urls)
-        
-        all_urls = list(set(all_urls))  # Remove duplicates
-        print(f"Found {len(all_urls)} unique pages\n")
-        
-        if max_pages:
-            all_urls = all_urls[:max_pages]
-            print(f"Limiting to {max_pages} pages\n")
-        
-        # Process each page
-        processed_pages = []
-        for idx, url in enumerate(all_urls, 1):
-            print(f"\n[{idx}/{len(all_urls)}]")
-            markdown = self.process_page(url)
-            
-            if markdown:
-                filepath = self.save_markdown(url, markdown)
-                processed_pages.append((url, filepath))
+        frontier = CrawlFrontier()
+        processed_pages = self.resume_crawl(checkpoint, frontier) if checkpoint is not None else []
+        tracker = CrawlTracker(CrawlBudget(max_pages, max_seconds, max_bytes), pages=len(processed_pages))
+        lock = threading.Lock()
+
+        # Discover sitemaps and pages in the background while fetching
+        discovery = None
+        if checkpoint is not None and checkpoint.state["discovery_done"]:
+            frontier.finish_discovery()
+        else:
+            discovery = threading.Thread(target=in_current_trace(self.discover_pages),
+                                         args=(website_url, frontier, tracker, checkpoint),
+                                         name="sitemap-discovery", daemon=True)
+            discovery.start()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="crawl") as executor:
+            for _ in range(concurrency):
+                executor.submit(in_current_trace(self.crawl_pages), frontier, tracker, processed_pages, lock)
+        if discovery is not None:
+            discovery.join()
         
         # Create index
         print("\n" + "="*50)
         self.create_index(processed_pages)
         
         print(f"\nPipeline complete!")
-        print(f"Processed: {len(processed_pages)}/{len(all_urls)} pages")
+        print(f"Processed: {len(processed_pages)} pages ({tracker.failed} failed, "
+              f"{len(frontier)} left in the frontier) in {tracker.elapsed:.1f}s, "
+              f"{tracker.fetched_bytes / 2 ** 20:.1f} MB downloaded")
+        if tracker.stop_reason:
+            print(f"Stopped by the {tracker.stop_reason} budget")
+        for host, stats in self.politeness.stats().items():
+            print(f"Politeness {host}: {stats}")
         print(f"Output directory: {self.base_output_dir.absolute()}")
 
 
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Callable, Optional
+
+from latency_metrics import rag_timings
+from tracing import span
+
+logger = logging.getLogger("agent-worker")
+
+
+def _normalize(text: str) -> list:
+    return [word.strip(".,!?;:").lower() for word in text.split() if word.strip(".,!?;:")]
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Word-level similarity ratio between two transcripts (0..1)"""
+    words_a, words_b = _normalize(a), _normalize(b)
+    if not words_a or not words_b:
+        return 0.0
+    return SequenceMatcher(None, words_a, words_b).ratio()
+
+
+async def _wait_uncancellable(future: asyncio.Future):
+    """Wait for a future to finish even if the waiting task is cancelled again"""
+    while not future.done():
+        try:
+            await asyncio.wait({future})
+        except asyncio.CancelledError:
+            continue
+    if not future.cancelled():
+        future.exception()  # Retrieved, so a failed lookup nobody awaits isn't logged as unhandled
+
+
+@dataclass
+class SpeculationResult:
+    """Outcome of resolving retrieval for a completed user turn"""
+    query: str
+    content: str
+    reused: bool
+    similarity: float
+    wait_time: float
+    lookup_time: float
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def latency_saved(self) -> float:
+        """Time the turn did not spend waiting for retrieval"""
+        return max(self.lookup_time - self.wait_time, 0.0) if self.reused else 0.0
+
+
+class SpeculativeRetriever:
+    """
+    Starts RAG lookups on interim STT transcripts so results are warm by the
+    time end-of-turn detection fires.
+
+    Interim transcripts are debounced; a newer transcript cancels a speculation
+    that has not started its lookup yet. Lookups run one at a time in a worker
+    thread because `lookup` is blocking (embedding + vector DB round trip).
+    When the turn completes, the speculative result is reused if the final
+    text is similar enough to the query it was computed for, otherwise the
+    lookup is re-run on the final text.
+    """
+
+    def __init__(self,
+                 lookup: Callable[[str], str],
+                 debounce: float = 0.2,
+                 similarity_threshold: float = 0.8,
+                 min_words: int = 3):
+        """
+        Args:
+            lookup: Blocking function returning formatted RAG content for a query
+            debounce: Seconds of transcript stability before a lookup starts
+            similarity_threshold: Minimum similarity to reuse a speculative result
+            min_words: Interim transcripts shorter than this are not speculated on
+        """
+        self.lookup = lookup
+        self.debounce = debounce
+        self.similarity_threshold = similarity_threshold
+        self.min_words = min_words
+
+        self._final_segments = []
+        self._task: Optional[asyncio.Task] = None
+        self._task_query = ""
+        self._lookup_lock = asyncio.Lock()
+
+        self.turns = 0
+        self.reused_turns = 0
+        self.total_latency_saved = 0.0
+
+    def on_transcript(self, transcript: str, is_final: bool) -> None:
+        """Feed an STT transcript (interim or final segment) for the current turn"""
+        if is_final:
+            self._final_segments.append(transcript.strip())
+            query = " ".join(self._final_segments)
+        else:
+            query = " ".join(self._final_segments + [transcript.strip()])
+
+        if len(query.split()) < self.min_words or query == self._task_query:
+            return
+
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task_query = query
+        self._task = asyncio.create_task(self._speculate(query))
+
+    async def _speculate(self, query: str):
+        await asyncio.sleep(self.debounce)
+        return await self._run_lookup(query)
+
+    async def _run_lookup(self, query: str):
+        async with self._lookup_lock:
+            # The lookup thread inherits this context and reports embed/search timings into it
+            timings = {}
+            rag_timings.set(timings)
+            start = time.perf_counter()
+            with span("rag.lookup", query_words=len(query.split())):
+                lookup = asyncio.ensure_future(asyncio.to_thread(self.lookup, query))
+                try:
+                    content = await asyncio.shield(lookup)
+                except asyncio.CancelledError:
+                    # Cancelling doesn't stop the thread: keep the lock until it finishes
+                    await _wait_uncancellable(lookup)
+                    raise
+            return content, time.perf_counter() - start, timings
+
+    async def resolve(self, final_text: str) -> SpeculationResult:
+        """
+        Get retrieval results for the completed turn.
+
+        Args:
+            final_text: Final user transcript for the turn
+
+        Returns:
+            SpeculationResult with the content to inject and timing details
+        """
+        task, task_query = self._task, self._task_query
+        self._task, self._task_query, self._final_segments = None, "", []
+        self.turns += 1
+
+        start = time.perf_counter()
+        similarity = query_similarity(task_query, final_text) if task else 0.0
+
+        result = None
+        if task and similarity >= self.similarity_threshold:
+            try:
+                content, lookup_time, timings = await task
+                result = SpeculationResult(final_text, content, True, similarity,
+                                           time.perf_counter() - start, lookup_time, timings)
+            except Exception as e:
+                logger.warning(f"Speculative lookup failed, retrying on final transcript: {e}")
+        elif task:
+            task.cancel()
+
+        if result is None:
+            content, lookup_time, timings = await self._run_lookup(final_text)
+            result = SpeculationResult(final_text, content, False, similarity,
+                                       time.perf_counter() - start, lookup_time, timings)
+
+        if result.reused:
+            self.reused_turns += 1
+            self.total_latency_saved += result.latency_saved
+        logger.info(
+            f"RAG speculation: reused={result.reused} similarity={result.similarity:.2f} "
+            f"wait={result.wait_time * 1000:.0f}ms saved={result.latency_saved * 1000:.0f}ms "
+            f"(reuse rate {self.reused_turns}/{self.turns})"
+        )
+        return result
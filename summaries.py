@@ -0,0 +1,347 @@
+"""
+Hierarchical summaries of the knowledge base, precomputed at ingestion time.
+
+Summaries exist for every document, every top-level directory of the
+knowledge base (collections/, products/, ...) and the whole site:
+
+    document:products/shanling-ua2.md
+    directory:products
+    site
+
+They are built in one batched job from the chunks already stored in the
+vector collection: documents are summarized concurrently, directories from
+their documents' summaries and the site from the directory summaries (and
+any top-level documents). Inputs longer than the LLM budget are summarized
+in batches, then the batch summaries are summarized in turn.
+
+Each summary is stored with its embedding in a "<collection>_summaries"
+Qdrant collection next to the chunk vectors, under a point ID derived from
+its scope, so serving one is a single point lookup. Summaries are keyed by
+a hash of their input: rerunning the job after a re-crawl only calls the
+LLM for documents that changed and the levels above them.
+
+The LLM is any object with a LlamaIndex-style `complete(prompt)` method
+(returning an object with `.text`, or a string), so a stub can stand in.
+
+    python summaries.py
+    python summaries.py --collection markdown_knowledge_base --concurrency 8
+"""
+import argparse
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+SITE_SCOPE = "site"
+
+DOCUMENT_PROMPT = (
+    "Summarize this web page for a voice assistant that answers visitors' questions about the site. "
+    "Cover what it is about and its key facts (names, prices, specifications, policies) in at most "
+    "five sentences of plain prose.\n\n{content}"
+)
+DIRECTORY_PROMPT = (
+    "These are summaries of the pages in the \"{name}\" section of a website. Write an overview of the "
+    "section for a voice assistant: what it contains, the main groups of items and notable examples, "
+    "in at most six sentences of plain prose.\n\n{content}"
+)
+SITE_PROMPT = (
+    "These are summaries of the sections of a website. Write an overview of the whole site for a voice "
+    "assistant: what the site offers and how its content is organized, in at most six sentences of "
+    "plain prose.\n\n{content}"
+)
+
+
+def document_scope(source: str) -> str:
+    return f"document:{source}"
+
+
+def directory_scope(directory: str) -> str:
+    return f"directory:{directory}"
+
+
+def source_directory(source: str) -> Optional[str]:
+    """Top-level knowledge base directory of a document, None for top-level documents"""
+    return source.split("/", 1)[0] if "/" in source else None
+
+
+def digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def complete_text(llm, prompt: str) -> str:
+    response = llm.complete(prompt)
+    return getattr(response, "text", str(response)).strip()
+
+
+def pack(texts: Iterable[str], max_chars: int) -> List[List[str]]:
+    """Group texts in order into batches of at most `max_chars` (longer texts are cut)"""
+    batches, current, size = [], [], 0
+    for text in texts:
+        text = text[:max_chars]
+        if current and size + len(text) > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 2
+    if current:
+        batches.append(current)
+    return batches
+
+
+class SummaryStore:
+    """Summaries stored as points of the "<collection>_summaries" Qdrant collection"""
+
+    def __init__(self, qdrant_client, collection_name: str):
+        self.qdrant_client = qdrant_client
+        self.collection_name = f"{collection_name}_summaries"
+
+    def point_id(self, scope: str) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.collection_name}/{scope}"))
+
+    def exists(self) -> bool:
+        collections = self.qdrant_client.get_collections().collections
+        return any(col.name == self.collection_name for col in collections)
+
+    def setup(self, vector_size: int):
+        """Create the collection unless it exists (it is kept across ingestions for reuse)"""
+        from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
+
+        if self.exists():
+            return
+        self.qdrant_client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+        )
+        self.qdrant_client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="level",
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
+
+    def load(self) -> Dict[str, dict]:
+        """All stored summaries: scope -> payload"""
+        if not self.exists():
+            return {}
+        records, offset = {}, None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name, limit=256, offset=offset,
+                with_payload=True, with_vectors=False,
+            )
+            records.update((point.payload["scope"], point.payload) for point in points)
+            if offset is None:
+                return records
+
+    def upsert(self, records: List[dict], embeddings):
+        from qdrant_client.http.models import PointStruct
+
+        points = [PointStruct(id=self.point_id(record["scope"]), vector=embedding.tolist(), payload=record)
+                  for record, embedding in zip(records, embeddings)]
+        for i in range(0, len(points), 100):
+            self.qdrant_client.upsert(collection_name=self.collection_name, points=points[i:i + 100])
+
+    def delete(self, scopes: List[str]):
+        from qdrant_client.http.models import PointIdsList
+
+        self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=[self.point_id(scope) for scope in scopes]),
+        )
+
+    def get(self, scope: str) -> Optional[str]:
+        """Summary of a scope, or None if it hasn't been computed"""
+        try:
+            points = self.qdrant_client.retrieve(
+                collection_name=self.collection_name, ids=[self.point_id(scope)], with_payload=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not read summary {scope}: {e}")
+            return None
+        return points[0].payload["summary"] if points else None
+
+
+def load_documents(qdrant_client, collection_name: str) -> Dict[str, str]:
+    """Document texts rebuilt from their chunks in the vector collection"""
+    chunks, offset = defaultdict(list), None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name, limit=256, offset=offset,
+            with_payload=["source", "title", "section", "chunk_id", "text"], with_vectors=False,
+        )
+        for point in points:
+            chunks[point.payload["source"]].append(point.payload)
+        if offset is None:
+            break
+
+    documents = {}
+    for source, payloads in sorted(chunks.items()):
+        payloads.sort(key=lambda payload: payload["chunk_id"])
+        parts, section = [f"# {payloads[0]['title']}"], None
+        for payload in payloads:
+            if payload.get("section") and payload["section"] != section:
+                section = payload["section"]
+                parts.append(f"## {section}")
+            parts.append(payload["text"])
+        documents[source] = "\n\n".join(parts)
+    return documents
+
+
+class HierarchicalSummarizer:
+    """Summarizes documents, then directories, then the site, reusing unchanged summaries"""
+
+    def __init__(self, llm, max_input_chars: int = 12000, concurrency: int = 4):
+        """
+        Args:
+            llm: Object with a LlamaIndex-style complete(prompt) method
+            max_input_chars: Maximum characters of content per LLM call
+            concurrency: LLM calls in flight at once
+        """
+        self.llm = llm
+        self.max_input_chars = max_input_chars
+        self.concurrency = concurrency
+        self.llm_calls = 0
+
+    def _complete(self, prompt: str) -> str:
+        self.llm_calls += 1
+        return complete_text(self.llm, prompt)
+
+    def summarize(self, texts: List[str], prompt: str, map_fn: Callable = map, **fields) -> str:
+        """One summary of `texts`, summarizing batches that fit the LLM input and then their summaries"""
+        batches = pack(texts, self.max_input_chars)
+        while True:
+            prompts = [prompt.format(content="\n\n".join(batch), **fields) for batch in batches]
+            summaries = list(map_fn(self._complete, prompts))
+            if len(summaries) == 1:
+                return summaries[0]
+            batches = pack(summaries, self.max_input_chars)
+
+    def build(self, documents: Dict[str, str], existing: Optional[Dict[str, dict]] = None) -> List[dict]:
+        """
+        Summary records for all documents, their directories and the site.
+
+        Args:
+            documents: Document source -> text
+            existing: Previously stored records by scope; reused when their input is unchanged
+
+        Returns:
+            Records with scope, level, name, summary, sha256 and sources
+        """
+        existing = existing or {}
+
+        def reusable(scope: str, sha: str) -> Optional[dict]:
+            record = existing.get(scope)
+            return record if record is not None and record.get("sha256") == sha else None
+
+        records: Dict[str, dict] = {}
+        stale = []
+        for source, text in documents.items():
+            scope, sha = document_scope(source), digest(text)
+            records[scope] = reusable(scope, sha) or {
+                "scope": scope, "level": "document", "name": source, "sha256": sha, "sources": [source],
+            }
+            if "summary" not in records[scope]:
+                stale.append(source)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            summarize_document = lambda source: self.summarize(documents[source].split("\n\n"), DOCUMENT_PROMPT)
+            for source, summary in zip(stale, executor.map(summarize_document, stale)):
+                records[document_scope(source)]["summary"] = summary
+            logger.info(f"Summarized {len(stale)} documents ({len(documents) - len(stale)} unchanged)")
+
+            by_directory = defaultdict(list)
+            for source in sorted(documents):
+                by_directory[source_directory(source)].append(source)
+
+            site_parts = []
+            for directory, sources in sorted(by_directory.items(), key=lambda item: item[0] or ""):
+                if directory is None:
+                    site_parts.extend(records[document_scope(source)] for source in sources)
+                    continue
+                children = [records[document_scope(source)] for source in sources]
+                scope, sha = directory_scope(directory), digest(*(child["sha256"] for child in children))
+                record = reusable(scope, sha)
+                if record is None:
+                    summary = self.summarize([child["summary"] for child in children], DIRECTORY_PROMPT,
+                                             executor.map, name=directory)
+                    record = {"scope": scope, "level": "directory", "name": directory, "sha256": sha,
+                              "sources": sources, "summary": summary}
+                records[scope] = record
+                site_parts.append(record)
+
+            sha = digest(*(part["sha256"] for part in site_parts))
+            record = reusable(SITE_SCOPE, sha)
+            if record is None and site_parts:
+                summary = self.summarize([part["summary"] for part in site_parts], SITE_PROMPT, executor.map)
+                record = {"scope": SITE_SCOPE, "level": "site", "name": SITE_SCOPE, "sha256": sha,
+                          "sources": sorted(documents), "summary": summary}
+            if record is not None:
+                records[SITE_SCOPE] = record
+        return list(records.values())
+
+
+def default_llm():
+    """The LLM configured for LlamaIndex (OpenAI unless Settings.llm is set)"""
+    from llama_index.core import Settings
+    return Settings.llm
+
+
+def build_summaries(converter, llm=None, max_input_chars: int = 12000, concurrency: int = 4) -> dict:
+    """
+    Build or refresh the summaries of a converter's collection.
+
+    Args:
+        converter: MarkdownToVectorDB whose collection holds the ingested chunks
+        llm: LLM used to summarize (defaults to the LlamaIndex Settings.llm)
+        max_input_chars: Maximum characters of content per LLM call
+        concurrency: LLM calls in flight at once
+
+    Returns:
+        Counts of summaries, LLM calls and removed stale summaries
+    """
+    with span("ingest.summaries", collection=converter.collection_name):
+        start = time.perf_counter()
+        store = SummaryStore(converter.qdrant_client, converter.collection_name)
+        documents = load_documents(converter.qdrant_client, converter.collection_name)
+        existing = store.load()
+        summarizer = HierarchicalSummarizer(llm or default_llm(), max_input_chars, concurrency)
+        records = summarizer.build(documents, existing)
+
+        # An empty collection has nothing to summarize (and no embedding size to set up with)
+        if records:
+            embeddings = converter.encode_texts([record["summary"] for record in records])
+            store.setup(len(embeddings[0]))
+            store.upsert(records, embeddings)
+        removed = sorted(set(existing) - {record["scope"] for record in records})
+        if removed:
+            store.delete(removed)
+
+    stats = {"summaries": len(records), "llm_calls": summarizer.llm_calls, "removed": len(removed)}
+    logger.info(f"Built summaries in {time.perf_counter() - start:.1f}s: {stats}")
+    return stats
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Precompute hierarchical knowledge base summaries")
+    parser.add_argument("--knowledge-base-dir", default="knowledge_base")
+    parser.add_argument("--collection", default="markdown_knowledge_base")
+    parser.add_argument("--max-input-chars", type=int, default=int(os.getenv("SUMMARY_MAX_INPUT_CHARS", "12000")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SUMMARY_CONCURRENCY", "4")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from vector_db_init import MarkdownToVectorDB
+    converter = MarkdownToVectorDB(knowledge_base_dir=args.knowledge_base_dir, collection_name=args.collection)
+    build_summaries(converter, max_input_chars=args.max_input_chars, concurrency=args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
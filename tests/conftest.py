@@ -0,0 +1,137 @@
+import functools
+import re
+import sys
+import threading
+import types
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+class StubSentenceTransformer:
+    """Bag-of-words embeddings and whitespace tokens, counting the texts encoded"""
+
+    max_seq_length = 256
+    encoded = 0
+
+    def __init__(self, model_name):
+        self.tokenizer = lambda texts, add_special_tokens=False: {"input_ids": [text.split() for text in texts]}
+
+    def get_sentence_embedding_dimension(self):
+        return 64
+
+    def encode(self, texts, **kwargs):
+        StubSentenceTransformer.encoded += len(texts)
+        vectors = np.full((len(texts), 64), 0.01, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[i, zlib.crc32(word.encode()) % 64] += 1
+        return vectors
+
+
+@pytest.fixture
+def stub_embedding_model(monkeypatch):
+    """Make MarkdownToVectorDB load StubSentenceTransformer instead of sentence_transformers"""
+    StubSentenceTransformer.encoded = 0
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=StubSentenceTransformer))
+    return StubSentenceTransformer
+
+
+WORDS = ("amplifier", "headphone", "cable", "speaker", "turntable", "receiver", "microphone", "subwoofer",
+         "preamp", "earbuds", "soundbar", "mixer", "tonearm", "cartridge", "stylus", "tube")
+
+
+def page_html(version, i):
+    words = [WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(40)]
+    paragraphs = "".join(f"<p>Release {version} of product {i}: {' '.join(words[j:j + 10])}.</p>"
+                         for j in range(0, 40, 10))
+    return (f"<html><head><title>Product {i}</title></head><body><main><h1>Product {i}</h1>"
+            f"{paragraphs}</main></body></html>").encode()
+
+
+class StubSite:
+    """Website with a sitemap of `pages` product pages whose text depends on `version`"""
+
+    pages = 6
+
+    def __init__(self):
+        self.version = "v1"
+        self.page_requests = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.respond(head=True)
+
+            def do_GET(self):
+                self.respond(head=False)
+
+            def respond(self, head):
+                status, content_type, body = site.resource(self.path, count=not head)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def resource(self, path, count):
+        if path == "/sitemap.xml":
+            urls = "".join(f"<url><loc>{self.url}/products/p{i}</loc></url>" for i in range(self.pages))
+            body = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+            return 200, "application/xml", body.encode()
+        match = re.fullmatch(r"/products/p(\d+)", path)
+        if match and int(match.group(1)) < self.pages:
+            if count:
+                with self._lock:
+                    self.page_requests += 1
+            return 200, "text/html", page_html(self.version, int(match.group(1)))
+        return 404, "text/plain", b""
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def site():
+    site = StubSite()
+    yield site
+    site.close()
+
+
+@pytest.fixture
+def qdrant(tmp_path, monkeypatch, stub_embedding_model):
+    """
+    One in-memory Qdrant shared by every converter, like a server across job reruns
+
+    For backend.run_extraction in tmp_path: importing backend needs the LIVEKIT_* variables.
+    """
+    import backend
+    import qdrant_client
+    import vector_db_init
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backend, "INGESTION_SUMMARIES", False)
+    # Several upsert batches per build
+    monkeypatch.setattr(vector_db_init.MarkdownToVectorDB, "ingest",
+                        functools.partialmethod(vector_db_init.MarkdownToVectorDB.ingest, batch_size=2))
+    client = qdrant_client.QdrantClient(":memory:")
+    monkeypatch.setattr(qdrant_client, "QdrantClient", lambda *args, **kwargs: client)
+    return client
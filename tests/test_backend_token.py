@@ -0,0 +1,39 @@
+import base64
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("LIVEKIT_URL", "wss://livekit.test")
+os.environ.setdefault("LIVEKIT_API_KEY", "test-key")
+os.environ.setdefault("LIVEKIT_API_SECRET", "test-secret-with-enough-length-for-hs256")
+
+from fastapi.testclient import TestClient
+
+import backend
+
+
+def token_claims(jwt_token: str) -> dict:
+    payload = jwt_token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+@pytest.fixture
+def client():
+    return TestClient(backend.app)
+
+
+def test_token_keeps_automatic_dispatch_by_default(client, monkeypatch):
+    monkeypatch.setattr(backend, "AGENT_NAME", "")
+    response = client.post("/token", json={"room_name": "room-1", "participant_name": "visitor"})
+    assert response.status_code == 200
+    assert "roomConfig" not in token_claims(response.json()["token"])
+
+
+def test_token_carries_the_agent_dispatch(client, monkeypatch):
+    monkeypatch.setattr(backend, "AGENT_NAME", "voice-assistant")
+    response = client.post("/token", json={"room_name": "room-1", "participant_name": "visitor"})
+    assert response.status_code == 200
+    agents = token_claims(response.json()["token"])["roomConfig"]["agents"]
+    assert [agent["agentName"] for agent in agents] == ["voice-assistant"]
+    assert "token_issued_at" in json.loads(agents[0]["metadata"])
@@ -0,0 +1,93 @@
+import re
+
+from livekit.agents import ChatContext
+from livekit.agents.llm import FunctionCall, FunctionCallOutput
+
+from context_manager import SUMMARY_MESSAGE_ID, ContextManager
+
+SYSTEM_PROMPT = "You are a helpful voice assistant for an audio equipment shop. " * 10
+
+
+def new_context() -> ChatContext:
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content=SYSTEM_PROMPT, id="system")
+    return chat_ctx
+
+
+def talk(chat_ctx: ChatContext, manager: ContextManager, turn: int, with_tool_call: bool = False):
+    """One turn as on_user_turn_completed sees it: the user message, then RAG, then the reply"""
+    chat_ctx.add_message(role="user", content=f"Question {turn} about headphones and amplifiers " * 3)
+    metrics = manager.prepare_turn(chat_ctx, f"Retrieved product details for question {turn} " * 5)
+    if with_tool_call:
+        chat_ctx.items.append(FunctionCall(call_id=f"call_{turn}", name="lookup_order", arguments='{"id": 1}'))
+        chat_ctx.items.append(FunctionCallOutput(call_id=f"call_{turn}", name="lookup_order",
+                                                 output="Order shipped " * 10, is_error=False))
+    chat_ctx.add_message(role="assistant", content=f"Answer {turn}: " + "the details are " * 8)
+    return metrics
+
+
+def test_only_the_last_rag_injections_are_kept():
+    manager = ContextManager(rag_window=2, max_prompt_tokens=100_000)
+    chat_ctx = new_context()
+    for turn in range(1, 6):
+        metrics = talk(chat_ctx, manager, turn)
+    assert [item.id for item in chat_ctx.items if item.id.startswith("rag_")] == ["rag_4", "rag_5"]
+    assert metrics.rag_messages_removed == 1 and metrics.items_evicted == 0
+
+
+def test_eviction_stays_under_budget_with_a_summary():
+    manager = ContextManager(max_prompt_tokens=800, min_recent_items=4)
+    chat_ctx = new_context()
+    evicted = 0
+    for turn in range(1, 41):
+        metrics = talk(chat_ctx, manager, turn)
+        evicted += metrics.items_evicted
+        assert metrics.est_tokens <= manager.max_prompt_tokens
+
+    assert evicted > 0
+    [summary] = [item for item in chat_ctx.items if item.id == SUMMARY_MESSAGE_ID]
+    assert chat_ctx.items.index(summary) == 1
+    # Only the latest evicted questions are summarized
+    summarized = sorted({int(n) for n in re.findall(r"Question (\d+)", summary.text_content)})
+    assert len(summarized) == 10 and summarized[-1] < 40 and 1 not in summarized
+    assert len(manager._evicted_questions) == 10
+
+
+def test_system_prefix_stays_byte_identical():
+    manager = ContextManager(max_prompt_tokens=800, min_recent_items=4)
+    chat_ctx = new_context()
+    system = chat_ctx.items[0]
+    for turn in range(1, 21):
+        talk(chat_ctx, manager, turn)
+        assert chat_ctx.items[0] is system
+        assert chat_ctx.items[0].text_content == SYSTEM_PROMPT
+    assert sum(item.role == "system" for item in chat_ctx.items if item.type == "message") == 1
+
+
+def test_no_tool_output_is_left_without_its_call():
+    for min_recent_items in range(0, 8):
+        manager = ContextManager(max_prompt_tokens=900, min_recent_items=min_recent_items)
+        chat_ctx = new_context()
+        for turn in range(1, 16):
+            talk(chat_ctx, manager, turn, with_tool_call=True)
+            calls = set()
+            for item in chat_ctx.items:
+                if item.type == "function_call":
+                    calls.add(item.call_id)
+                elif item.type == "function_call_output":
+                    assert item.call_id in calls, (min_recent_items, turn)
+
+
+def test_recent_tool_output_is_evicted_with_its_call():
+    manager = ContextManager(max_prompt_tokens=50, min_recent_items=2)
+    chat_ctx = new_context()
+    chat_ctx.add_message(role="user", content="Where is my order? " * 20)
+    chat_ctx.items.append(FunctionCall(call_id="call_1", name="lookup_order", arguments='{"id": 1}'))
+    # The most recent items: protected, but the output can't outlive its call
+    chat_ctx.items.append(FunctionCallOutput(call_id="call_1", name="lookup_order", output="Shipped",
+                                             is_error=False))
+    chat_ctx.add_message(role="assistant", content="It shipped yesterday.")
+
+    assert manager.evict_over_budget(chat_ctx) == 3
+    assert [item.type for item in chat_ctx.items] == ["message"] * 3
+    assert [item.id for item in chat_ctx.items][:2] == ["system", SUMMARY_MESSAGE_ID]
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from crawl_frontier import CrawlBudget, CrawlFrontier, CrawlTracker, UrlScorer
+from robots_cache import RobotsCache
+from shard_store import ShardStore
+from sitemap import WebsiteToMarkdownPipeline
+
+SHOP = "https://shop.example"
+
+
+def drain(frontier):
+    urls = []
+    while (item := frontier.pop(timeout=0)) is not None:
+        urls.append(item.url)
+    return urls
+
+
+def test_frontier_orders_by_priority_and_url_rules():
+    frontier = CrawlFrontier()
+    frontier.push(f"{SHOP}/blogs/news/launch", priority="1.0")
+    frontier.push(f"{SHOP}/pages/about")
+    frontier.push(f"{SHOP}/products/amp", priority="0.2")
+    frontier.push(f"{SHOP}/products/dac", priority="0.9")
+    frontier.push(f"{SHOP}/collections/headphones")
+    assert drain(frontier) == [f"{SHOP}/products/dac", f"{SHOP}/collections/headphones", f"{SHOP}/products/amp",
+                               f"{SHOP}/pages/about", f"{SHOP}/blogs/news/launch"]
+
+
+def test_frontier_excludes_and_deduplicates():
+    frontier = CrawlFrontier()
+    assert not frontier.push(f"{SHOP}/cart")
+    assert not frontier.push(f"{SHOP}/account/login?next=/")
+    assert frontier.push(f"{SHOP}/products/amp#reviews")
+    assert not frontier.push(f"{SHOP}/products/amp")
+    frontier.skip([f"{SHOP}/products/dac"])
+    assert not frontier.push(f"{SHOP}/products/dac")
+    assert frontier.excluded == 2 and frontier.seen == 4
+    assert drain(frontier) == [f"{SHOP}/products/amp"]
+
+
+def test_fresh_lastmod_goes_first_and_ties_keep_discovery_order():
+    now = datetime.now(timezone.utc)
+    frontier = CrawlFrontier()
+    frontier.push(f"{SHOP}/products/a")
+    frontier.push(f"{SHOP}/products/old", lastmod=(now - timedelta(days=720)).isoformat())
+    frontier.push(f"{SHOP}/products/new", lastmod=(now - timedelta(days=1)).strftime("%Y-%m-%d"))
+    frontier.push(f"{SHOP}/products/b", lastmod="not a date")
+    assert drain(frontier) == [f"{SHOP}/products/new", f"{SHOP}/products/old", f"{SHOP}/products/a",
+                               f"{SHOP}/products/b"]
+
+    scorer = UrlScorer(freshness_half_life_days=30)
+    assert scorer.freshness(now - timedelta(days=30), now) == pytest.approx(scorer.freshness_weight / 2)
+
+
+def test_tracker_counts_in_flight_fetches_against_the_page_budget():
+    tracker = CrawlTracker(CrawlBudget(max_pages=3), pages=1)
+    assert tracker.reserve() and tracker.reserve()
+    assert not tracker.reserve() and tracker.stop_reason == "pages"
+    # Discovery keeps feeding the workers holding reservations
+    assert tracker.exhausted(in_flight=False) is None
+    tracker.release(saved=False)  # a failed fetch frees its reservation
+    assert tracker.reserve()
+    tracker.cancel()
+    tracker.release(saved=True)
+    assert tracker.pages == 2 and tracker.failed == 1 and tracker.in_flight == 0
+
+
+@pytest.fixture
+def crawl(site, tmp_path, monkeypatch):
+    """crawl(**run options) -> (pages saved, run output) of a crawl of the stub site"""
+    site.pages = 20
+
+    def run(delay=0.0, **options):
+        if delay:
+            resource = site.resource
+            monkeypatch.setattr(site, "resource", lambda path, count: time.sleep(delay) or resource(path, count))
+        pipeline = WebsiteToMarkdownPipeline(base_output_dir=str(tmp_path / "kb"))
+        pipeline.robots_cache = RobotsCache(tmp_path / "robots.json")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            pipeline.run(site.url, **options)
+        return len(ShardStore(tmp_path / "kb")), output.getvalue()
+
+    return run
+
+
+def test_page_budget_with_more_workers_than_pages(site, crawl):
+    saved, output = crawl(max_pages=3, concurrency=8, delay=0.05)
+    assert saved == 3 and site.page_requests == 3
+    assert "Stopped by the pages budget" in output
+
+
+def test_time_budget_stops_the_crawl(site, crawl):
+    saved, output = crawl(max_seconds=0.5, concurrency=1, delay=0.1)
+    assert 0 < saved < site.pages
+    assert "Stopped by the time budget" in output
+
+
+def test_byte_budget_stops_the_crawl(site, crawl):
+    saved, output = crawl(max_bytes=5000, concurrency=1)
+    assert 0 < saved < site.pages
+    assert "Stopped by the bytes budget" in output
+
+
+def test_unlimited_crawl_fetches_every_page(site, crawl):
+    saved, output = crawl(concurrency=4)
+    assert saved == site.pages and "budget" not in output
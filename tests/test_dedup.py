@@ -0,0 +1,61 @@
+from dedup import DedupStats, drop_near_duplicates, remove_boilerplate
+
+NAV = "- Home\n- Headphones\n- Amplifiers\n- Contact us"
+FOOTER = "Free shipping on orders over 50 EUR. Returns accepted within 30 days. Questions? Call us."
+COLORS = ["black", "white", "red", "blue", "green", "silver"]
+
+
+def product_page(i: int, color: str = "") -> str:
+    description = (f"The model {i} {color} amplifier delivers {10 * (i + 1)} watts per channel with a "
+                   f"{['tube', 'class A', 'class D', 'hybrid', 'solid state', 'class AB'][i]} output stage "
+                   f"and a {['moving magnet', 'moving coil', 'USB', 'optical', 'balanced', 'bluetooth'][i]} input.")
+    return (f"---\ntitle: Amplifier {i}\n---\n\n{NAV}\n\n# Amplifier {i}\n\n{description}\n\n"
+            f"Only {i} left.\n\n{FOOTER}\n")
+
+
+def test_repeated_blocks_are_kept_once():
+    pages = {f"products/amp-{i}.md": product_page(i) for i in range(6)}
+    stats = DedupStats()
+    cleaned = remove_boilerplate(pages, stats=stats)
+
+    assert [page.count(FOOTER) for page in cleaned.values()] == [1, 0, 0, 0, 0, 0]
+    assert [page.count("- Contact us") for page in cleaned.values()] == [1, 0, 0, 0, 0, 0]
+    for i, page in enumerate(cleaned.values()):
+        assert page.startswith(f"---\ntitle: Amplifier {i}\n---\n")
+        assert f"# Amplifier {i}" in page and "watts per channel" in page
+        # Short blocks stay even when repeated
+        assert f"Only {i} left." in page
+    assert stats.boilerplate_blocks == 10 and stats.pages == 6
+
+
+def test_blocks_on_few_pages_are_not_boilerplate():
+    pages = {f"products/amp-{i}.md": product_page(i) for i in range(6)}
+    pages["pages/about.md"] = "# About\n\n" + "Our story: a small shop selling hand-built amplifiers since 1990."
+    pages["pages/contact.md"] = "# Contact\n\n" + "Our story: a small shop selling hand-built amplifiers since 1990."
+    cleaned = remove_boilerplate(pages)
+    assert all("Our story" in cleaned[page] for page in ("pages/about.md", "pages/contact.md"))
+
+
+def test_near_duplicate_variants_are_dropped():
+    variants = [{"text": product_page(2, color), "source": f"products/amp-2-{color}.md"} for color in COLORS]
+    distinct = [{"text": product_page(i), "source": f"products/amp-{i}.md"} for i in (0, 1, 3)]
+    stats = DedupStats()
+    kept = drop_near_duplicates(variants[:3] + distinct + variants[3:], stats=stats)
+
+    assert [chunk["source"] for chunk in kept] == ["products/amp-2-black.md", "products/amp-0.md",
+                                                   "products/amp-1.md", "products/amp-3.md"]
+    assert stats.input_chunks == 9 and stats.duplicate_chunks == 5
+
+
+def test_split_texts_into_chunks_dedups_by_default(stub_embedding_model):
+    from vector_db_init import MarkdownToVectorDB
+
+    converter = MarkdownToVectorDB(qdrant_url=":memory:")
+    pages = {f"products/amp-{i}.md": product_page(i) for i in range(6)}
+    pages.update({f"products/amp-2-{color}.md": product_page(2, color) for color in COLORS[1:]})
+    chunks = converter.split_texts_into_chunks(pages)
+
+    assert sum(chunk["text"].count(FOOTER) for chunk in chunks) == 1
+    assert {chunk["source"] for chunk in chunks} == {f"products/amp-{i}.md" for i in range(6)}
+    assert [chunk["chunk_id"] for chunk in chunks] == list(range(len(chunks)))
+    assert converter.dedup_stats.duplicate_chunks == len(COLORS) - 1
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from embedding_batcher import EmbeddingBatcher
+
+
+class GatedModel:
+    """Encodes texts as their lengths, each call waiting for `gate`"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.gate.wait(5)
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+
+def test_batches_concurrent_requests():
+    model = GatedModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=0)
+    first = batcher.submit("a")
+    assert model.started.wait(5)
+    # Queued while the first batch encodes: picked up together
+    futures = [batcher.submit("b" * i) for i in range(1, 4)]
+    model.gate.set()
+    assert first.result(5)[0] == 1
+    assert [future.result(5)[0] for future in futures] == [1, 2, 3]
+    assert model.calls == [["a"], ["b", "bb", "bbb"]]
+    batcher.close()
+
+
+def test_cancelled_caller_does_not_stop_the_batcher():
+    model = GatedModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=0)
+
+    async def cancel_a_caller():
+        blocking = batcher.submit("busy")
+        assert await asyncio.to_thread(model.started.wait, 5)
+        # Queued behind the blocked batch, then cancelled by its caller
+        task = asyncio.create_task(batcher.aencode("cancelled"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        model.gate.set()
+        return await asyncio.wrap_future(blocking)
+
+    assert asyncio.run(cancel_a_caller())[0] == 4
+    assert batcher.submit("still works").result(5)[0] == 11
+    assert ["cancelled"] not in model.calls and batcher._thread.is_alive()
+    batcher.close()
@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+import types
+import zlib
+
+import numpy as np
+import pytest
+import qdrant_client
+from qdrant_client import QdrantClient
+
+import index_snapshot
+from vector_db_init import MarkdownToVectorDB
+
+COLLECTION = "markdown_knowledge_base"
+TEXTS = ["Wireless headphones with 30 hours of battery", "Free shipping on orders over 50 euros",
+         "Returns are accepted within 30 days", "The amplifier drives 300 ohm headphones"]
+
+
+def converter_for(client, monkeypatch):
+    monkeypatch.setattr(qdrant_client, "QdrantClient", lambda *args, **kwargs: client)
+    return MarkdownToVectorDB(collection_name=COLLECTION, qdrant_url=":memory:", dedup=False)
+
+
+def published(monkeypatch, stub_embedding_model):
+    """Converter of a small published collection"""
+    converter = converter_for(QdrantClient(":memory:"), monkeypatch)
+    chunks = [{"text": text, "source": f"page{i}.md", "title": f"Page {i}", "chunk_id": 0,
+               "char_count": len(text), "word_count": len(text.split())} for i, text in enumerate(TEXTS)]
+    build = converter.build_collection_name("first")
+    converter.create_collection(build, stub_embedding_model("stub").get_sentence_embedding_dimension())
+    converter.qdrant_client.upsert(build, points=[converter.make_point(chunk, vector) for chunk, vector
+                                                  in zip(chunks, converter.encode_texts(TEXTS))])
+    converter.switch_alias(build)
+    return converter
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch, stub_embedding_model):
+    """A snapshot of a small published collection"""
+    path = tmp_path / "snapshot"
+    index_snapshot.export_snapshot(published(monkeypatch, stub_embedding_model), path)
+    return path
+
+
+def test_concurrent_bootstraps_import_once(snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(index_snapshot, "BOOTSTRAP_LOCK_DIR", tmp_path / "locks")
+    import_snapshot = index_snapshot.import_snapshot
+
+    def slow_import(converter, path):
+        time.sleep(0.2)  # widen the window between checking and publishing
+        return import_snapshot(converter, path)
+
+    monkeypatch.setattr(index_snapshot, "import_snapshot", slow_import)
+
+    # Job processes of a fresh host: separate converters on one Qdrant
+    client = QdrantClient(":memory:")
+    converters = [converter_for(client, monkeypatch) for _ in range(4)]
+    start = threading.Barrier(len(converters))
+    results = [None] * len(converters)
+
+    def job(i):
+        start.wait()
+        results[i] = index_snapshot.bootstrap(converters[i], str(snapshot))
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(len(converters))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    imported = [result for result in results if result is not None]
+    assert len(imported) == 1
+    builds = [collection.name for collection in client.get_collections().collections
+              if collection.name.startswith(f"{COLLECTION}__")]
+    assert builds == [imported[0]["collection"]]
+    assert converters[0].alias_target() == imported[0]["collection"]
+    assert client.count(COLLECTION).count == len(TEXTS)
+    assert converters[1].search_similar("amplifier for headphones", limit=1)[0]["source"] == "page3.md"
+
+
+def test_bootstrap_skips_an_existing_collection(snapshot, monkeypatch):
+    client = QdrantClient(":memory:")
+    converter = converter_for(client, monkeypatch)
+    assert index_snapshot.bootstrap(converter, str(snapshot))["points"] == len(TEXTS)
+    assert index_snapshot.bootstrap(converter, str(snapshot)) is None
+    assert index_snapshot.bootstrap(converter, None) is None
+
+
+@pytest.mark.parametrize("dimension", [64, 32])
+def test_import_refuses_another_model(snapshot, monkeypatch, stub_embedding_model, dimension):
+    client = QdrantClient(":memory:")
+    served = index_snapshot.import_snapshot(converter_for(client, monkeypatch), snapshot)["collection"]
+
+    class OtherModel(stub_embedding_model):
+        """Same tokens hashed differently (or fewer dimensions): other vectors for the same texts"""
+
+        def get_sentence_embedding_dimension(self):
+            return dimension
+
+        def encode(self, texts, **kwargs):
+            vectors = np.full((len(texts), dimension), 0.01, dtype=np.float32)
+            for i, text in enumerate(texts):
+                for word in text.lower().split():
+                    vectors[i, zlib.adler32(word.encode()) % dimension] += 1
+            return vectors
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=OtherModel))
+    converter = converter_for(client, monkeypatch)
+    with pytest.raises(index_snapshot.SnapshotModelMismatch):
+        index_snapshot.import_snapshot(converter, snapshot)
+    assert converter.alias_target() == served
+    assert [collection.name for collection in client.get_collections().collections] == [served]
+
+
+def test_int8_snapshot_round_trip(tmp_path, monkeypatch, stub_embedding_model):
+    source = published(monkeypatch, stub_embedding_model)
+    path = tmp_path / "snapshot-int8"
+    manifest = index_snapshot.export_snapshot(source, path, dtype="int8")
+    assert manifest["dtype"] == "int8" and manifest["points"] == len(TEXTS)
+    assert (path / "scales.npy").exists()
+
+    converter = converter_for(QdrantClient(":memory:"), monkeypatch)
+    assert index_snapshot.import_snapshot(converter, path)["points"] == len(TEXTS)
+    query = "amplifier for headphones"
+    imported = converter.search_similar(query, limit=len(TEXTS))
+    original = source.search_similar(query, limit=len(TEXTS))
+    assert [hit["source"] for hit in imported] == [hit["source"] for hit in original]
+    assert imported[0]["source"] == "page3.md"
+    assert all(abs(a["score"] - b["score"]) < 0.01 for a, b in zip(imported, original))
@@ -0,0 +1,219 @@
+"""
+Crash injection for checkpointed ingestion (backend.run_extraction).
+
+Each test publishes a first version of a stub website, changes the site,
+crashes the second extraction at one point, and checks that:
+
+- the crashed job stays at the stage the crash interrupted
+- the first build keeps serving (alias and knowledge base documents)
+- the rerun resumes from that stage, without redoing finished work
+- the rerun publishes the new version and deletes the first build
+
+A crash is a `Crash` (BaseException, so the pipeline's error handling can't
+swallow it) raised at the injection point. Once it fired, every later
+checkpoint write raises too, so nothing a dead process couldn't have written
+reaches the disk, even from crawl worker threads that keep running.
+"""
+import contextlib
+import functools
+import io
+import os
+import re
+import threading
+
+import pytest
+
+os.environ.setdefault("LIVEKIT_URL", "wss://livekit.test")
+os.environ.setdefault("LIVEKIT_API_KEY", "test-key")
+os.environ.setdefault("LIVEKIT_API_SECRET", "test-secret-with-enough-length-for-hs256")
+
+import backend
+from ingest_checkpoint import IngestionCheckpoint
+from shard_store import ShardStore
+
+COLLECTION = "markdown_knowledge_base"
+
+
+class Crash(BaseException):
+    """A simulated process crash"""
+
+
+class CrashInjector:
+    """Raises Crash at an injection point, then on every checkpoint write until restart()"""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.crashed = threading.Event()
+        self.injected = []
+        for owner, name in ((IngestionCheckpoint, "_save"), (IngestionCheckpoint, "record_discovered"),
+                            (IngestionCheckpoint, "save_chunks"), (IngestionCheckpoint, "record_upserted"),
+                            (ShardStore, "append")):
+            monkeypatch.setattr(owner, name, self._dead_after_crash(getattr(owner, name)))
+
+    def _dead_after_crash(self, original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            if self.crashed.is_set():
+                raise Crash("process is dead")
+            return original(*args, **kwargs)
+        return wrapper
+
+    def at(self, owner, name, after=0):
+        """Crash on call number after + 1 of owner.name"""
+        original = getattr(owner, name)
+        calls = 0
+        lock = threading.Lock()
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            nonlocal calls
+            with lock:
+                calls += 1
+                if calls > after:
+                    self.crashed.set()
+            if self.crashed.is_set():
+                raise Crash(f"{name} call {calls}")
+            return original(*args, **kwargs)
+
+        self.injected.append((owner, name, original))
+        self.monkeypatch.setattr(owner, name, wrapper)
+
+    def restart(self):
+        """A new process: no crash pending and the injection points removed"""
+        self.crashed.clear()
+        for owner, name, original in self.injected:
+            self.monkeypatch.setattr(owner, name, original)
+        self.injected.clear()
+
+
+@pytest.fixture
+def crash(monkeypatch):
+    return CrashInjector(monkeypatch)
+
+
+def extract(site):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.run_extraction(site.url, max_pages=20)
+
+
+def crashed_extract(site, crash):
+    with pytest.raises(Crash):
+        extract(site)
+    crash.restart()
+    return IngestionCheckpoint.for_website(site.url, {"max_pages": 20, "max_seconds": None, "max_bytes": None})
+
+
+def alias_target(client):
+    return next((alias.collection_name for alias in client.get_aliases().aliases
+                 if alias.alias_name == COLLECTION), None)
+
+
+def served_versions(client):
+    """Versions of the pages in the collection the alias serves, and in the knowledge base documents"""
+    points, _ = client.scroll(COLLECTION, limit=1000, with_payload=True)
+    indexed = {version for point in points for version in re.findall(r"Release (v\d)", point.payload["text"])}
+    documents = {version for _, text in ShardStore("knowledge_base").iter_documents()
+                 for version in re.findall(r"Release (v\d)", text)}
+    return indexed, documents
+
+
+@pytest.fixture
+def published_v1(site, qdrant, stub_embedding_model):
+    """The first version of the site, published; returns its build collection"""
+    assert extract(site)["status"] == "completed"
+    first_build = alias_target(qdrant)
+    assert first_build is not None and served_versions(qdrant) == ({"v1"}, {"v1"})
+    site.version = "v2"
+    site.page_requests = 0
+    stub_embedding_model.encoded = 0
+    return first_build
+
+
+def assert_resumed_to_v2(site, qdrant, first_build):
+    assert extract(site)["status"] == "completed"
+    assert alias_target(qdrant) not in (None, first_build)
+    assert served_versions(qdrant) == ({"v2"}, {"v2"})
+    assert first_build not in {collection.name for collection in qdrant.get_collections().collections}
+    assert not os.path.exists(".cache/ingestion") or not os.listdir(".cache/ingestion")
+
+
+def test_crash_while_crawling_resumes_the_crawl(site, qdrant, published_v1, crash):
+    crash.at(ShardStore, "append", after=2)
+    checkpoint = crashed_extract(site, crash)
+    assert checkpoint.stage == "crawl" and len(checkpoint.pages) == 2
+    assert alias_target(qdrant) == published_v1 and served_versions(qdrant) == ({"v1"}, {"v1"})
+
+    crash_requests = site.page_requests
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    # Only the pages that weren't saved are fetched again
+    assert site.page_requests - crash_requests == site.pages - 2
+
+
+def test_crash_while_writing_an_index_line_keeps_later_pages(site, qdrant, published_v1, crash):
+    crash.at(ShardStore, "append", after=2)
+    checkpoint = crashed_extract(site, crash)
+    # The crash cut the third index line short
+    with open(checkpoint.pages.path / "index.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"key": "products/p')
+    assert len(ShardStore(checkpoint.pages.path.parent)) == 2
+
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    assert len(ShardStore("knowledge_base")) == site.pages
+
+
+def test_crash_before_saving_chunks_resumes_chunking(site, qdrant, published_v1, crash):
+    crash.at(IngestionCheckpoint, "save_chunks")
+    checkpoint = crashed_extract(site, crash)
+    assert checkpoint.stage == "chunk" and len(checkpoint.pages) == site.pages
+    assert alias_target(qdrant) == published_v1 and served_versions(qdrant) == ({"v1"}, {"v1"})
+
+    crash_requests = site.page_requests
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    assert site.page_requests == crash_requests  # nothing crawled again
+
+
+def test_crash_between_upsert_batches_resumes_embedding(site, qdrant, published_v1, crash,
+                                                        stub_embedding_model):
+    crash.at(qdrant, "upsert", after=2)
+    checkpoint = crashed_extract(site, crash)
+    assert checkpoint.stage == "embed" and len(checkpoint.upserted()) == 4
+    build = f"{COLLECTION}__{checkpoint.build_id}"
+    assert qdrant.count(build).count == 4
+    assert alias_target(qdrant) == published_v1 and served_versions(qdrant) == ({"v1"}, {"v1"})
+
+    chunks = len(checkpoint.load_chunks())
+    stub_embedding_model.encoded = 0
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    assert alias_target(qdrant) == build
+    # Only the chunks that weren't upserted are embedded again
+    assert stub_embedding_model.encoded == chunks - 4
+
+
+def test_crash_before_the_payload_index_creates_it_on_resume(site, qdrant, published_v1, crash, monkeypatch):
+    crash.at(qdrant, "create_payload_index")
+    checkpoint = crashed_extract(site, crash)
+    build = f"{COLLECTION}__{checkpoint.build_id}"
+    assert checkpoint.stage == "embed" and build in {c.name for c in qdrant.get_collections().collections}
+
+    indexed = []
+    create_payload_index = qdrant.create_payload_index
+    monkeypatch.setattr(qdrant, "create_payload_index",
+                        lambda **kwargs: indexed.append(kwargs["collection_name"]) or create_payload_index(**kwargs))
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    assert indexed == [build]
+
+
+def test_crash_between_alias_switch_and_documents_move_finishes_publishing(site, qdrant, published_v1, crash,
+                                                                          stub_embedding_model):
+    crash.at(ShardStore, "move_to")
+    checkpoint = crashed_extract(site, crash)
+    build = f"{COLLECTION}__{checkpoint.build_id}"
+    assert checkpoint.stage == "publish" and checkpoint.state["previous_collection"] == published_v1
+    # The alias was switched; the documents and the previous build are still in place
+    assert alias_target(qdrant) == build
+    assert served_versions(qdrant) == ({"v2"}, {"v1"})
+    assert published_v1 in {collection.name for collection in qdrant.get_collections().collections}
+
+    stub_embedding_model.encoded = 0
+    assert_resumed_to_v2(site, qdrant, published_v1)
+    assert stub_embedding_model.encoded == 0
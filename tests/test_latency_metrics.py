@@ -0,0 +1,62 @@
+import json
+import logging
+from types import SimpleNamespace
+
+from latency_metrics import TurnLatencyTracker
+
+
+def _eou(speech_id):
+    return SimpleNamespace(type="eou_metrics", speech_id=speech_id, end_of_utterance_delay=0.4,
+                           transcription_delay=0.3)
+
+
+def _llm(speech_id):
+    return SimpleNamespace(type="llm_metrics", speech_id=speech_id, ttft=0.5)
+
+
+def _tts(speech_id):
+    return SimpleNamespace(type="tts_metrics", speech_id=speech_id, ttfb=0.2)
+
+
+def _emitted(caplog):
+    prefix = "Turn latency: "
+    return [json.loads(r.getMessage()[len(prefix):]) for r in caplog.records if r.getMessage().startswith(prefix)]
+
+
+def test_tool_rag_timings_without_an_open_turn_are_dropped(caplog):
+    caplog.set_level(logging.INFO, logger="agent-worker")
+    tracker = TurnLatencyTracker(room="room")
+    tracker.on_rag({"rag_search": 0.1}, current_turn=True)
+    for metrics in (_eou("s1"), _llm("s1"), _tts("s1")):
+        tracker.on_metrics(metrics)
+    [turn] = _emitted(caplog)
+    assert "rag_search" not in turn
+
+
+def test_tool_rag_timings_attach_to_the_open_turn(caplog):
+    caplog.set_level(logging.INFO, logger="agent-worker")
+    tracker = TurnLatencyTracker(room="room")
+    tracker.on_metrics(_eou("s1"))
+    tracker.on_rag({"rag_search": 0.1}, current_turn=True)
+    tracker.on_metrics(_llm("s1"))
+    tracker.on_metrics(_tts("s1"))
+    [turn] = _emitted(caplog)
+    assert turn["rag_search"] == 0.1 and turn["tts_ttfb"] == 0.2
+
+
+def test_cached_reply_is_emitted_with_its_ttfb(caplog):
+    caplog.set_level(logging.INFO, logger="agent-worker")
+    tracker = TurnLatencyTracker(room="room")
+    tracker.on_metrics(_eou("s1"))
+    tracker.on_cached_tts("s1", 0.05)
+    assert not _emitted(caplog)
+    tracker.on_metrics(_llm("s1"))
+    tracker.on_metrics(_llm("s1"))  # late metrics of an emitted turn don't open a new one
+    [turn] = _emitted(caplog)
+    assert turn["tts_ttfb"] == 0.05 and turn["tts_cached"] == 1 and turn["llm_ttft"] == 0.5
+    assert not tracker._turns
+
+    tracker.on_metrics(_eou("s2"))
+    tracker.on_metrics(_llm("s2"))
+    tracker.on_cached_tts("s2", 0.07)
+    assert _emitted(caplog)[-1]["speech_id"] == "s2"
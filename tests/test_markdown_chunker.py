@@ -0,0 +1,59 @@
+from markdown_chunker import MarkdownChunker, approx_token_count, parse_blocks, parse_frontmatter
+
+TABLE_HEADER = "| Model | Impedance | Price |\n|---|---|---|"
+
+
+def page() -> str:
+    rows = "\n".join(f"| Headphone {i} | {32 + i} ohm | {100 + i} EUR |" for i in range(60))
+    paragraph = " ".join(f"Sentence {i} describes the sound signature in detail." for i in range(40))
+    items = "\n".join(f"- Accessory {i} with a braided cable" for i in range(50))
+    return (f"---\ntitle: Studio Headphones\nurl: https://shop.example/products/studio\n---\n\n"
+            f"# Studio Headphones\n\nClosed-back studio headphones.\n\n"
+            f"## Specifications\n\n{TABLE_HEADER}\n{rows}\n\n"
+            f"## Sound\n\n### Bass\n\n{paragraph}\n\n"
+            f"## Accessories\n\n{items}\n\n"
+            f"## Links\n\n{'x' * 3000}\n")
+
+
+def test_chunks_respect_the_token_budget():
+    chunker = MarkdownChunker(max_tokens=64, min_tokens=16)
+    chunks = chunker.split(page(), source="products/studio.md")
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert sum(approx_token_count([chunk["context"], chunk["text"]])) <= 64
+        assert chunk["token_count"] <= 64
+    # Nothing is lost but the split whitespace
+    text = " ".join(chunk["text"] for chunk in chunks)
+    assert all(f"Headphone {i} " in text for i in range(60)) and "Sentence 39" in text
+
+
+def test_split_table_repeats_its_header():
+    chunks = MarkdownChunker(max_tokens=64, min_tokens=16).split(page())
+    table_chunks = [chunk for chunk in chunks if "Headphone 0 " in chunk["text"] or "| Headphone" in chunk["text"]]
+    assert len(table_chunks) > 1
+    assert all(chunk["text"].startswith(TABLE_HEADER) for chunk in table_chunks)
+    assert {chunk["section"] for chunk in table_chunks} == {"Specifications"}
+
+
+def test_title_and_section_path_in_metadata():
+    chunks = MarkdownChunker(max_tokens=64, min_tokens=16).split(page(), source="products/studio.md")
+    assert {chunk["title"] for chunk in chunks} == {"Studio Headphones"}
+    assert {chunk["source"] for chunk in chunks} == {"products/studio.md"}
+    bass = [chunk for chunk in chunks if "Sentence 20 " in chunk["text"]]
+    assert bass[0]["section"] == "Sound > Bass"
+    assert bass[0]["context"] == "Studio Headphones > Sound > Bass"
+    assert chunks[0]["section"] == "" and chunks[0]["context"] == "Studio Headphones"
+
+
+def test_small_sections_are_packed_together():
+    text = "# Shop\n\n## Shipping\n\nFree over 50 EUR.\n\n## Returns\n\nWithin 30 days.\n"
+    [chunk] = MarkdownChunker(max_tokens=64, min_tokens=48).split(text)
+    assert "Free over 50 EUR." in chunk["text"] and "## Returns" in chunk["text"]
+    assert chunk["title"] == "Shop"
+
+
+def test_frontmatter_and_blocks():
+    meta, body = parse_frontmatter("---\ntitle: A: B\n---\n# A\n")
+    assert meta == {"title": "A: B"} and body == "# A\n"
+    blocks = parse_blocks("# A\n\ntext\n- item\n  more\n```\n# not a heading\n```\n| a |\n")
+    assert [kind for kind, _ in blocks] == ["heading", "text", "list", "code", "table"]
@@ -0,0 +1,177 @@
+import contextlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import pytest
+
+from benchmarks.politeness import StubShop, start_server
+from politeness import HostController, PolitenessController
+from robots_cache import RobotsCache, SiteInfo
+from sitemap import WebsiteToMarkdownPipeline
+
+SHOP_DEFAULTS = {"capacity": 16, "latency": 0.02, "rate": 1000.0, "burst": 1000, "max_queue": 100}
+
+
+@pytest.fixture
+def stub_shop():
+    """Start a rate-limited stub shop: stub_shop(**StubShop options) -> (shop, base URL)"""
+    servers = []
+
+    def start(**options):
+        shop = StubShop(**{**SHOP_DEFAULTS, **options})
+        server = start_server(shop)
+        servers.append(server)
+        return shop, f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = WebsiteToMarkdownPipeline(base_output_dir=str(tmp_path / "kb"))
+    pipeline.robots_cache = RobotsCache(tmp_path / "robots.json")
+    return pipeline
+
+
+def _crawl(pipeline, base_url, pages, workers, max_retries=3):
+    urls = [f"{base_url}/products/p{i}" for i in range(pages)]
+    # fetch_url prints every failed request
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda url: pipeline.fetch_url(url, max_retries=max_retries), urls))
+
+
+def test_limit_grows_while_latency_is_stable(stub_shop, pipeline):
+    shop, base_url = stub_shop()
+    pipeline.politeness = PolitenessController(initial_limit=2, max_limit=8)
+    assert all(_crawl(pipeline, base_url, pages=60, workers=8))
+
+    controller = pipeline.politeness.host(base_url)
+    assert controller.throttled == 0 and controller.errors == 0
+    assert controller.peak_limit > 4
+
+
+def test_limit_halves_on_throttling(stub_shop, pipeline):
+    shop, base_url = stub_shop(rate=0.001, burst=2, retry_after="0")
+    pipeline.politeness = PolitenessController(initial_limit=4, min_limit=1, max_limit=8)
+    controller = pipeline.politeness.host(base_url)
+    assert all(_crawl(pipeline, base_url, pages=2, workers=1))
+
+    before = controller.limit
+    assert _crawl(pipeline, base_url, pages=1, workers=1, max_retries=0) == [None]
+    assert controller.throttled == 1
+    assert controller.limit == pytest.approx(before / 2)
+
+
+def test_limit_halves_on_server_errors():
+    controller = HostController(initial_limit=6, min_limit=1)
+    controller.acquire()
+    controller.release(200, 0.1)
+    before = controller.limit
+    controller.acquire()
+    controller.release(500, 0.1)
+    assert controller.limit == pytest.approx(before / 2) and controller.errors == 1
+    # One burst of errors within a round trip is a single congestion signal
+    controller.acquire()
+    controller.release(502, 0.1)
+    assert controller.limit == pytest.approx(before / 2)
+
+
+def test_no_request_starts_before_retry_after(stub_shop, pipeline):
+    shop, base_url = stub_shop(rate=1.0, burst=1, retry_after="1")
+    pipeline.politeness = PolitenessController(initial_limit=4, max_limit=4)
+    _crawl(pipeline, base_url, pages=4, workers=4)
+
+    throttled_at = [at for at, status in shop.requests if status == 429]
+    assert throttled_at
+    for throttle in throttled_at:
+        # Requests already in flight may arrive just after the 429; none may be sent after it arrived
+        started = [at for at, _ in shop.requests if throttle + 0.05 < at < throttle + 1.0]
+        assert started == []
+
+
+def test_min_interval_is_enforced(stub_shop, pipeline):
+    shop, base_url = stub_shop()
+    pipeline.politeness = PolitenessController(initial_limit=4, max_limit=4)
+    pipeline.politeness.set_site_crawl_delay(0.2)
+    assert all(_crawl(pipeline, base_url, pages=6, workers=4))
+
+    arrivals = sorted(at for at, _ in shop.requests)
+    gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    assert len(arrivals) == 6 and min(gaps) >= 0.18
+
+
+def test_crawl_delay_applies_to_every_host_of_the_site(pipeline):
+    controller = pipeline.politeness
+    apex = controller.host("https://example.com/sitemap.xml")
+    pipeline.use_site_info(SiteInfo(domain="https://example.com", robots_txt="User-agent: *\nCrawl-delay: 2\n"))
+    assert apex.min_interval == 2.0
+    assert controller.host("https://www.example.com/products/p1").min_interval == 2.0
+    assert controller.host("https://cdn.example.net/sitemap-products.xml").min_interval == 2.0
+
+
+def test_discovery_requests_are_paced(stub_shop, pipeline):
+    shop, base_url = stub_shop()
+    pipeline.politeness = PolitenessController(initial_limit=1, min_limit=1, max_limit=1)
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+    request = pipeline.session.request
+
+    def counting_request(*args, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        try:
+            return request(*args, **kwargs)
+        finally:
+            with lock:
+                in_flight -= 1
+
+    pipeline.session.request = counting_request
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline.discover_sitemaps(base_url)
+
+    stats = pipeline.politeness.stats()[urlparse(base_url).netloc]
+    # robots.txt and the four common sitemap locations, one at a time
+    assert stats["requests"] >= 5 and peak == 1
+
+
+def _counting_requests(pipeline):
+    requests = []
+    request = pipeline.session.request
+
+    def counting_request(method, url, **kwargs):
+        requests.append(urlparse(url).path)
+        return request(method, url, **kwargs)
+
+    pipeline.session.request = counting_request
+    return requests
+
+
+def test_cached_discovery_makes_no_requests(site, pipeline):
+    requests = _counting_requests(pipeline)
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = pipeline.discover_sitemaps(site.url)
+        assert "/robots.txt" in requests and "/sitemap.xml" in requests
+        requests.clear()
+        assert pipeline.discover_sitemaps(site.url) == first == [f"{site.url}/sitemap.xml"]
+    assert requests == []
+
+
+@pytest.mark.parametrize("failing", ["/robots.txt", "/sitemap_index.xml"])
+def test_failed_discovery_is_not_cached(site, pipeline, monkeypatch, failing):
+    resource = site.resource
+    monkeypatch.setattr(site, "resource", lambda path, count: (500, "text/plain", b"")
+                        if path == failing else resource(path, count))
+    requests = _counting_requests(pipeline)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert pipeline.discover_sitemaps(site.url) == [f"{site.url}/sitemap.xml"]
+        requests.clear()
+        pipeline.discover_sitemaps(site.url)
+    assert failing in requests
+    assert pipeline.robots_cache.get(site.url) is None
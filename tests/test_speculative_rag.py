@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+from speculative_rag import SpeculativeRetriever
+
+
+class SlowLookup:
+    """Blocking lookup that records how many calls overlap"""
+
+    def __init__(self, seconds: float = 0.1):
+        self.seconds = seconds
+        self.running = 0
+        self.max_running = 0
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, query: str) -> str:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.queries.append(query)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running -= 1
+        return f"content for {query}"
+
+
+def test_cancelled_speculation_does_not_overlap_the_next_lookup():
+    lookup = SlowLookup()
+
+    async def turn():
+        retriever = SpeculativeRetriever(lookup, debounce=0.0)
+        retriever.on_transcript("tell me about the", is_final=False)
+        await asyncio.sleep(0.02)  # The speculative lookup thread is running
+        return await retriever.resolve("what is the return policy for headphones")
+
+    result = asyncio.run(turn())
+    assert not result.reused
+    assert result.content == "content for what is the return policy for headphones"
+    assert lookup.queries == ["tell me about the", "what is the return policy for headphones"]
+    assert lookup.max_running == 1
+
+
+def test_similar_final_transcript_reuses_speculation():
+    lookup = SlowLookup(seconds=0.01)
+
+    async def turn():
+        retriever = SpeculativeRetriever(lookup, debounce=0.0)
+        retriever.on_transcript("what is the price of the", is_final=False)
+        retriever.on_transcript("what is the price of the zero 2", is_final=True)
+        return await retriever.resolve("what is the price of the zero 2")
+
+    result = asyncio.run(turn())
+    assert result.reused
+    assert lookup.queries == ["what is the price of the zero 2"]
@@ -0,0 +1,92 @@
+import threading
+from types import SimpleNamespace
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+import summaries
+from summaries import HierarchicalSummarizer, build_summaries, directory_scope, document_scope
+
+
+class StubLLM:
+    """Returns a short deterministic summary and records every prompt"""
+
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            return SimpleNamespace(text=f"summary {len(self.prompts)}")
+
+
+DOCUMENTS = {
+    "products/amp.md": "# Amp\n\nA headphone amplifier.",
+    "products/dac.md": "# DAC\n\nA USB DAC.",
+    "collections/audio.md": "# Audio\n\nAll audio gear.",
+    "about.md": "# About\n\nWho we are.",
+}
+
+
+def _by_scope(records):
+    return {record["scope"]: record for record in records}
+
+
+def test_first_build_summarizes_every_level():
+    llm = StubLLM()
+    records = _by_scope(HierarchicalSummarizer(llm).build(DOCUMENTS))
+    # 4 documents, 2 directories, the site
+    assert len(llm.prompts) == 7
+    assert set(records) == {*(document_scope(source) for source in DOCUMENTS),
+                            directory_scope("products"), directory_scope("collections"), "site"}
+    assert records[directory_scope("products")]["sources"] == ["products/amp.md", "products/dac.md"]
+    assert records["site"]["sources"] == sorted(DOCUMENTS)
+
+
+def test_unchanged_build_reuses_everything():
+    existing = _by_scope(HierarchicalSummarizer(StubLLM()).build(DOCUMENTS))
+    llm = StubLLM()
+    records = _by_scope(HierarchicalSummarizer(llm).build(DOCUMENTS, existing))
+    assert llm.prompts == []
+    assert records == existing
+
+
+def test_changed_document_propagates_up_only_its_branch():
+    existing = _by_scope(HierarchicalSummarizer(StubLLM()).build(DOCUMENTS))
+    changed = dict(DOCUMENTS, **{"products/dac.md": "# DAC\n\nA USB DAC, now with balanced output."})
+    llm = StubLLM()
+    records = _by_scope(HierarchicalSummarizer(llm).build(changed, existing))
+
+    # The document, its directory and the site
+    assert len(llm.prompts) == 3
+    assert "balanced output" in llm.prompts[0]
+    assert summaries.DIRECTORY_PROMPT.split("{name}")[0] in llm.prompts[1]
+    for unchanged in (document_scope("products/amp.md"), directory_scope("collections")):
+        assert records[unchanged] is existing[unchanged]
+    assert records[directory_scope("products")]["sha256"] != existing[directory_scope("products")]["sha256"]
+
+
+def test_long_input_is_summarized_in_batches_then_reduced():
+    paragraphs = [f"Paragraph {i}: " + "x" * 80 for i in range(10)]
+    llm = StubLLM()
+    summarizer = HierarchicalSummarizer(llm, max_input_chars=250)
+    summary = summarizer.summarize(paragraphs, summaries.DOCUMENT_PROMPT)
+
+    batch_prompts, reduce_prompts = llm.prompts[:-1], llm.prompts[-1:]
+    assert len(batch_prompts) == 5  # two ~95-character paragraphs per batch
+    assert all(prompt.count("Paragraph") == 2 for prompt in batch_prompts)
+    assert all(f"summary {i}" in reduce_prompts[0] for i in range(1, 6))
+    assert summary == "summary 6" and summarizer.llm_calls == 6
+
+
+def test_build_summaries_on_an_empty_collection():
+    client = QdrantClient(":memory:")
+    client.create_collection("kb", vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+
+    def encode_texts(texts):
+        raise AssertionError("nothing should be embedded")
+
+    converter = SimpleNamespace(qdrant_client=client, collection_name="kb", encode_texts=encode_texts)
+    stats = build_summaries(converter, llm=StubLLM())
+    assert stats == {"summaries": 0, "llm_calls": 0, "removed": 0}
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+trace = pytest.importorskip("opentelemetry.trace")
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+os.environ.setdefault("LIVEKIT_URL", "wss://livekit.test")
+os.environ.setdefault("LIVEKIT_API_KEY", "test-key")
+os.environ.setdefault("LIVEKIT_API_SECRET", "test-secret-with-enough-length-for-hs256")
+
+import backend
+import tracing
+from tracing import attach_context, inject_context, span
+
+_exporter = InMemorySpanExporter()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tracer_provider():
+    # The global provider can only be set once per process
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(_exporter))
+    trace.set_tracer_provider(provider)
+    yield provider
+
+
+@pytest.fixture
+def exporter():
+    _exporter.clear()
+    yield _exporter
+    _exporter.clear()
+
+
+def test_span_nests_and_sets_attributes(exporter):
+    with span("outer", tenant="acme", room=None):
+        with span("inner", limit=5):
+            pass
+    inner, outer = exporter.get_finished_spans()
+    assert (inner.name, outer.name) == ("inner", "outer")
+    assert inner.parent.span_id == outer.context.span_id
+    assert dict(outer.attributes) == {"tenant": "acme"}
+    assert dict(inner.attributes) == {"limit": 5}
+
+
+def test_propagated_context_continues_the_trace(exporter):
+    with span("POST /extract-knowledge-base"):
+        carrier = inject_context()
+    assert "traceparent" in carrier
+
+    # e.g. the background ingestion task or the retrieval sidecar
+    with attach_context(carrier), span("ingest.run_extraction"):
+        pass
+    with span("unrelated"):
+        pass
+    request, ingest, unrelated = exporter.get_finished_spans()
+    assert ingest.context.trace_id == request.context.trace_id
+    assert ingest.parent.span_id == request.context.span_id
+    assert unrelated.context.trace_id != request.context.trace_id
+
+
+def test_attach_context_without_carrier_is_a_no_op(exporter):
+    with attach_context(None), span("root"):
+        pass
+    [root] = exporter.get_finished_spans()
+    assert root.parent is None
+
+
+def test_traces_file_is_closed_on_shutdown(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    file_exporter = tracing._file_span_exporter(str(path))
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(file_exporter))
+    with provider.get_tracer("test").start_as_current_span("one"):
+        pass
+    with provider.get_tracer("test").start_as_current_span("two"):
+        pass
+    provider.shutdown()
+
+    assert file_exporter.out.closed
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["one", "two"]
+
+
+def test_ingestion_spans_nest_under_run_extraction(exporter, site, qdrant):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert backend.run_extraction(site.url, max_pages=20)["status"] == "completed"
+
+    spans = exporter.get_finished_spans()
+    by_id = {span.context.span_id: span for span in spans}
+    [root] = [span for span in spans if span.name == "ingest.run_extraction"]
+
+    def ancestors(span):
+        while span.parent is not None and span.parent.span_id in by_id:
+            span = by_id[span.parent.span_id]
+            yield span.name
+
+    names = {span.name for span in spans}
+    assert {"ingest.crawl", "crawl.fetch_url", "crawl.clean_html_to_markdown", "ingest.split_texts_into_chunks",
+            "ingest.embed_batch", "ingest.upsert_batch"} <= names
+    for span in spans:
+        if span is not root and span.name.startswith(("ingest.", "crawl.")):
+            assert "ingest.run_extraction" in ancestors(span), span.name
+            assert span.context.trace_id == root.context.trace_id
+    pages = [span for span in spans if span.name == "crawl.clean_html_to_markdown"]
+    assert len(pages) == site.pages
+    assert all(next(ancestors(span)) == "ingest.crawl" for span in pages)
+    assert [span.attributes["batch_size"] for span in spans if span.name == "ingest.upsert_batch"][0] == 2
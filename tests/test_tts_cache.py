@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from livekit import rtc
+from prometheus_client import REGISTRY
+
+import tts_cache
+from tts_cache import TTSAudioCache
+
+MODEL = "cartesia/sonic-2:voice"
+
+
+def _frames(count=3, sample_rate=16000):
+    samples = sample_rate // 10
+    return [rtc.AudioFrame(data=bytes(samples * 2), sample_rate=sample_rate, num_channels=1,
+                           samples_per_channel=samples) for _ in range(count)]
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(cache, *chunks, on_cached_audio=None):
+    synthesized = []
+
+    async def synthesize(stream):
+        async for chunk in stream:
+            synthesized.append(chunk)
+        for frame in _frames(1):
+            yield frame
+
+    frames = [frame async for frame in cache.tts_node(MODEL, _chunks(*chunks), synthesize, on_cached_audio)]
+    return frames, synthesized
+
+
+def test_cached_reply_is_replayed_and_counted(tmp_path):
+    cache = TTSAudioCache(str(tmp_path))
+    cache.put(MODEL, "No relevant information found.", _frames())
+
+    ttfbs = []
+    frames, synthesized = asyncio.run(_collect(cache, "No relevant ", "information found.",
+                                               on_cached_audio=ttfbs.append))
+    assert len(frames) == 3 and not synthesized
+    frames, synthesized = asyncio.run(_collect(cache, "Something ", "else.", on_cached_audio=ttfbs.append))
+    assert len(frames) == 1 and synthesized == ["Something ", "else."]
+    assert len(ttfbs) == 1 and ttfbs[0] >= 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lookups_are_exported(tmp_path):
+    def exported(result):
+        return REGISTRY.get_sample_value("tts_cache_lookups_total", {"result": result}) or 0.0
+
+    hits, misses = exported("hit"), exported("miss")
+    cache = TTSAudioCache(str(tmp_path))
+    cache.put(MODEL, "Hello.", _frames())
+    cache.get(MODEL, "Hello.")
+    cache.get(MODEL, "Goodbye.")
+    assert exported("hit") == hits + 1 and exported("miss") == misses + 1
+    assert REGISTRY.get_sample_value("tts_cache_hit_rate") == 0.5
+
+
+def test_usage_counts_are_bounded_and_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache, "USAGE_MAX_TEXTS", 3)
+    first = TTSAudioCache(str(tmp_path))
+    for _ in range(3):
+        first.record_utterance(MODEL, "Hello  there.")
+    for i in range(10):
+        first.record_utterance(MODEL, f"One-off reply {i}")
+    first.flush_usage()
+
+    second = TTSAudioCache(str(tmp_path))
+    second.record_utterance(MODEL, "Hello there.")
+    second.flush_usage()
+
+    saved = json.loads((tmp_path / "usage_counts.json").read_text())
+    assert len(saved[MODEL]) == 3
+    assert saved[MODEL]["Hello there."] == 4
+    assert not (tmp_path / "usage.jsonl").exists()
+    assert second.most_frequent(MODEL) == ["Hello there."]
+
+
+def test_most_frequent_does_not_read_the_disk(tmp_path, monkeypatch):
+    cache = TTSAudioCache(str(tmp_path))
+    cache.record_utterance(MODEL, "Hello there.")
+    cache.record_utterance(MODEL, "Hello there.")
+    monkeypatch.setattr(cache, "_read_usage", lambda: pytest.fail("most_frequent read the counts file"))
+    assert cache.most_frequent(MODEL) == ["Hello there."]
+
+
+def test_tts_node_flushes_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache, "USAGE_FLUSH_EVERY", 1)
+    cache = TTSAudioCache(str(tmp_path))
+    threads = []
+    flush_usage = cache.flush_usage
+
+    def recording_flush():
+        threads.append(threading.current_thread())
+        flush_usage()
+
+    monkeypatch.setattr(cache, "flush_usage", recording_flush)
+    asyncio.run(_collect(cache, "A reply."))
+    assert threads and threads[0] is not threading.main_thread()
+    assert json.loads((tmp_path / "usage_counts.json").read_text()) == {MODEL: {"A reply.": 1}}
+
+
+class StubTTS:
+    """tts.synthesize() streaming two frames per utterance"""
+
+    def __init__(self):
+        self.texts = []
+
+    @asynccontextmanager
+    async def synthesize(self, text):
+        self.texts.append(text)
+
+        async def stream():
+            for frame in _frames(2):
+                yield SimpleNamespace(frame=frame)
+        yield stream()
+
+
+def test_warm_writes_the_cache_off_the_event_loop(tmp_path, monkeypatch):
+    cache = TTSAudioCache(str(tmp_path))
+    threads = []
+    put = cache.put
+    monkeypatch.setattr(cache, "put", lambda *args: threads.append(threading.current_thread()) or put(*args))
+    tts = StubTTS()
+
+    warmed = asyncio.run(cache.warm(tts, MODEL))
+    assert warmed == len(tts_cache.FIXED_UTTERANCES) == len(tts.texts)
+    assert threading.main_thread() not in threads
+    assert all(len(cache.get(MODEL, text)) == 2 for text in tts.texts)
+    assert asyncio.run(cache.warm(tts, MODEL)) == 0
@@ -0,0 +1,70 @@
+from llama_index.core.schema import QueryBundle
+
+import util
+from util import MAX_TOOL_NAME_LENGTH, doc_tool_name
+
+
+def test_short_names_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(util, "KNOWLEDGE_BASE_DIR", tmp_path)
+    assert doc_tool_name(tmp_path / "products" / "blue-shirt.md") == "products_blue_shirt"
+
+
+def test_truncated_names_stay_distinct(tmp_path, monkeypatch):
+    monkeypatch.setattr(util, "KNOWLEDGE_BASE_DIR", tmp_path)
+    prefix = "products/" + "organic-cotton-crew-neck-t-shirt-" * 3
+    first = doc_tool_name(tmp_path / f"{prefix}white.md")
+    second = doc_tool_name(tmp_path / f"{prefix}black.md")
+    assert first != second
+    assert len(first) == len(second) == MAX_TOOL_NAME_LENGTH
+    assert first == doc_tool_name(tmp_path / f"{prefix}white.md")
+    assert first.startswith("products_organic_cotton")
+
+
+def test_overview_tools_dont_collide_with_document_tools(tmp_path, monkeypatch):
+    monkeypatch.setattr(util, "KNOWLEDGE_BASE_DIR", tmp_path)
+    overview_names = {tool.metadata.name for tool in util.get_overview_tools(["products", "site"])}
+    document_names = {f"{prefix}_{doc_tool_name(tmp_path / source)}"
+                      for prefix in ("vector_tool", "summary_tool") for source in ("site.md", "products.md")}
+    assert overview_names == {"overview_tool_site", "overview_tool_dir_products", "overview_tool_dir_site"}
+    assert not overview_names & document_names
+
+
+def test_document_tools_search_their_document_and_use_its_summary(tmp_path, monkeypatch, stub_embedding_model):
+    from llama_index.core.llms import MockLLM
+
+    from summaries import SummaryStore, document_scope
+    from vector_db_init import MarkdownToVectorDB
+
+    texts = {"products/amp.md": ["A headphone amplifier with a USB input", "Amplifier power: 2 watts"],
+             "products/dac.md": ["A USB DAC for headphones", "DAC outputs: balanced and single-ended"]}
+    for source in texts:
+        (tmp_path / source).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / source).write_text("\n\n".join(texts[source]))
+    monkeypatch.setattr(util, "KNOWLEDGE_BASE_DIR", tmp_path)
+
+    converter = MarkdownToVectorDB(knowledge_base_dir=str(tmp_path), qdrant_url=":memory:", dedup=False)
+    chunks = [{"text": text, "source": source, "title": source, "chunk_id": i, "char_count": len(text),
+               "word_count": len(text.split())} for source in texts for i, text in enumerate(texts[source])]
+    converter.create_collection(converter.collection_name, 64)
+    converter.qdrant_client.upsert(converter.collection_name, points=[
+        converter.make_point(chunk, vector)
+        for chunk, vector in zip(chunks, converter.encode_texts([chunk["text"] for chunk in chunks]))])
+    store = SummaryStore(converter.qdrant_client, converter.collection_name)
+    store.setup(64)
+    record = {"scope": document_scope("products/amp.md"), "summary": "Overview of the amplifier page"}
+    store.upsert([record], converter.encode_texts([record["summary"]]))
+    monkeypatch.setattr(util, "_retriever", converter)
+
+    vector_tool, summary_tool = util.get_doc_tools_with_metadata(
+        tmp_path / "products/amp.md", "products_amp", custom_metadata={"category": "amplifiers"}, llm=MockLLM())
+    assert vector_tool.metadata.name == "vector_tool_products_amp"
+
+    nodes = vector_tool.query_engine.retrieve(QueryBundle("USB DAC for headphones"))
+    assert len(nodes) == 2
+    assert {node.metadata["source"] for node in nodes} == {"products/amp.md"}
+    assert {node.metadata["category"] for node in nodes} == {"amplifiers"}
+    assert vector_tool.call("USB DAC for headphones").raw_output.source_nodes
+
+    assert summary_tool.call("What is this page about?").content == "Overview of the amplifier page"
+    _, dac_summary_tool = util.get_doc_tools(tmp_path / "products/dac.md", "products_dac", llm=MockLLM())
+    assert dac_summary_tool.call("overview").content == "No overview is available for this yet."
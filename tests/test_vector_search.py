@@ -0,0 +1,76 @@
+import pytest
+import qdrant_client
+from qdrant_client import QdrantClient
+
+from vector_compression import VectorCompression
+from vector_db_init import MarkdownToVectorDB
+
+COLLECTION = "markdown_knowledge_base"
+TEXTS = ["Wireless headphones with 30 hours of battery", "Free shipping on orders over 50 euros",
+         "Returns are accepted within 30 days", "The amplifier drives 300 ohm headphones",
+         "Turntable cartridges and styluses", "Speaker cables by the meter"]
+
+
+def converter_for(client, monkeypatch, compression=None):
+    monkeypatch.setattr(qdrant_client, "QdrantClient", lambda *args, **kwargs: client)
+    return MarkdownToVectorDB(collection_name=COLLECTION, qdrant_url=":memory:", dedup=False,
+                              compression=compression)
+
+
+def publish(converter, name):
+    """Index TEXTS in a new build with the converter's compression and point the alias at it"""
+    chunks = [{"text": text, "source": f"page{i}.md", "title": f"Page {i}", "chunk_id": 0,
+               "char_count": len(text), "word_count": len(text.split())} for i, text in enumerate(TEXTS)]
+    build = converter.build_collection_name(name)
+    converter.create_collection(build, converter.embedding_model.get_sentence_embedding_dimension())
+    converter.qdrant_client.upsert(build, points=[converter.make_point(chunk, vector) for chunk, vector
+                                                  in zip(chunks, converter.encode_texts(TEXTS))])
+    converter.switch_alias(build)
+    return build
+
+
+@pytest.fixture
+def client(stub_embedding_model):
+    return QdrantClient(":memory:")
+
+
+@pytest.mark.parametrize("compression", [VectorCompression(), VectorCompression("int8"),
+                                         VectorCompression(truncate_dim=16), VectorCompression("int8", 16)],
+                         ids=lambda compression: compression.describe())
+def test_search_each_layout(client, monkeypatch, compression):
+    converter = converter_for(client, monkeypatch, compression)
+    publish(converter, "first")
+    results = converter.search_similar("amplifier for 300 ohm headphones", limit=2)
+    assert [result["source"] for result in results][0] == "page3.md"
+    assert len(results) == 2 and results[0]["score"] >= results[1]["score"]
+
+    filtered = converter.search_similar("amplifier for 300 ohm headphones", limit=2, source="page0.md")
+    assert [result["source"] for result in filtered] == ["page0.md"]
+
+
+def test_search_follows_a_switch_to_another_layout(client, monkeypatch):
+    searcher = converter_for(client, monkeypatch)
+    publish(searcher, "first")
+    assert searcher.search_similar("free shipping")[0]["source"] == "page1.md"
+
+    # Another process publishes a build with named (truncated) vectors
+    publish(converter_for(client, monkeypatch, VectorCompression(truncate_dim=16)), "second")
+    assert searcher.search_similar("free shipping")[0]["source"] == "page1.md"
+    assert searcher.search_compression().truncate_dim == 16
+
+
+def test_search_errors_are_not_retried(client, monkeypatch):
+    converter = converter_for(client, monkeypatch)
+    publish(converter, "first")
+    converter.search_similar("free shipping")
+
+    calls = []
+
+    def failing_search(*args):
+        calls.append(args)
+        raise RuntimeError("Qdrant is unavailable")
+
+    monkeypatch.setattr(converter, "vector_search", failing_search)
+    with pytest.raises(RuntimeError, match="unavailable"):
+        converter.search_similar("free shipping")
+    assert len(calls) == 1
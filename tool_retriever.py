@@ -0,0 +1,117 @@
+"""
+Tool retrieval: expose only the tools relevant to the current turn.
+
+With per-document tools (util.get_doc_tools) the tool list grows with the
+catalog, and every tool schema goes into every LLM request. ToolRetriever
+embeds each tool's name and description once with the knowledge base
+embedding model, caches the vectors on disk (keyed by model and text, so
+only new or changed tools are ever embedded), and returns the top-N tools
+for a query by cosine similarity.
+
+Tools are duck-typed: LlamaIndex tools are described by `tool.metadata`,
+anything else by `name`/`description` attributes or a custom `describe`.
+"""
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv("TOOL_EMBEDDING_CACHE_DIR", ".cache/tool_embeddings")
+
+
+def describe_tool(tool) -> Tuple[str, str]:
+    """(name, description) of a LlamaIndex tool or an object with name/description"""
+    metadata = getattr(tool, "metadata", None)
+    if metadata is not None and hasattr(metadata, "description"):
+        return metadata.name, metadata.description
+    return getattr(tool, "name", str(tool)), getattr(tool, "description", "") or ""
+
+
+class ToolEmbeddingCache:
+    """Embeddings of tool descriptions persisted as one .npz file per embedding model"""
+
+    def __init__(self, model_name: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+        self.path = Path(cache_dir) / f"{safe_name}.npz"
+        self._vectors: Dict[str, np.ndarray] = {}
+        if self.path.exists():
+            try:
+                with np.load(self.path) as data:
+                    self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not read tool embedding cache {self.path}: {e}")
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self._vectors.get(self.key(text))
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        for text, vector in zip(texts, vectors):
+            self._vectors[self.key(text)] = np.asarray(vector, dtype=np.float32)
+        self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp.npz")
+        keys = list(self._vectors)
+        np.savez(tmp_path, keys=np.array(keys), vectors=np.stack([self._vectors[k] for k in keys]))
+        os.replace(tmp_path, self.path)
+
+
+class ToolRetriever:
+    """Selects the top-N tools for a query by embedding similarity"""
+
+    def __init__(self,
+                 tools: Sequence,
+                 embed: Callable[[List[str]], np.ndarray],
+                 model_name: str,
+                 top_n: int = 4,
+                 describe: Callable = describe_tool,
+                 cache_dir: str = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            tools: Candidate tools
+            embed: Batch text embedding function (e.g. MarkdownToVectorDB.encode_texts)
+            model_name: Name of the embedding model, part of the cache key
+            top_n: Default number of tools returned per query
+            describe: Function returning a tool's (name, description)
+            cache_dir: Directory of the tool embedding cache
+        """
+        self.tools = list(tools)
+        self.embed = embed
+        self.top_n = top_n
+        self.describe = describe
+        self.cache = ToolEmbeddingCache(model_name, cache_dir)
+        self.matrix = self._embed_tools()
+
+    def _embed_tools(self) -> np.ndarray:
+        texts = [f"{name}: {description}" for name, description in map(self.describe, self.tools)]
+        missing = [text for text in dict.fromkeys(texts) if self.cache.get(text) is None]
+        if missing:
+            self.cache.put_many(missing, self.embed(missing))
+        logger.info(f"Indexed {len(texts)} tools ({len(missing)} newly embedded)")
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.stack([self.cache.get(text) for text in texts]).astype(np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def scores(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed([query])[0], dtype=np.float32)
+        return self.matrix @ (vector / np.linalg.norm(vector))
+
+    def retrieve(self, query: str, top_n: Optional[int] = None) -> List:
+        """The `top_n` tools most relevant to `query`, best first"""
+        top_n = min(top_n or self.top_n, len(self.tools))
+        if not top_n or not query.strip():
+            return []
+        scores = self.scores(query)
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+        return [self.tools[i] for i in top[np.argsort(-scores[top])]]
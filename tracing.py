@@ -0,0 +1,121 @@
+"""
+OpenTelemetry tracing helpers.
+
+Spans are exported over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set, or
+appended as one JSON object per line to OTEL_TRACES_FILE (closed when the
+tracer provider shuts down at exit). Without either
+(or without the opentelemetry packages installed) every helper here is a
+no-op, so instrumented code never needs to check whether tracing is on.
+"""
+import logging
+import os
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+except ImportError:
+    trace = None
+
+_configured = False
+
+
+def configure_tracing(service_name: str) -> bool:
+    """Set up the tracer provider and exporter for this process (idempotent)"""
+    global _configured
+    if _configured or trace is None:
+        return _configured
+    _configured = True
+
+    otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    traces_file = os.getenv("OTEL_TRACES_FILE")
+    if not otlp_endpoint and not traces_file:
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+        logger.info(f"Exporting traces to {otlp_endpoint}")
+    else:
+        exporter = _file_span_exporter(traces_file)
+        logger.info(f"Writing traces to {traces_file}")
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def _file_span_exporter(path: str):
+    """Exporter appending spans to `path` as JSON lines; shutting it down closes the file"""
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    class FileSpanExporter(ConsoleSpanExporter):
+        def shutdown(self):
+            self.out.close()
+
+    return FileSpanExporter(
+        out=open(path, "a", encoding="utf-8"),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Start a span as the current span; yields the span (or None when tracing is off)"""
+    if trace is None:
+        yield None
+        return
+    with trace.get_tracer("voice-agent").start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
+
+
+def flush():
+    """Export finished spans now (e.g. before a worker process goes idle)"""
+    if trace is not None and hasattr(trace.get_tracer_provider(), "force_flush"):
+        trace.get_tracer_provider().force_flush()
+
+
+def inject_context() -> Dict[str, str]:
+    """Serialize the current trace context (W3C traceparent) into a dict"""
+    carrier: Dict[str, str] = {}
+    if trace is not None:
+        propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def attach_context(carrier: Optional[Dict[str, str]]):
+    """Make a propagated trace context (e.g. request headers) current"""
+    if trace is None or not carrier:
+        yield
+        return
+    token = otel_context.attach(propagate.extract(carrier))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+def in_current_trace(function):
+    """
+    Wrap a function to run in the caller's trace context
+
+    Threads start with an empty context: pass the wrapped function to a thread or
+    executor so its spans join the trace of the code that started it.
+    """
+    carrier = inject_context()
+
+    def run(*args, **kwargs):
+        with attach_context(carrier):
+            return function(*args, **kwargs)
+    return run
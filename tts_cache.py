@@ -0,0 +1,347 @@
+"""
+Content-addressed disk cache for synthesized speech.
+
+Audio is keyed by (tts model, voice, text) and stored as one WAV file per
+utterance plus a small JSON file with its metadata, so several job processes
+can share the cache directory without a shared index. Files are touched on
+every hit and the least recently used ones are evicted once the cache grows
+over `max_bytes`.
+
+Utterances the agent speaks are counted in memory and merged into a small
+JSON file of counts every few replies. Only the most frequent texts per
+voice are kept there, so the file stays bounded and one-off replies don't
+stay on disk. `warm()` synthesizes the most frequent utterances that are not
+cached yet, so fixed phrases and common answers stop costing a TTS round trip.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import wave
+from collections import Counter
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from livekit import rtc
+
+from latency_metrics import observe_tts_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent flushes may drop counts
+    fcntl = None
+
+logger = logging.getLogger("agent-worker")
+
+DEFAULT_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".cache/tts")
+DEFAULT_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Fixed utterances worth caching even before they show up in the usage counts
+FIXED_UTTERANCES = [
+    "Hello. How can I help you today?",
+    "Unable to retrieve information at this time.",
+    "No relevant information found.",
+]
+
+# Cached audio is replayed in frames of this duration
+PLAYBACK_FRAME_MS = 100
+
+# Texts whose counts are kept per TTS model/voice, and utterances between two
+# merges of the in-memory counts into the counts file
+USAGE_MAX_TEXTS = int(os.getenv("TTS_CACHE_USAGE_MAX_TEXTS", "200"))
+USAGE_FLUSH_EVERY = 20
+
+
+def split_tts_model(tts_model: str) -> Tuple[str, str]:
+    """Split a "provider/model:voice" descriptor into (model, voice)"""
+    model, _, voice = tts_model.partition(":")
+    return model, voice
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class TTSAudioCache:
+    """Disk-backed LRU cache of synthesized utterances"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: Directory holding the cached audio and the usage counts
+            max_bytes: Total audio size above which least recently used entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.usage_path = self.cache_dir / "usage_counts.json"
+
+        self.hits = 0
+        self.misses = 0
+
+        # tts_model -> text -> count, as of the last merge plus this process's
+        # utterances since; _unsaved holds the latter until the next flush
+        self._usage: Dict[str, Counter] = self._read_usage()
+        self._unsaved: Dict[str, Counter] = {}
+
+        # (tts_model, normalized text) of every cached entry, for prefix matching
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        for meta_path in self.cache_dir.glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+                self._entries[meta_path.stem] = (meta["tts_model"], meta["text"])
+            except (OSError, ValueError, KeyError):
+                continue
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _count_lookup(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        observe_tts_cache(hit, self.hit_rate)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "entries": len(self._entries),
+        }
+
+    @staticmethod
+    def key(tts_model: str, text: str) -> str:
+        model, voice = split_tts_model(tts_model)
+        return hashlib.sha256(f"{model}\0{voice}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.cache_dir / f"{key}.wav", self.cache_dir / f"{key}.json"
+
+    def contains(self, tts_model: str, text: str) -> bool:
+        return self.key(tts_model, text) in self._entries
+
+    def get(self, tts_model: str, text: str) -> Optional[List[rtc.AudioFrame]]:
+        """Load cached audio for an utterance, or None on a miss"""
+        key = self.key(tts_model, text)
+        wav_path, _ = self._paths(key)
+        try:
+            with wave.open(str(wav_path), "rb") as wav:
+                sample_rate = wav.getframerate()
+                num_channels = wav.getnchannels()
+                pcm = wav.readframes(wav.getnframes())
+            os.utime(wav_path)  # mark as recently used
+        except (OSError, EOFError, wave.Error):
+            self._count_lookup(False)
+            return None
+
+        self._count_lookup(True)
+        samples_per_frame = sample_rate * PLAYBACK_FRAME_MS // 1000
+        bytes_per_frame = samples_per_frame * num_channels * 2
+        frames = []
+        for offset in range(0, len(pcm), bytes_per_frame):
+            chunk = pcm[offset:offset + bytes_per_frame]
+            frames.append(rtc.AudioFrame(
+                data=chunk,
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                samples_per_channel=len(chunk) // (2 * num_channels),
+            ))
+        return frames
+
+    def put(self, tts_model: str, text: str, frames: List[rtc.AudioFrame]):
+        """Store synthesized audio for an utterance"""
+        if not frames:
+            return
+        key = self.key(tts_model, text)
+        wav_path, meta_path = self._paths(key)
+        tmp_path = wav_path.with_suffix(f".{os.getpid()}.tmp")
+        with wave.open(str(tmp_path), "wb") as wav:
+            wav.setnchannels(frames[0].num_channels)
+            wav.setsampwidth(2)
+            wav.setframerate(frames[0].sample_rate)
+            for frame in frames:
+                wav.writeframes(bytes(frame.data))
+        os.replace(tmp_path, wav_path)
+        meta_path.write_text(json.dumps({
+            "tts_model": tts_model,
+            "text": normalize_text(text),
+            "created": time.time(),
+        }))
+        self._entries[key] = (tts_model, normalize_text(text))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        files = []
+        for wav_path in self.cache_dir.glob("*.wav"):
+            try:
+                stat = wav_path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, wav_path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, wav_path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(wav_path.stem):
+                path.unlink(missing_ok=True)
+            self._entries.pop(wav_path.stem, None)
+            total -= size
+            logger.debug(f"Evicted cached TTS audio {wav_path.stem}")
+
+    def _read_usage(self) -> Dict[str, Counter]:
+        try:
+            data = json.loads(self.usage_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable TTS usage counts {self.usage_path}: {e}")
+            return {}
+        return {model: Counter(counts) for model, counts in data.items() if isinstance(counts, dict)}
+
+    def record_utterance(self, tts_model: str, text: str) -> bool:
+        """
+        Count a spoken utterance (in memory only).
+
+        Returns:
+            True once enough utterances are unsaved that flush_usage() should run
+        """
+        text = normalize_text(text)
+        if not text:
+            return False
+        self._usage.setdefault(tts_model, Counter())[text] += 1
+        self._unsaved.setdefault(tts_model, Counter())[text] += 1
+        return sum(sum(counts.values()) for counts in self._unsaved.values()) >= USAGE_FLUSH_EVERY
+
+    def flush_usage(self):
+        """
+        Merge this process's unsaved counts into the counts file (blocking I/O).
+
+        The file is locked while it is read, merged and rewritten, so job
+        processes sharing the cache directory don't lose each other's counts.
+        Only the USAGE_MAX_TEXTS most frequent texts per TTS model are kept.
+        """
+        if not self._unsaved:
+            return
+        unsaved, self._unsaved = self._unsaved, {}
+        lock_path = self.usage_path.with_suffix(".lock")
+        with open(lock_path, "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            usage = self._read_usage()
+            for model, counts in unsaved.items():
+                usage.setdefault(model, Counter()).update(counts)
+            usage = {model: Counter(dict(counts.most_common(USAGE_MAX_TEXTS))) for model, counts in usage.items()}
+            tmp_path = self.usage_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps({model: dict(counts) for model, counts in usage.items()}),
+                                encoding="utf-8")
+            os.replace(tmp_path, self.usage_path)
+        # Pick up the counts of other processes, plus anything recorded meanwhile
+        for model, counts in list(self._unsaved.items()):
+            usage.setdefault(model, Counter()).update(dict(counts))
+        self._usage = usage
+
+    def most_frequent(self, tts_model: str, top_n: int = 20, min_count: int = 2) -> List[str]:
+        """Most frequently spoken utterances for a TTS model/voice (from memory)"""
+        counts = self._usage.get(tts_model, Counter())
+        return [text for text, count in counts.most_common(top_n) if count >= min_count]
+
+    async def _record(self, tts_model: str, text: str):
+        if self.record_utterance(tts_model, text):
+            try:
+                await asyncio.to_thread(self.flush_usage)
+            except OSError as e:
+                logger.warning(f"Could not save TTS usage counts: {e}")
+
+    async def synthesize(self, tts, tts_model: str, text: str) -> List[rtc.AudioFrame]:
+        """Synthesize an utterance with `tts` and store it"""
+        frames = []
+        async with tts.synthesize(text) as stream:
+            async for audio in stream:
+                frames.append(audio.frame)
+        # WAV and metadata writes plus eviction: off the event loop
+        await asyncio.to_thread(self.put, tts_model, text, frames)
+        return frames
+
+    async def warm(self, tts, tts_model: str, top_n: int = 20) -> int:
+        """Synthesize fixed and frequent utterances that aren't cached yet"""
+        candidates = FIXED_UTTERANCES + self.most_frequent(tts_model, top_n=top_n)
+        warmed = 0
+        for text in dict.fromkeys(candidates):
+            if self.contains(tts_model, text):
+                continue
+            try:
+                await self.synthesize(tts, tts_model, text)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Could not warm TTS cache for '{text}': {e}")
+        if warmed:
+            logger.info(f"Warmed TTS cache with {warmed} utterances for {tts_model}")
+        return warmed
+
+    async def tts_node(self,
+                       tts_model: str,
+                       text: AsyncIterable[str],
+                       synthesize: Callable[[AsyncIterable[str]], AsyncIterable[rtc.AudioFrame]],
+                       on_cached_audio: Optional[Callable[[float], None]] = None,
+                       ) -> AsyncIterator[rtc.AudioFrame]:
+        """
+        Play a streamed LLM reply from cache when the whole reply is cached.
+
+        Text is buffered only while it is still a prefix of some cached
+        utterance; as soon as it diverges, the buffered text and the rest of
+        the stream go to `synthesize` (the regular streaming TTS), so replies
+        that aren't cached lose no latency. Disk reads and writes run in a
+        thread so they don't block the event loop.
+
+        `on_cached_audio` is called with the seconds from the first text chunk to
+        the first frame when a reply is played from cache, since the TTS plugin
+        emits no metrics for it.
+        """
+        candidates = [cached_text for model, cached_text in self._entries.values() if model == tts_model]
+        spoken = []
+        stream = text.__aiter__()
+
+        buffered = ""
+        cache_checked = False
+        first_text_at = None
+        if candidates:
+            async for chunk in stream:
+                if first_text_at is None:
+                    first_text_at = time.perf_counter()
+                buffered += chunk
+                prefix = normalize_text(buffered)
+                if not any(cached_text.startswith(prefix) for cached_text in candidates):
+                    break
+            else:
+                # The whole reply matched a cached utterance's prefix; get() counts the hit/miss
+                cache_checked = True
+                frames = await asyncio.to_thread(self.get, tts_model, buffered)
+                if frames is not None:
+                    if on_cached_audio is not None and frames and first_text_at is not None:
+                        on_cached_audio(time.perf_counter() - first_text_at)
+                    for frame in frames:
+                        yield frame
+                    await self._record(tts_model, buffered)
+                    return
+        if not cache_checked:
+            self._count_lookup(False)
+
+        async def _remaining():
+            if buffered:
+                spoken.append(buffered)
+                yield buffered
+            async for chunk in stream:
+                spoken.append(chunk)
+                yield chunk
+
+        async for frame in synthesize(_remaining()):
+            yield frame
+        await self._record(tts_model, "".join(spoken))
@@ -1,116 +1,216 @@
 from pathlib import Path
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, SummaryIndex
+from typing import List, Optional
+import hashlib
+import os
+import re
+from llama_index.core.query_engine import CustomQueryEngine, RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
 from llama_index.core.tools import QueryEngineTool
 import logging
+from summaries import SITE_SCOPE, directory_scope, document_scope
 
 logger = logging.getLogger(__name__)
 
+KNOWLEDGE_BASE_DIR = Path(os.getenv("KNOWLEDGE_BASE_DIR", "knowledge_base"))
+VECTOR_TOOL_DESCRIPTION = ("Useful for retrieving specific information and answering questions about {name}. "
+                           "Use this for detailed queries about the content of {file_name}.")
+SUMMARY_TOOL_DESCRIPTION = ("Useful for getting a high-level summary or overview of {name}. "
+                            "Use this to understand the main topics and structure of {file_name}.")
+DIRECTORY_TOOL_DESCRIPTION = ("Useful for getting an overview of the {name} section of the website: "
+                              "what it contains and its main groups of items.")
+SITE_TOOL_DESCRIPTION = ("Useful for getting an overview of the whole website: what it offers "
+                         "and how its content is organized.")
 
-def get_doc_tools(file_path: Path, name: str):
+# Document tools share one retriever (the retrieval sidecar, or the in-process
+# vector DB built by vector_db_init) instead of indexing each document again
+_retriever = None
+_documents = None
+
+
+def get_knowledge_base_retriever():
+    """Get or initialize the retriever over the knowledge base Qdrant collection"""
+    global _retriever
+    if _retriever is None:
+        from retrieval_sidecar import get_retriever
+        _retriever = get_retriever(knowledge_base_dir=str(KNOWLEDGE_BASE_DIR))
+    return _retriever
+
+
+def knowledge_base_documents() -> set:
+    """Keys of the knowledge base documents (files or shards), read once"""
+    global _documents
+    if _documents is None:
+        from shard_store import document_keys
+        _documents = set(document_keys(KNOWLEDGE_BASE_DIR))
+    return _documents
+
+
+def document_source(file_path: Path) -> str:
+    """The `source` a document's chunks are stored under (path relative to the knowledge base)"""
+    file_path = Path(file_path)
+    try:
+        return file_path.resolve().relative_to(KNOWLEDGE_BASE_DIR.resolve()).as_posix()
+    except ValueError:
+        return file_path.name
+
+
+# Longest tool name identifier, leaving room for the "vector_tool_" / "summary_tool_" prefixes
+MAX_TOOL_NAME_LENGTH = 50
+
+
+def doc_tool_name(file_path: Path) -> str:
+    """
+    Tool name identifier of a document, valid in LLM function names (at most 64 of [a-zA-Z0-9_-]).
+
+    Long names are truncated and suffixed with a hash of the document's source,
+    so documents sharing a long prefix still get distinct tools.
+    """
+    source = document_source(file_path)
+    name = re.sub(r"\W", "_", source.removesuffix(".md"))
+    if len(name) > MAX_TOOL_NAME_LENGTH:
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:MAX_TOOL_NAME_LENGTH - len(digest) - 1]}_{digest}"
+    return name
+
+
+class KnowledgeBaseRetriever(BaseRetriever):
+    """LlamaIndex retriever over the existing Qdrant collection, optionally limited to one document"""
+
+    def __init__(self, source: Optional[str] = None, similarity_top_k: int = 5,
+                 metadata: Optional[dict] = None):
+        """
+        Args:
+            source: Only retrieve chunks of this document
+            similarity_top_k: Number of chunks to retrieve
+            metadata: Extra metadata attached to every retrieved node
+        """
+        super().__init__()
+        self.source = source
+        self.similarity_top_k = similarity_top_k
+        self.metadata = metadata or {}
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        results = get_knowledge_base_retriever().search_similar(
+            query_bundle.query_str,
+            limit=self.similarity_top_k,
+            source=self.source,
+            max_chars=None,
+        )
+        nodes = []
+        for result in results:
+            node = TextNode(
+                text=result["text"],
+                id_=f"{result['source']}#{result['chunk_id']}",
+                metadata={
+                    "source": result["source"],
+                    "title": result["title"],
+                    "section": result.get("section", ""),
+                    **self.metadata,
+                },
+            )
+            nodes.append(NodeWithScore(node=node, score=result["score"]))
+        return nodes
+
+
+class PrecomputedSummaryQueryEngine(CustomQueryEngine):
+    """Answers with a summary precomputed at ingestion time (summaries.py), one lookup and no LLM call"""
+
+    scope: str
+
+    def custom_query(self, query_str: str) -> str:
+        summary = get_knowledge_base_retriever().get_summary(self.scope)
+        return summary or "No overview is available for this yet."
+
+
+def get_overview_tools(directories: List[str]) -> List[QueryEngineTool]:
+    """
+    Create summary tools for the whole site and for knowledge base directories.
+
+    They are named overview_tool_site and overview_tool_dir_*, apart from the
+    documents' summary_tool_*, so no document or directory name can shadow them.
+
+    Args:
+        directories: Top-level knowledge base directories (e.g. "collections", "products")
+
+    Returns:
+        list: QueryEngineTools, the site summary first
+    """
+    tools = [QueryEngineTool.from_defaults(
+        query_engine=PrecomputedSummaryQueryEngine(scope=SITE_SCOPE),
+        name="overview_tool_site",
+        description=SITE_TOOL_DESCRIPTION,
+    )]
+    for directory in directories:
+        name = re.sub(r"\W", "_", directory)[:MAX_TOOL_NAME_LENGTH - 4]
+        tools.append(QueryEngineTool.from_defaults(
+            query_engine=PrecomputedSummaryQueryEngine(scope=directory_scope(directory)),
+            name=f"overview_tool_dir_{name}",
+            description=DIRECTORY_TOOL_DESCRIPTION.format(name=directory),
+        ))
+    return tools
+
+
+def get_doc_tools(file_path: Path, name: str, llm=None):
     """
     Create vector search and summary tools for a specific document.
-    
+
+    The vector tool searches the document's chunks in the knowledge base
+    collection and the summary tool returns its summary precomputed at
+    ingestion time (summaries.py), so building tools neither embeds anything
+    nor calls the network, and neither tool makes a summarization LLM call.
+
     Args:
         file_path: Path to the document file
         name: Name identifier for the tools
-        
+        llm: LlamaIndex LLM answering from the retrieved chunks (default: Settings.llm)
+
     Returns:
         tuple: (vector_tool, summary_tool)
     """
-    try:
-        # Load the document
-        documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
-        
-        if not documents:
-            logger.warning(f"No documents loaded from {file_path}")
-            return None, None
-        
-        # Create a vector index for semantic search
-        vector_index = VectorStoreIndex.from_documents(documents)
-        
-        # Create a summary index for document summaries
-        summary_index = SummaryIndex.from_documents(documents)
-        
-        # Create query engines
-        vector_query_engine = vector_index.as_query_engine()
-        summary_query_engine = summary_index.as_query_engine()
-        
-        # Create tools with descriptive names and descriptions
-        vector_tool = QueryEngineTool.from_defaults(
-            query_engine=vector_query_engine,
-            name=f"vector_tool_{name}",
-            description=f"Useful for retrieving specific information and answering questions about {name}. "
-                       f"Use this for detailed queries about the content of {file_path.name}."
-        )
-        
-        summary_tool = QueryEngineTool.from_defaults(
-            query_engine=summary_query_engine,
-            name=f"summary_tool_{name}",
-            description=f"Useful for getting a high-level summary or overview of {name}. "
-                       f"Use this to understand the main topics and structure of {file_path.name}."
-        )
-        
-        logger.info(f"Created tools for {file_path.name}")
-        return vector_tool, summary_tool
-        
-    except Exception as e:
-        logger.error(f"Error creating tools for {file_path}: {e}")
-        raise
+    return get_doc_tools_with_metadata(file_path, name, llm=llm)
 
 
-def get_doc_tools_with_metadata(file_path: Path, name: str, custom_metadata: dict = None):
+def get_doc_tools_with_metadata(file_path: Path, name: str, custom_metadata: dict = None, llm=None):
     """
     Create vector search and summary tools with custom metadata.
-    
+
     Args:
         file_path: Path to the document file
         name: Name identifier for the tools
-        custom_metadata: Optional dictionary of custom metadata to attach to documents
-        
+        custom_metadata: Optional dictionary of custom metadata to attach to retrieved nodes
+        llm: LlamaIndex LLM answering from the retrieved chunks (default: Settings.llm)
+
     Returns:
         tuple: (vector_tool, summary_tool)
     """
     try:
-        # Load the document
-        documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
-        
-        if not documents:
+        file_path = Path(file_path)
+        if not file_path.exists() and document_source(file_path) not in knowledge_base_documents():
             logger.warning(f"No documents loaded from {file_path}")
             return None, None
-        
-        # Add custom metadata if provided
-        if custom_metadata:
-            for doc in documents:
-                doc.metadata.update(custom_metadata)
-        
-        # Create indices
-        vector_index = VectorStoreIndex.from_documents(documents)
-        summary_index = SummaryIndex.from_documents(documents)
-        
+
         # Create query engines
-        vector_query_engine = vector_index.as_query_engine()
-        summary_query_engine = summary_index.as_query_engine(
-            response_mode="tree_summarize"
-        )
-        
+        retriever = KnowledgeBaseRetriever(source=document_source(file_path), metadata=custom_metadata)
+        vector_query_engine = RetrieverQueryEngine.from_args(retriever, llm=llm)
+        summary_query_engine = PrecomputedSummaryQueryEngine(scope=document_scope(document_source(file_path)))
+
         # Create tools
         vector_tool = QueryEngineTool.from_defaults(
             query_engine=vector_query_engine,
             name=f"vector_tool_{name}",
-            description=f"Useful for retrieving specific information and answering questions about {name}. "
-                       f"Use this for detailed queries about the content of {file_path.name}."
+            description=VECTOR_TOOL_DESCRIPTION.format(name=name, file_name=file_path.name),
         )
-        
+
         summary_tool = QueryEngineTool.from_defaults(
             query_engine=summary_query_engine,
             name=f"summary_tool_{name}",
-            description=f"Useful for getting a high-level summary or overview of {name}. "
-                       f"Use this to understand the main topics and structure of {file_path.name}."
+            description=SUMMARY_TOOL_DESCRIPTION.format(name=name, file_name=file_path.name),
         )
-        
-        logger.info(f"Created tools with metadata for {file_path.name}")
+
+        logger.debug(f"Created tools for {file_path.name}")
         return vector_tool, summary_tool
-        
+
     except Exception as e:
         logger.error(f"Error creating tools for {file_path}: {e}")
         raise
@@ -119,21 +219,21 @@ def get_doc_tools_with_metadata(file_path: Path, name: str, custom_metadata: dic
 def create_query_tool_from_index(index, name: str, description: str):
     """
     Create a query tool from an existing index.
-    
+
     Args:
         index: LlamaIndex vector or summary index
         name: Tool name
         description: Tool description
-        
+
     Returns:
         QueryEngineTool
     """
     query_engine = index.as_query_engine()
-    
+
     tool = QueryEngineTool.from_defaults(
         query_engine=query_engine,
         name=name,
         description=description
     )
-    
-    return tool
\ No newline at end of file
+
+    return tool
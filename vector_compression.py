@@ -0,0 +1,136 @@
+"""
+Compact vectors for the chunk collection: quantized and optionally truncated.
+
+A float32 collection keeps every 384-dim MiniLM vector in RAM (1.5 KB per
+chunk). A compressed collection searches compact vectors in RAM and rescores
+the best candidates against the full-precision vectors, which stay on disk:
+
+    none     float32 vectors in RAM (default)
+    int8     Qdrant scalar quantization (4x smaller in RAM); originals on disk,
+             top limit * oversampling candidates rescored with them
+    binary   Qdrant binary quantization (32x smaller); same rescoring, needs more
+             oversampling than int8
+
+With a truncation dimension, the collection has two named vectors: "compact"
+(the first N dimensions, quantized as above, in RAM) and "full" (on disk).
+Searches run on "compact" for limit * oversampling candidates and then on
+"full" restricted to those candidates. Truncation suits models trained for it
+(Matryoshka embeddings); check recall with benchmarks/vector_compression.py.
+
+The mode is chosen per collection when it is created (MarkdownToVectorDB's
+`compression`, defaulting to VECTOR_COMPRESSION / VECTOR_TRUNCATE_DIM /
+VECTOR_OVERSAMPLING), and read back from the collection's config for search,
+so agents need no configuration.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+MODES = ("none", "int8", "binary")
+DEFAULT_OVERSAMPLING = {"none": 1.0, "int8": 2.0, "binary": 3.0}
+FULL_VECTOR = "full"
+COMPACT_VECTOR = "compact"
+
+
+@dataclass
+class VectorCompression:
+    """How the vectors of a chunk collection are stored and searched"""
+    mode: str = "none"
+    truncate_dim: Optional[int] = None
+    oversampling: Optional[float] = None
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown vector compression {self.mode!r} (one of {', '.join(MODES)})")
+        if self.oversampling is None:
+            self.oversampling = DEFAULT_OVERSAMPLING[self.mode] if not self.truncate_dim else max(
+                DEFAULT_OVERSAMPLING[self.mode], 4.0)
+
+    @classmethod
+    def from_env(cls) -> "VectorCompression":
+        truncate_dim = os.getenv("VECTOR_TRUNCATE_DIM")
+        oversampling = os.getenv("VECTOR_OVERSAMPLING")
+        return cls(
+            mode=os.getenv("VECTOR_COMPRESSION", "none"),
+            truncate_dim=int(truncate_dim) if truncate_dim else None,
+            oversampling=float(oversampling) if oversampling else None,
+        )
+
+    @classmethod
+    def from_collection(cls, collection_info, oversampling: Optional[float] = None) -> "VectorCompression":
+        """Compression of an existing collection (from qdrant_client.get_collection)"""
+        from qdrant_client.http.models import BinaryQuantization, ScalarQuantization
+
+        if oversampling is None and os.getenv("VECTOR_OVERSAMPLING"):
+            oversampling = float(os.getenv("VECTOR_OVERSAMPLING"))
+        vectors = collection_info.config.params.vectors
+        quantization = collection_info.config.quantization_config
+        truncate_dim = None
+        if isinstance(vectors, dict) and COMPACT_VECTOR in vectors:
+            truncate_dim = vectors[COMPACT_VECTOR].size
+            quantization = vectors[COMPACT_VECTOR].quantization_config or quantization
+        if isinstance(quantization, ScalarQuantization):
+            mode = "int8"
+        elif isinstance(quantization, BinaryQuantization):
+            mode = "binary"
+        else:
+            mode = "none"
+        return cls(mode=mode, truncate_dim=truncate_dim, oversampling=oversampling)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none" or bool(self.truncate_dim)
+
+    def describe(self) -> str:
+        return self.mode + (f"/{self.truncate_dim}d" if self.truncate_dim else "")
+
+    def quantization_config(self):
+        from qdrant_client.http.models import (BinaryQuantization, BinaryQuantizationConfig, ScalarQuantization,
+                                               ScalarQuantizationConfig, ScalarType)
+
+        if self.mode == "int8":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99,
+                                                                      always_ram=True))
+        if self.mode == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def collection_config(self, vector_size: int) -> dict:
+        """vectors_config and quantization_config arguments of create_collection"""
+        from qdrant_client.http.models import Distance, VectorParams
+
+        if not self.enabled:
+            return {"vectors_config": VectorParams(size=vector_size, distance=Distance.COSINE)}
+        if self.truncate_dim:
+            if self.truncate_dim >= vector_size:
+                raise ValueError(f"Truncation dimension {self.truncate_dim} must be below the model's {vector_size}")
+            return {"vectors_config": {
+                FULL_VECTOR: VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=True),
+                COMPACT_VECTOR: VectorParams(size=self.truncate_dim, distance=Distance.COSINE,
+                                             quantization_config=self.quantization_config()),
+            }}
+        return {
+            "vectors_config": VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=True),
+            "quantization_config": self.quantization_config(),
+        }
+
+    def point_vector(self, embedding: np.ndarray):
+        """The `vector` of a PointStruct for an embedding"""
+        vector = np.asarray(embedding, dtype=np.float32).tolist()
+        if self.truncate_dim:
+            return {FULL_VECTOR: vector, COMPACT_VECTOR: vector[:self.truncate_dim]}
+        return vector
+
+    def search_params(self):
+        from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+
+        if self.mode == "none":
+            return None
+        return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=self.oversampling))
+
+
+def full_vector(vector):
+    """Full-precision vector of a point read back with with_vectors=True"""
+    return vector[FULL_VECTOR] if isinstance(vector, dict) else vector
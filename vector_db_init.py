@@ -1,16 +1,22 @@
 import os
+import hashlib
 import logging
-from typing import List, Dict, Any
+import time
+import uuid
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct
-from qdrant_client.http.exceptions import UnexpectedResponse
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from tqdm import tqdm
 import numpy as np
 
+from dedup import DedupStats, drop_near_duplicates, remove_boilerplate
+from embedding_batcher import EmbeddingBatcher
+from markdown_chunker import MarkdownChunker, tokenizer_counter
+from shard_store import ShardStore
+from latency_metrics import record_rag_timing
+from tracing import span
+from vector_compression import COMPACT_VECTOR, FULL_VECTOR, VectorCompression
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,7 +27,13 @@ class MarkdownToVectorDB:
                  collection_name: str = "markdown_knowledge_base",
                  model_name: str = "all-MiniLM-L6-v2",
                  chunk_size: int = 1000,
-                 chunk_overlap: int = 200):
+                 chunk_overlap: int = 200,
+                 batch_queries: bool = False,
+                 qdrant_url: Optional[str] = None,
+                 chunker: Optional[str] = None,
+                 max_chunk_tokens: Optional[int] = None,
+                 dedup: Optional[bool] = None,
+                 compression: Optional[VectorCompression] = None):
         """
         Initialize the Markdown to Vector DB converter
         
@@ -29,29 +41,76 @@ class MarkdownToVectorDB:
             knowledge_base_dir: Path to directory containing markdown files
             collection_name: Name for the Qdrant collection
             model_name: Sentence transformer model name
-            chunk_size: Size of text chunks
-            chunk_overlap: Overlap between chunks
+            chunk_size: Size of text chunks in characters (recursive chunker)
+            chunk_overlap: Overlap between chunks in characters (recursive chunker)
+            batch_queries: Micro-batch concurrent search_similar query encodes (for processes
+                serving many sessions, e.g. the retrieval sidecar)
+            qdrant_url: Qdrant server URL, or ":memory:" for a local in-process store
+                (defaults to QDRANT_URL, then http://localhost:6333)
+            chunker: "markdown" (heading-aware, sized in model tokens) or "recursive"
+                (langchain character splitter); defaults to CHUNKER, then "markdown"
+            max_chunk_tokens: Token limit of markdown chunks (defaults to the model's
+                max sequence length minus the special tokens)
+            dedup: Remove cross-page boilerplate and near-duplicate chunks before
+                embedding (defaults to DEDUP, then on)
+            compression: Quantization/truncation of the collections this converter creates
+                (defaults to VECTOR_COMPRESSION etc., see vector_compression.py); searches
+                use the compression the served collection was created with
         """
         self.knowledge_base_dir = Path(knowledge_base_dir)
         self.collection_name = collection_name
         self.model_name = model_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.chunker = chunker or os.getenv("CHUNKER", "markdown")
+        self.max_chunk_tokens = max_chunk_tokens
+        self.dedup = dedup if dedup is not None else os.getenv("DEDUP", "1") == "1"
+        self.dedup_stats: Optional[DedupStats] = None
+        self.compression = compression or VectorCompression.from_env()
+        self._search_compression: Optional[VectorCompression] = None
         
+        # Heavy dependencies (torch, qdrant-client) are imported here rather than at
+        # module level so that importing this module stays cheap
+        from sentence_transformers import SentenceTransformer
+        from qdrant_client import QdrantClient
+
         # Initialize components
         logger.info(f"Loading embedding model: {model_name}")
         self.embedding_model = SentenceTransformer(model_name)
+        self.query_batcher = EmbeddingBatcher(self.embedding_model) if batch_queries else None
         
-        # Initialize Qdrant client (in-memory for this example)
-        self.qdrant_client = QdrantClient(url="http://localhost:6333")
-        
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Initialize Qdrant client
+        self.qdrant_url = qdrant_url or os.getenv("QDRANT_URL", "http://localhost:6333")
+        if self.qdrant_url == ":memory:":
+            self.qdrant_client = QdrantClient(location=":memory:")
+        else:
+            self.qdrant_client = QdrantClient(url=self.qdrant_url)
+        self._text_splitter = None
+        self._markdown_chunker = None
+
+    @property
+    def text_splitter(self):
+        """Text splitter, created on first use (only ingestion needs langchain)"""
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                length_function=len,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._text_splitter
+
+    @property
+    def markdown_chunker(self) -> MarkdownChunker:
+        """Markdown chunker counting tokens with the embedding model's tokenizer"""
+        if self._markdown_chunker is None:
+            max_tokens = self.max_chunk_tokens or self.embedding_model.max_seq_length - 2
+            self._markdown_chunker = MarkdownChunker(
+                count_tokens=tokenizer_counter(self.embedding_model.tokenizer),
+                max_tokens=max_tokens,
+            )
+        return self._markdown_chunker
 
     def get_markdown_files(self) -> List[Path]:
         """Get all markdown files from the knowledge base directory"""
@@ -78,7 +137,7 @@ class MarkdownToVectorDB:
             return ""
 
     def extract_all_markdown_texts(self) -> Dict[str, str]:
-        """Extract text from all markdown files"""
+        """Extract text from all markdown files and shards (see shard_store.py)"""
         logger.info("Extracting text from markdown files")
         
         md_files = self.get_markdown_files()
@@ -90,6 +149,12 @@ class MarkdownToVectorDB:
                 # Use relative path as key
                 rel_path = md_file.relative_to(self.knowledge_base_dir)
                 markdown_texts[str(rel_path)] = text
+
+        if ShardStore.exists(self.knowledge_base_dir):
+            shards = ShardStore(self.knowledge_base_dir)
+            for key, text in tqdm(shards.iter_documents(), total=len(shards), desc="Reading shards"):
+                if text.strip():
+                    markdown_texts[key] = text
         
         total_chars = sum(len(text) for text in markdown_texts.values())
         logger.info(f"Extracted {total_chars} characters from {len(markdown_texts)} files")
@@ -97,29 +162,56 @@ class MarkdownToVectorDB:
         return markdown_texts
 
     def split_texts_into_chunks(self, markdown_texts: Dict[str, str]) -> List[Dict[str, Any]]:
-        """Split texts into chunks with metadata"""
+        """Split texts into chunks with metadata (deduplicated if enabled)"""
+        if not self.dedup:
+            return self._split_texts_into_chunks(markdown_texts)
+
+        with span("ingest.dedup", pages=len(markdown_texts)) as current:
+            self.dedup_stats = DedupStats()
+            markdown_texts = remove_boilerplate(markdown_texts, stats=self.dedup_stats)
+            chunks = drop_near_duplicates(self._split_texts_into_chunks(markdown_texts), stats=self.dedup_stats)
+            for chunk_id, chunk in enumerate(chunks):
+                chunk["chunk_id"] = chunk_id
+            if current is not None:
+                current.set_attribute("boilerplate_chars", self.dedup_stats.boilerplate_chars)
+                current.set_attribute("duplicate_chunks", self.dedup_stats.duplicate_chunks)
+        logger.info(f"Dedup {self.dedup_stats.summary()}, {len(chunks)} chunks left to embed")
+        return chunks
+
+    def _split_texts_into_chunks(self, markdown_texts: Dict[str, str]) -> List[Dict[str, Any]]:
         logger.info("Splitting texts into chunks")
         
         all_chunks = []
         chunk_id = 0
         
-        for file_path, text in markdown_texts.items():
-            chunks = self.text_splitter.split_text(text)
-            
-            for chunk in chunks:
-                # Extract title from markdown (first # heading if exists)
-                title = self._extract_title_from_chunk(chunk)
+        with span("ingest.split_texts_into_chunks", files=len(markdown_texts),
+                  chunker=self.chunker) as current:
+            for file_path, text in markdown_texts.items():
+                if self.chunker == "markdown":
+                    for chunk_doc in self.markdown_chunker.split(text, source=file_path):
+                        chunk_doc["chunk_id"] = chunk_id
+                        all_chunks.append(chunk_doc)
+                        chunk_id += 1
+                    continue
+
+                chunks = self.text_splitter.split_text(text)
                 
-                chunk_doc = {
-                    "text": chunk.strip(),
-                    "chunk_id": chunk_id,
-                    "source": file_path,
-                    "title": title,
-                    "char_count": len(chunk),
-                    "word_count": len(chunk.split())
-                }
-                all_chunks.append(chunk_doc)
-                chunk_id += 1
+                for chunk in chunks:
+                    # Extract title from markdown (first # heading if exists)
+                    title = self._extract_title_from_chunk(chunk)
+                    
+                    chunk_doc = {
+                        "text": chunk.strip(),
+                        "chunk_id": chunk_id,
+                        "source": file_path,
+                        "title": title,
+                        "char_count": len(chunk),
+                        "word_count": len(chunk.split())
+                    }
+                    all_chunks.append(chunk_doc)
+                    chunk_id += 1
+            if current is not None:
+                current.set_attribute("chunks", len(all_chunks))
         
         logger.info(f"Created {len(all_chunks)} chunks from {len(markdown_texts)} files")
         return all_chunks
@@ -136,11 +228,16 @@ class MarkdownToVectorDB:
                     return title
         return "No title"
 
+    @staticmethod
+    def embedding_text(chunk: Dict[str, Any]) -> str:
+        """Text embedded for a chunk: markdown chunks with their title/section breadcrumb"""
+        return f"{chunk['context']}\n\n{chunk['text']}" if chunk.get("context") else chunk["text"]
+
     def create_embeddings(self, chunks: List[Dict[str, Any]]) -> List[np.ndarray]:
         """Create embeddings for text chunks"""
         logger.info("Creating embeddings")
         
-        texts = [chunk["text"] for chunk in chunks]
+        texts = [self.embedding_text(chunk) for chunk in chunks]
         
         # Create embeddings in batches for efficiency
         batch_size = 32
@@ -148,18 +245,19 @@ class MarkdownToVectorDB:
         
         for i in tqdm(range(0, len(texts), batch_size), desc="Creating embeddings"):
             batch_texts = texts[i:i + batch_size]
-            batch_embeddings = self.embedding_model.encode(
-                batch_texts,
-                show_progress_bar=False,
-                convert_to_numpy=True
-            )
+            with span("ingest.embed_batch", offset=i, batch_size=len(batch_texts), model=self.model_name):
+                batch_embeddings = self.embedding_model.encode(
+                    batch_texts,
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
             embeddings.extend(batch_embeddings)
         
         logger.info(f"Created {len(embeddings)} embeddings with dimension {len(embeddings[0])}")
         return embeddings
 
-    def delete_markdown_files(self):
-        """Delete all markdown files from the knowledge base directory"""
+    def delete_markdown_files(self, shards: bool = True):
+        """Delete all markdown files (and shards, unless `shards` is False) from the knowledge base directory"""
         try:
             md_files = []
             md_extensions = ['.md', '.markdown']
@@ -167,6 +265,13 @@ class MarkdownToVectorDB:
             for ext in md_extensions:
                 md_files.extend(self.knowledge_base_dir.rglob(f"*{ext}"))
             
+            if shards and ShardStore.exists(self.knowledge_base_dir):
+                store = ShardStore(self.knowledge_base_dir)
+                logger.info(f"🗑️  Deleting {len(store)} sharded documents from {store.path}")
+                store.clear()
+                if not md_files:
+                    return True
+
             if md_files:
                 logger.info(f"🗑️  Deleting {len(md_files)} markdown files from {self.knowledge_base_dir}")
                 for md_file in md_files:
@@ -187,6 +292,15 @@ class MarkdownToVectorDB:
     def delete_collection_if_exists(self):
         """Delete the collection if it exists"""
         try:
+            target = self.alias_target()
+            if target is not None:
+                from qdrant_client.http.models import DeleteAlias, DeleteAliasOperation
+                logger.info(f"🗑️  Deleting alias {self.collection_name} and its collection {target}")
+                self.qdrant_client.update_collection_aliases(change_aliases_operations=[
+                    DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.collection_name))])
+                self.qdrant_client.delete_collection(collection_name=target)
+                return True
+
             collections = self.qdrant_client.get_collections().collections
             collection_exists = any(col.name == self.collection_name for col in collections)
             
@@ -202,57 +316,92 @@ class MarkdownToVectorDB:
             logger.warning(f"Error checking/deleting collection: {e}")
             return False
 
-    def setup_qdrant_collection(self, vector_size: int):
+    def setup_qdrant_collection(self, vector_size: int, delete_markdown: bool = True):
         """Setup Qdrant collection (deletes old one if exists)"""
         logger.info(f"Setting up Qdrant collection: {self.collection_name}")
         
         # Delete markdown files first
-        self.delete_markdown_files()
+        if delete_markdown:
+            self.delete_markdown_files()
         
         # Delete existing collection if it exists
         self.delete_collection_if_exists()
         
         # Create new collection
-        self.qdrant_client.create_collection(
-            collection_name=self.collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-        )
+        self.create_collection(self.collection_name, vector_size)
         
         logger.info("✅ Created new collection successfully")
 
+    def create_collection(self, collection_name: str, vector_size: int):
+        """Create an empty chunk collection with the payload index the tools need"""
+        self.qdrant_client.create_collection(
+            collection_name=collection_name,
+            **self.compression.collection_config(vector_size),
+        )
+        self.ensure_payload_index(collection_name)
+
+    def ensure_payload_index(self, collection_name: str):
+        """Create the `source` payload index unless the collection already has it"""
+        from qdrant_client.http.models import PayloadSchemaType
+
+        if "source" in (self.qdrant_client.get_collection(collection_name).payload_schema or {}):
+            return
+        # Per-document lookups (util.py tools) filter on the source path
+        self.qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name="source",
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
+
+    @staticmethod
+    def point_id(chunk: Dict[str, Any]) -> str:
+        """Stable point ID of a chunk: the same chunk of the same document always gets the same ID"""
+        digest = hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{chunk['source']}#{chunk['chunk_id']}#{digest}"))
+
+    def make_point(self, chunk: Dict[str, Any], embedding: np.ndarray):
+        from qdrant_client.http.models import PointStruct
+
+        return PointStruct(
+            id=self.point_id(chunk),
+            vector=self.compression.point_vector(embedding),
+            payload={
+                "text": chunk["text"],
+                "source": chunk["source"],
+                "title": chunk["title"],
+                "chunk_id": chunk["chunk_id"],
+                "section": chunk.get("section", ""),
+                "token_count": chunk.get("token_count"),
+                "char_count": chunk["char_count"],
+                "word_count": chunk["word_count"]
+            }
+        )
+
     def upload_to_qdrant(self, chunks: List[Dict[str, Any]], embeddings: List[np.ndarray]):
         """Upload chunks and embeddings to Qdrant"""
         logger.info("Uploading to Qdrant")
         
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            point = PointStruct(
-                id=i,
-                vector=embedding.tolist(),
-                payload={
-                    "text": chunk["text"],
-                    "source": chunk["source"],
-                    "title": chunk["title"],
-                    "chunk_id": chunk["chunk_id"],
-                    "char_count": chunk["char_count"],
-                    "word_count": chunk["word_count"]
-                }
-            )
-            points.append(point)
+        points = [self.make_point(chunk, embedding) for chunk, embedding in zip(chunks, embeddings)]
         
         # Upload in batches
         batch_size = 100
         for i in tqdm(range(0, len(points), batch_size), desc="Uploading to Qdrant"):
             batch_points = points[i:i + batch_size]
-            self.qdrant_client.upsert(
-                collection_name=self.collection_name,
-                points=batch_points
-            )
+            with span("ingest.upsert_batch", offset=i, batch_size=len(batch_points),
+                      collection=self.collection_name):
+                self.qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=batch_points
+                )
         
         logger.info(f"Successfully uploaded {len(points)} points to Qdrant")
 
-    def process_markdown_files(self):
+    def process_markdown_files(self, delete_markdown: bool = True):
         """Main method to process markdown files and create vector database"""
+        with span("ingest.process_markdown_files", collection=self.collection_name):
+            return self._process_markdown_files(delete_markdown)
+
+    def _process_markdown_files(self, delete_markdown: bool):
         try:
             # Step 1: Extract text from all markdown files
             markdown_texts = self.extract_all_markdown_texts()
@@ -269,7 +418,7 @@ class MarkdownToVectorDB:
             
             # Step 4: Setup Qdrant collection (this will delete old one)
             vector_size = len(embeddings[0])
-            self.setup_qdrant_collection(vector_size)
+            self.setup_qdrant_collection(vector_size, delete_markdown=delete_markdown)
             
             # Step 5: Upload to Qdrant
             self.upload_to_qdrant(chunks, embeddings)
@@ -292,39 +441,308 @@ class MarkdownToVectorDB:
             logger.error(f"Error processing markdown files: {e}")
             return False
 
-    def search_similar(self, query: str, limit: int = 5) -> List[Dict]:
-        """Search for similar text chunks"""
-        query_embedding = self.embedding_model.encode([query])
+    def has_collection(self, collection_name: str) -> bool:
+        """Whether a collection (not an alias) of this name exists"""
+        return any(col.name == collection_name for col in self.qdrant_client.get_collections().collections)
+
+    def alias_target(self) -> Optional[str]:
+        """Collection the collection name points to when it is an alias (see ingest), else None"""
+        for alias in self.qdrant_client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+
+    def build_collection_name(self, build_id: str) -> str:
+        return f"{self.collection_name}__{build_id}"
+
+    def ingest(self, checkpoint, batch_size: int = 128) -> bool:
+        """
+        Index an extraction job's pages, resuming from its checkpoint (see ingest_checkpoint.py)
+
+        Unlike process_markdown_files, nothing is deleted before the new index is
+        complete: chunks are embedded and upserted batch by batch into a build
+        collection, recording the upserted point IDs, and the collection name
+        (an alias) is only switched to the build at the end. The job's pages
+        then replace the knowledge base documents.
+
+        Args:
+            checkpoint: IngestionCheckpoint at the chunk, embed or publish stage
+            batch_size: Chunks embedded and upserted per checkpointed batch
+
+        Returns:
+            True once the build is published
+        """
+        with span("ingest.checkpointed", collection=self.collection_name, stage=checkpoint.stage):
+            try:
+                if checkpoint.stage == "chunk":
+                    markdown_texts = {key: text for key, text in checkpoint.pages.iter_documents() if text.strip()}
+                    if not markdown_texts:
+                        logger.error("No pages were fetched, nothing to index")
+                        checkpoint.discard()
+                        return False
+                    chunks = self.split_texts_into_chunks(markdown_texts)
+                    checkpoint.save_chunks(chunks)
+                    checkpoint.advance("embed")
+
+                build = self.build_collection_name(checkpoint.build_id)
+                if checkpoint.stage == "embed":
+                    chunks = checkpoint.load_chunks()
+                    if not self.has_collection(build):
+                        self.create_collection(build, self.embedding_model.get_sentence_embedding_dimension())
+                    else:
+                        # A crash right after creating the build can leave it without its index
+                        self.ensure_payload_index(build)
+                    self.embed_and_upsert(chunks, build, checkpoint, batch_size)
+                    checkpoint.advance("publish")
+
+                self.publish(checkpoint, build)
+                collection_info = self.qdrant_client.get_collection(build)
+                print(f"\n📊 Summary:")
+                print(f"   🗃️  Collection: {self.collection_name} -> {build}")
+                print(f"   💾 Points in DB: {collection_info.points_count}")
+                return True
+            except Exception as e:
+                logger.error(f"Error indexing extraction job {checkpoint.directory.name} "
+                             f"(resumes at stage {checkpoint.stage}): {e}")
+                return False
+
+    def embed_and_upsert(self, chunks: List[Dict[str, Any]], collection_name: str, checkpoint, batch_size: int = 128):
+        """Embed and upsert the chunks not upserted yet, recording each batch in the checkpoint"""
+        upserted = checkpoint.upserted()
+        pending = [chunk for chunk in chunks if self.point_id(chunk) not in upserted]
+        logger.info(f"Embedding {len(pending)} chunks ({len(chunks) - len(pending)} already upserted)")
+
+        for i in tqdm(range(0, len(pending), batch_size), desc="Embedding and uploading"):
+            batch = pending[i:i + batch_size]
+            with span("ingest.embed_batch", offset=i, batch_size=len(batch), model=self.model_name):
+                embeddings = self.embedding_model.encode(
+                    [self.embedding_text(chunk) for chunk in batch],
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
+            points = [self.make_point(chunk, embedding) for chunk, embedding in zip(batch, embeddings)]
+            with span("ingest.upsert_batch", offset=i, batch_size=len(points), collection=collection_name):
+                self.qdrant_client.upsert(collection_name=collection_name, points=points, wait=True)
+            checkpoint.record_upserted(point.id for point in points)
+
+    def switch_alias(self, build: str) -> Optional[str]:
+        """
+        Point the collection name (an alias) at a build collection
+
+        Returns:
+            The collection the alias pointed to before, if any
+        """
+        from qdrant_client.http.models import CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+
+        target = self.alias_target()
+        if target == build:
+            return target
+        operations = [CreateAliasOperation(create_alias=CreateAlias(collection_name=build,
+                                                                    alias_name=self.collection_name))]
+        if target is not None:
+            # Switched in one request: searches see either the old or the new build
+            operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.collection_name)))
+        elif self.has_collection(self.collection_name):
+            # A collection created before builds were published under an alias holds the name
+            logger.info(f"🗑️  Replacing collection {self.collection_name} with an alias to {build}")
+            self.qdrant_client.delete_collection(collection_name=self.collection_name)
+        self.qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+        self._search_compression = None
+        logger.info(f"✅ {self.collection_name} now points to {build}")
+        return target
+
+    def publish(self, checkpoint, build: str):
+        """
+        Switch the collection alias to a finished build, then replace the old documents and collection
+
+        Every step can be repeated, so a publish interrupted by a crash completes on resume.
+        """
+        if "previous_collection" not in checkpoint.state:
+            checkpoint.set(previous_collection=self.alias_target())
+        self.switch_alias(build)
+
+        if checkpoint.pages.path.exists():
+            self.delete_markdown_files(shards=False)
+            checkpoint.pages.move_to(self.knowledge_base_dir)
+
+        previous = checkpoint.state["previous_collection"]
+        if previous and previous != build and self.has_collection(previous):
+            logger.info(f"🗑️  Deleting previous build {previous}")
+            self.qdrant_client.delete_collection(collection_name=previous)
+        checkpoint.discard()
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a search query, batched with concurrent queries if enabled"""
+        if self.query_batcher is not None:
+            return self.query_batcher.encode(query)
+        return self.embedding_model.encode([query])[0]
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts (e.g. tool descriptions) with the search model"""
+        return self.embedding_model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+
+    def search_similar(self, query: str, limit: int = 5, source: Optional[str] = None,
+                       max_chars: Optional[int] = 200) -> List[Dict]:
+        """
+        Search for similar text chunks
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            source: Only search chunks of this document (path relative to the knowledge base)
+            max_chars: Truncate result texts to this many characters (None for the full chunk)
+        """
+        query_filter = None
+        if source:
+            from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+            query_filter = Filter(must=[FieldCondition(key="source", match=MatchValue(value=source))])
+
+        start = time.perf_counter()
+        with span("rag.embed_query"):
+            query_embedding = self.encode_query(query)
+        embedded = time.perf_counter()
         
-        search_result = self.qdrant_client.search(
-            collection_name=self.collection_name,
-            query_vector=query_embedding[0].tolist(),
-            limit=limit
-        )
+        with span("rag.vector_search", collection=self.collection_name, limit=limit, source=source):
+            try:
+                search_result = self.vector_search(query_embedding, query_filter, limit)
+            except Exception:
+                cached = self._search_compression
+                if cached is None:
+                    raise
+                # Retry only if another process switched the alias to a build with another
+                # vector layout (e.g. named vectors); any other error is a real failure
+                self._search_compression = None
+                if self.search_compression() == cached:
+                    raise
+                logger.info(f"Collection {self.collection_name} changed to {self._search_compression.describe()}")
+                search_result = self.vector_search(query_embedding, query_filter, limit)
+        record_rag_timing("rag_embed", embedded - start)
+        record_rag_timing("rag_search", time.perf_counter() - embedded)
         
         results = []
         for hit in search_result:
+            text = hit.payload["text"]
             results.append({
-                "text": hit.payload["text"][:200] + "..." if len(hit.payload["text"]) > 200 else hit.payload["text"],
+                "text": text[:max_chars] + "..." if max_chars and len(text) > max_chars else text,
                 "score": hit.score,
                 "source": hit.payload["source"],
                 "title": hit.payload["title"],
+                "section": hit.payload.get("section", ""),
                 "chunk_id": hit.payload["chunk_id"]
             })
         
         return results
 
-def init():
-    """Initialize and process markdown files into vector database"""
+    def search_compression(self) -> VectorCompression:
+        """Compression of the served collection, read from its config on the first search"""
+        if self._search_compression is None:
+            self._search_compression = VectorCompression.from_collection(
+                self.qdrant_client.get_collection(self.collection_name))
+        return self._search_compression
+
+    def vector_search(self, query_embedding: np.ndarray, query_filter, limit: int):
+        """
+        Nearest chunks of a query embedding, with the served collection's compression
+
+        Quantized collections rescore limit * oversampling candidates with the full
+        vectors. Truncated collections search the compact vector for the candidates,
+        then the full vector among them only: in one query_points request with a
+        prefetch (qdrant-client 1.10+, where search() was removed in 1.16), or with
+        two search() requests on older clients.
+        """
+        compression = self.search_compression()
+        if not hasattr(self.qdrant_client, "query_points"):
+            return self._legacy_vector_search(compression, query_embedding, query_filter, limit)
+
+        if not compression.truncate_dim:
+            return self.qdrant_client.query_points(
+                collection_name=self.collection_name,
+                query=query_embedding.tolist(),
+                query_filter=query_filter,
+                search_params=compression.search_params(),
+                limit=limit,
+                with_payload=True,
+            ).points
+
+        from qdrant_client.http.models import Prefetch
+
+        return self.qdrant_client.query_points(
+            collection_name=self.collection_name,
+            prefetch=Prefetch(
+                query=query_embedding[:compression.truncate_dim].tolist(),
+                using=COMPACT_VECTOR,
+                filter=query_filter,
+                params=compression.search_params(),
+                limit=int(limit * compression.oversampling + 0.5),
+            ),
+            query=query_embedding.tolist(),
+            using=FULL_VECTOR,
+            limit=limit,
+            with_payload=True,
+        ).points
+
+    def _legacy_vector_search(self, compression: VectorCompression, query_embedding: np.ndarray, query_filter,
+                              limit: int):
+        """vector_search for qdrant-client < 1.10 (no query_points)"""
+        if not compression.truncate_dim:
+            return self.qdrant_client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding.tolist(),
+                query_filter=query_filter,
+                search_params=compression.search_params(),
+                limit=limit
+            )
+
+        from qdrant_client.http.models import Filter, HasIdCondition, NamedVector
+
+        candidates = self.qdrant_client.search(
+            collection_name=self.collection_name,
+            query_vector=NamedVector(name=COMPACT_VECTOR, vector=query_embedding[:compression.truncate_dim].tolist()),
+            query_filter=query_filter,
+            search_params=compression.search_params(),
+            limit=int(limit * compression.oversampling + 0.5),
+            with_payload=False,
+        )
+        if not candidates:
+            return []
+        return self.qdrant_client.search(
+            collection_name=self.collection_name,
+            query_vector=NamedVector(name=FULL_VECTOR, vector=query_embedding.tolist()),
+            query_filter=Filter(must=[HasIdCondition(has_id=[hit.id for hit in candidates])]),
+            limit=limit
+        )
+
+    def get_summary(self, scope: str) -> Optional[str]:
+        """
+        Precomputed summary of a document, directory or the whole site (see summaries.py)
+
+        Args:
+            scope: "document:<source>", "directory:<name>" or "site"
+        """
+        from summaries import SummaryStore
+        return SummaryStore(self.qdrant_client, self.collection_name).get(scope)
+
+def init(checkpoint=None):
+    """
+    Initialize and process markdown files into vector database
+
+    Args:
+        checkpoint: IngestionCheckpoint of an extraction job to index (resumable and
+            non-destructive, see MarkdownToVectorDB.ingest) instead of knowledge_base/
+    """
     print("🔄 Initializing Markdown to Vector DB converter...")
-    print("   ⚠️  WARNING: This will DELETE all .md files in knowledge_base directory")
-    print("   ⚠️  WARNING: This will DELETE any existing collection with the same name")
+    if checkpoint is None:
+        print("   ⚠️  WARNING: This will DELETE all .md files and shards in knowledge_base directory")
+        print("   ⚠️  WARNING: This will DELETE any existing collection with the same name")
     
     converter = MarkdownToVectorDB(
         knowledge_base_dir="knowledge_base",
         collection_name="markdown_knowledge_base"
     )
-    success = converter.process_markdown_files()
+    if checkpoint is not None:
+        success = converter.ingest(checkpoint)
+    else:
+        success = converter.process_markdown_files()
     
     return success, converter
 